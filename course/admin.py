@@ -1,15 +1,31 @@
 from django.contrib import admin
 from django.contrib.auth.models import Group
 
+from result.models import ResultSheetExport
 from .models import Program, Course, CourseAllocation, Upload
 
 
+@admin.action(description="Export result sheets of the selected courses (ZIP)")
+def export_result_sheets(modeladmin, request, queryset):
+    """
+    Queue the export; ``export_result_sheets --queued`` renders it outside
+    the web process and staff download it from the result sheet exports page
+    """
+    course_ids = list(queryset.values_list("pk", flat=True))
+    ResultSheetExport.objects.create(requested_by=request.user, course_ids=course_ids)
+    modeladmin.message_user(
+        request,
+        f"Queued an export of {len(course_ids)} result sheets. It is listed under "
+        "Result sheet exports, with a download link once it is done.",
+    )
+
+
 class ProgramAdmin(admin.ModelAdmin):
     pass
 
 
 class CourseAdmin(admin.ModelAdmin):
-    pass
+    actions = [export_result_sheets]
 
 
 class UploadAdmin(admin.ModelAdmin):
@@ -1,23 +1,54 @@
+import asyncio
 import functools
 import time
+
+from asgiref.sync import sync_to_async
 from django.contrib import messages
+from django.contrib.auth.views import redirect_to_login
+
+
+def _ai_error_response(request, e):
+    if isinstance(e, ValueError):
+        if "API key" in str(e):
+            messages.error(request, "AI service is not properly configured. Please contact administrator.")
+        else:
+            messages.error(request, f"Configuration error: {str(e)}")
+    else:
+        logger = __import__('logging').getLogger(__name__)
+        logger.error(f"AI quiz error: {str(e)}")
+        messages.error(request, "Failed to generate quiz. Please try again or use fallback questions.")
+    from django.shortcuts import redirect
+    return redirect('ai_quiz_config')
+
 
 def handle_ai_errors(view_func):
+    if asyncio.iscoroutinefunction(view_func):
+        @functools.wraps(view_func)
+        async def async_wrapper(request, *args, **kwargs):
+            try:
+                return await view_func(request, *args, **kwargs)
+            except Exception as e:
+                return _ai_error_response(request, e)
+        return async_wrapper
+
     @functools.wraps(view_func)
     def wrapper(request, *args, **kwargs):
         try:
             return view_func(request, *args, **kwargs)
-        except ValueError as e:
-            if "API key" in str(e):
-                messages.error(request, "AI service is not properly configured. Please contact administrator.")
-            else:
-                messages.error(request, f"Configuration error: {str(e)}")
-            from django.shortcuts import redirect
-            return redirect('ai_quiz_config')
         except Exception as e:
-            logger = __import__('logging').getLogger(__name__)
-            logger.error(f"AI quiz error: {str(e)}")
-            messages.error(request, "Failed to generate quiz. Please try again or use fallback questions.")
-            from django.shortcuts import redirect
-            return redirect('ai_quiz_config')
+            return _ai_error_response(request, e)
+    return wrapper
+
+
+def async_login_required(view_func):
+    """
+    ``login_required`` for async views; Django 4.2's decorator only wraps
+    sync ones. The user is loaded in a thread, so the view can read
+    ``request.user`` without touching the database.
+    """
+    @functools.wraps(view_func)
+    async def wrapper(request, *args, **kwargs):
+        if not await sync_to_async(lambda: request.user.is_authenticated)():
+            return redirect_to_login(request.get_full_path())
+        return await view_func(request, *args, **kwargs)
     return wrapper
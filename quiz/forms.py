@@ -3,7 +3,7 @@ from django.forms.widgets import RadioSelect, Textarea
 from django.contrib.admin.widgets import FilteredSelectMultiple
 from django.utils.translation import gettext_lazy as _
 from django.forms.models import inlineformset_factory
-from .models import Question, Quiz, MCQuestion, Choice, EssayQuestion, GroqQuizConfig
+from .models import Question, Quiz, MCQuestion, Choice, EssayQuestion, GroqQuizConfig, GroqQuizSession
 
 
 
@@ -145,7 +145,7 @@ class AIQuizConfigForm(forms.ModelForm):
 
     class Meta:
         model = GroqQuizConfig
-        fields = ['course', 'difficulty', 'num_questions', 'questions_per_session', 'question_types', 'topics']
+        fields = ['course', 'difficulty', 'num_questions', 'questions_per_session', 'adaptive', 'question_types', 'topics']
         widgets = {
             'topics': forms.Textarea(attrs={
                 'placeholder': 'Optional: Specify topics to focus on (e.g., functions, loops, databases). Leave empty for general course content.',
@@ -168,6 +168,7 @@ class AIQuizConfigForm(forms.ModelForm):
             'num_questions': 'Maximum 20 questions. AI will balance question types based on your selection above.',
             'questions_per_session': 'How many questions to show at once? Can continue to next batch after completing each session.',
             'course': 'Questions will be generated based on this course\'s title, description, and academic level.',
+            'adaptive': 'Later batches get easier or harder based on your answers, and the quiz ends early once you show mastery. Number of questions becomes the maximum.',
         }
 
     def __init__(self, *args, **kwargs):
@@ -232,3 +233,30 @@ MCQuestionFormSet = inlineformset_factory(
     can_delete=True,
     extra=5,
 )
+
+
+class AIQuizPromoteForm(forms.Form):
+    quiz = forms.ModelChoiceField(
+        queryset=Quiz.objects.none(),
+        label="Target quiz",
+        help_text="Multiple choice and true/false questions are added to this quiz. Questions the course's quizzes already have are not duplicated.",
+    )
+    sessions = forms.ModelMultipleChoiceField(
+        queryset=GroqQuizSession.objects.none(),
+        widget=forms.CheckboxSelectMultiple,
+        label="AI quiz sessions",
+    )
+
+    def __init__(self, course, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields['quiz'].queryset = Quiz.objects.filter(course=course).order_by('title')
+        self.fields['quiz'].widget.attrs.update({'class': 'form-control'})
+        self.fields['sessions'].queryset = (
+            GroqQuizSession.objects.filter(course=course, completed=True)
+            .select_related('user', 'config')
+            .order_by('-completed_at')
+        )
+        self.fields['sessions'].label_from_instance = lambda session: (
+            f"{session.user.get_full_name} - {session.config.get_difficulty_display()} - "
+            f"{session.score}/{session.total_questions} - {session.completed_at:%Y-%m-%d %H:%M}"
+        )
@@ -1,103 +1,81 @@
+import asyncio
+import hashlib
 import json
 import random
 import logging
+import time
+import uuid
+from functools import lru_cache
+
+from asgiref.sync import sync_to_async
 from django.conf import settings
 from django.core.cache import cache
-from groq import Groq
-
-logger = logging.getLogger(__name__)
-
-class GroqQuizGenerator:
-    def __init__(self, model=None):
-        self.model = model or getattr(settings, 'GROQ_MODELS', {}).get('quiz_generation', 'llama3-70b-8192')
-        self.client = self._initialize_client()
-
-    def _initialize_client(self):
-        """Initialize Groq client with proper error handling"""
-        api_key = getattr(settings, 'GROQ_API_KEY', "")
-
-        if not api_key:
-            logger.error("GROQ_API_KEY not found in settings")
-            raise ValueError("Groq API key not configured. Please set GROQ_API_KEY in your environment variables.")
-
-        try:
-            client = Groq(api_key=api_key)
-            # Test connection with a simple request
-            test_response = client.chat.completions.create(
-                model=self.model,
-                messages=[{"role": "user", "content": "Say 'OK'"}],
-                max_tokens=5
-            )
-            logger.info("Groq client initialized successfully")
-            return client
-        except Exception as e:
-            logger.error(f"Failed to initialize Groq client: {e}")
-            raise
-
-    def generate_questions(self, course, difficulty, num_questions, question_types, topics=""):
-        """Generate quiz questions with caching and retry logic"""
-
-        # Create cache key based on parameters
-        cache_key = f"quiz_{course.id}_{difficulty}_{num_questions}_{'_'.join(question_types)}_{topics}"
-        cached_questions = cache.get(cache_key)
-
-        if cached_questions:
-            logger.info(f"Returning cached questions for {cache_key}")
-            return cached_questions[:num_questions]
-
-        try:
-            prompt = self._build_prompt(course, difficulty, num_questions, question_types, topics)
-            logger.info(f"Generating {num_questions} questions for course: {course.title}")
-
-            messages = [{"role": "user", "content": prompt}]
-
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=messages,
-                temperature=0.7,
-                max_tokens=4000,
-                timeout=30  # 30 second timeout
-            )
-
-            response_text = response.choices[0].message.content
-            logger.debug(f"Raw Groq response: {response_text[:200]}...")
-
-            if not response_text:
-                raise ValueError("Empty response from Groq API")
-
-            questions = self._parse_response(response_text)
-            logger.info(f"Successfully parsed {len(questions)} questions")
-
-            # Cache successful results for 1 hour
-            if questions:
-                cache.set(cache_key, questions, 3600)
-
-            return questions[:num_questions]
-
-        except Exception as e:
-            logger.error(f"Error generating questions: {str(e)}")
-            # Return fallback questions but don't cache them
-            return self._get_fallback_questions(num_questions)
-
-    def _build_prompt(self, course, difficulty, num_questions, question_types, topics):
-        """Build a comprehensive and context-aware prompt for quiz generation."""
-        # Ensure question_types is a list
-        if isinstance(question_types, str):
-            question_types = [question_types]
-
-        # Extract rich course context
-        course_context = self._extract_course_context(course)
-
-        # Build difficulty-specific guidelines
-        difficulty_guidelines = self._get_difficulty_guidelines(difficulty)
 
-        # Prepare question type specifications
-        question_specs = self._get_question_type_specifications(question_types)
+from .llm_providers import LLMProviderError, get_provider
+from .metrics import record_generation
+from .models import GroqGenerationMetric
+from .resilience import CircuitOpenError, get_resilience_settings, with_resilience
 
-        # Build topic-specific focus
-        topic_focus = self._build_topic_focus(topics, course_context)
+logger = logging.getLogger(__name__)
 
-        prompt = f"""# AI QUIZ GENERATION TASK
+QUESTIONS_CACHE_PREFIX = "ai_quiz:questions"
+QUESTIONS_CACHE_TIMEOUT = 3600
+GENERATION_LOCK_TIMEOUT = 60
+# Seconds a lock holder may spend parsing and caching after its last attempt
+GENERATION_PARSE_MARGIN = 10
+GENERATION_LOCK_POLL_INTERVAL = 0.25
+
+
+def generation_lock_times():
+    """
+    ``(wait, timeout)`` for the generation lock. Waiters wait out the
+    holder's whole retry deadline plus parsing, and the lock outlives both,
+    so a slow generation is neither duplicated nor abandoned.
+    """
+    wait = get_resilience_settings()['deadline'] + GENERATION_PARSE_MARGIN
+    return wait, max(GENERATION_LOCK_TIMEOUT, wait + GENERATION_PARSE_MARGIN)
+
+
+def is_fallback(questions):
+    """Whether ``generate_questions`` fell back to its generic questions"""
+    return any(question.get('fallback') for question in questions)
+
+
+def normalize_topics(topics):
+    """Return topics as a sorted, lower-cased, de-duplicated list"""
+    if not topics:
+        return []
+    return sorted({t.strip().lower() for t in topics.split(',') if t.strip()})
+
+
+def build_questions_cache_key(course_id, difficulty, question_types, topics, model):
+    """
+    Build a fixed-length cache key for a generated question pool.
+
+    The parameters are canonicalized (topic order/case, question type order)
+    and hashed, so free-text topics can never produce an over-long key or
+    characters memcached rejects. The number of questions is deliberately
+    left out: a cached pool serves any request for that many questions or fewer.
+    """
+    if isinstance(question_types, str):
+        question_types = [question_types]
+    payload = {
+        'course': course_id,
+        'difficulty': (difficulty or '').lower(),
+        'question_types': sorted(set(question_types or [])),
+        'topics': normalize_topics(topics),
+        'model': model,
+    }
+    digest = hashlib.sha256(
+        json.dumps(payload, sort_keys=True, separators=(',', ':')).encode('utf-8')
+    ).hexdigest()
+    return f"{QUESTIONS_CACHE_PREFIX}:{digest}"
+
+
+# Prompt building blocks. They are static, so they are assembled once at
+# import time instead of on every generation request.
+
+PROMPT_TEMPLATE = """# AI QUIZ GENERATION TASK
 
 ## COURSE CONTEXT
 {course_context}
@@ -105,7 +83,7 @@ class GroqQuizGenerator:
 ## QUIZ CONFIGURATION
 - Difficulty Level: {difficulty}
 - Number of Questions: {num_questions} (MUST generate exactly this many)
-- Question Types: {', '.join(question_types)}
+- Question Types: {question_types}
 {topic_focus}
 
 ## DIFFICULTY GUIDELINES
@@ -120,310 +98,641 @@ class GroqQuizGenerator:
 - Ensure questions test understanding, not just memorization
 - Make distractors (wrong answers) plausible and educational
 - Include clear, helpful explanations for each correct answer
+- Label each question with the short course topic it covers
 
 ## COURSE-SPECIFIC EXAMPLES
-{self._get_course_examples(course)}
+{course_examples}
 
 ## OUTPUT FORMAT
 Generate exactly {num_questions} questions in this JSON format:
 
 [
-  {{
-    "type": "multiple_choice",
-    "content": "Specific question about course content",
-    "options": ["Option A", "Option B", "Correct Option C", "Option D"],
-    "correct_answer": 2,
-    "explanation": "Clear explanation of why this is correct and why other options are wrong"
-  }},
-  {{
-    "type": "true_false",
-    "content": "Clear true/false statement about course content",
-    "correct_answer": "True",
-    "explanation": "Explanation supporting the true/false nature of the statement"
-  }},
-  {{
-    "type": "short_answer",
-    "content": "Question requiring a specific, concise answer",
-    "correct_answer": "Precise answer",
-    "explanation": "Context for the correct answer"
-  }}
+{output_examples}
 ]
 
 IMPORTANT: Return ONLY the JSON array. No markdown, no explanations, no additional text.
 """
 
-        return prompt
-
-    def _extract_course_context(self, course):
-        """Extract and format comprehensive course information for context."""
-        context_parts = []
-
-        # Basic course information
-        context_parts.append(f"Course Title: {getattr(course, 'title', 'General Course')}")
-        context_parts.append(f"Course Code: {getattr(course, 'code', 'N/A')}")
-
-        # Course description and summary
-        description = getattr(course, 'summary', '') or getattr(course, 'description', '')
-        if description:
-            context_parts.append(f"Course Description: {description}")
-
-        # Program information
-        if hasattr(course, 'program') and course.program:
-            context_parts.append(f"Program: {course.program.title}")
-            if hasattr(course.program, 'summary') and course.program.summary:
-                context_parts.append(f"Program Summary: {course.program.summary}")
-
-        # Level and academic details
-        level = getattr(course, 'level', '')
-        year = getattr(course, 'year', '')
-        semester = getattr(course, 'semester', '')
-        credit = getattr(course, 'credit', 0)
-
-        if level:
-            context_parts.append(f"Academic Level: {level}")
-        if year:
-            context_parts.append(f"Year: {year}")
-        if semester:
-            context_parts.append(f"Semester: {semester}")
-        if credit and credit > 0:
-            context_parts.append(f"Credit Hours: {credit}")
+QUESTION_TYPE_ORDER = ('multiple_choice', 'true_false', 'short_answer')
 
-        # Elective status
-        is_elective = getattr(course, 'is_elective', False)
-        context_parts.append(f"Course Type: {'Elective' if is_elective else 'Required'}")
-
-        return '\n'.join(f"- {part}" for part in context_parts)
-
-    def _get_difficulty_guidelines(self, difficulty):
-        """Return detailed guidelines for each difficulty level."""
-        guidelines = {
-            'beginner': """
+DIFFICULTY_GUIDELINES = {
+    'beginner': """
 - Focus on basic concepts, definitions, and fundamental principles
 - Questions should test recognition and basic understanding
 - Use simple language and avoid complex terminology
 - Expect direct answers from core course content""",
 
-            'intermediate': """
+    'intermediate': """
 - Focus on application, analysis, and problem-solving
 - Questions should require understanding relationships between concepts
 - Include practical scenarios and real-world applications
 - Test ability to apply knowledge, not just memorize facts""",
 
-            'advanced': """
+    'advanced': """
 - Focus on complex scenarios, critical thinking, and evaluation
 - Questions should require synthesis of multiple concepts
 - Include analysis of trade-offs, design decisions, and advanced applications
 - Test deep understanding and ability to critique or extend concepts"""
-        }
-        return guidelines.get(difficulty.lower(), guidelines['intermediate'])
-
-    def _get_question_type_specifications(self, question_types):
-        """Return detailed specifications for each question type."""
-        specs = []
+}
 
-        if 'multiple_choice' in question_types:
-            specs.append("""For multiple_choice questions:
+QUESTION_TYPE_SPECS = {
+    'multiple_choice': """For multiple_choice questions:
 - Provide exactly 4 options (A, B, C, D)
 - Only one correct answer, other options must be plausible but incorrect
 - Options should be similar in length and format
 - correct_answer should be the index (0, 1, 2, or 3) of the correct option
-- Make distractors educational, not obviously wrong""")
+- Make distractors educational, not obviously wrong""",
 
-        if 'true_false' in question_types:
-            specs.append("""For true_false questions:
+    'true_false': """For true_false questions:
 - Statement must be clearly either true or false based on course content
 - Avoid ambiguous statements that could be interpreted differently
 - correct_answer should be exactly "True" or "False" (case-sensitive)
-- Statements should be specific factual claims""")
+- Statements should be specific factual claims""",
 
-        if 'short_answer' in question_types:
-            specs.append("""For short_answer questions:
+    'short_answer': """For short_answer questions:
 - Require a specific, concise factual answer (1-3 words typically)
 - Answer should be unambiguous and directly from course content
 - Avoid questions that could have multiple valid answers
-- Test specific knowledge rather than opinions""")
-
-        return '\n\n'.join(specs)
-
-    def _build_topic_focus(self, topics, course_context):
-        """Build topic-specific focus instructions."""
-        if not topics or topics.strip() == "":
-            return "- Specific Topics: Focus on all core course content areas"
-
-        # Clean and split topics
-        topic_list = [t.strip() for t in topics.split(',') if t.strip()]
-        if not topic_list:
-            return "- Specific Topics: Focus on all core course content areas"
-
-        topic_focus = f"- Specific Topics to emphasize: {', '.join(topic_list)}"
-        topic_focus += "\n- Ensure questions specifically relate to these topics within the course context"
+- List common synonyms, abbreviations or spellings in acceptable_answers
+- For a measured or rounded number, give the allowed absolute difference in tolerance
+- Test specific knowledge rather than opinions""",
+}
 
-        return topic_focus
+OUTPUT_EXAMPLES = {
+    'multiple_choice': """  {
+    "type": "multiple_choice",
+    "content": "Specific question about course content",
+    "options": ["Option A", "Option B", "Correct Option C", "Option D"],
+    "correct_answer": 2,
+    "explanation": "Clear explanation of why this is correct and why other options are wrong",
+    "topic": "Course topic this question covers"
+  }""",
 
-    def _get_course_examples(self, course):
-        """Provide course-specific examples to guide the AI"""
-        course_title = getattr(course, 'title', 'General Course')
-        course_title_lower = course_title.lower()
+    'true_false': """  {
+    "type": "true_false",
+    "content": "Clear true/false statement about course content",
+    "correct_answer": "True",
+    "explanation": "Explanation supporting the true/false nature of the statement",
+    "topic": "Course topic this question covers"
+  }""",
 
-        if 'python' in course_title_lower or 'programming' in course_title_lower:
-            return """
+    'short_answer': """  {
+    "type": "short_answer",
+    "content": "Question requiring a specific, concise answer",
+    "correct_answer": "Precise answer",
+    "acceptable_answers": ["Common synonym or abbreviation of the answer"],
+    "explanation": "Context for the correct answer",
+    "topic": "Course topic this question covers"
+  }""",
+}
+
+# Example questions by course title keyword; the first matching row wins
+COURSE_EXAMPLES = (
+    (('python', 'programming'), """
 - What is the output of print(2**3) in Python?
 - How do you define a function in Python?
 - What is the difference between list and tuple?
-"""
-        elif 'data science' in course_title_lower or 'data' in course_title_lower:
-            return """
+"""),
+    (('data science', 'data'), """
 - What is the difference between supervised and unsupervised learning?
 - How does linear regression work?
 - What is the purpose of data preprocessing?
 - How do you handle missing values in a dataset?
-"""
-        elif 'petroleum' in course_title_lower or 'oil' in course_title_lower:
-            return """
+"""),
+    (('petroleum', 'oil'), """
 - What is the process of oil refining?
 - How does hydraulic fracturing work?
 - What are the main components of crude oil?
 - What is reservoir engineering?
-"""
-        elif 'computer engineering' in course_title_lower:
-            return """
+"""),
+    (('computer engineering',), """
 - What is the difference between Von Neumann and Harvard architecture?
 - How does a CPU execute instructions?
 - What are the main components of an operating system?
 - How does memory hierarchy work?
-"""
-        elif 'mechanical engineering' in course_title_lower:
-            return """
+"""),
+    (('mechanical engineering',), """
 - What are Newton's laws of motion?
 - How does a heat engine work?
 - What is stress-strain relationship in materials?
 - How do you calculate moment of inertia?
-"""
-        elif 'civil engineering' in course_title_lower:
-            return """
+"""),
+    (('civil engineering',), """
 - What are the different types of foundations?
 - How do you calculate beam deflection?
 - What is the purpose of reinforced concrete?
 - How does structural analysis work?
-"""
-        elif 'electrical engineering' in course_title_lower:
-            return """
+"""),
+    (('electrical engineering',), """
 - What is Ohm's law?
 - How does an electric circuit work?
 - What is electromagnetic induction?
 - How do transformers work?
-"""
-        elif 'chemical engineering' in course_title_lower:
-            return """
+"""),
+    (('chemical engineering',), """
 - What is mass balance in chemical processes?
 - How does distillation work?
 - What are the principles of chemical reactors?
 - How do you calculate reaction rates?
-"""
-        elif 'database' in course_title_lower or 'sql' in course_title_lower:
-            return """
+"""),
+    (('database', 'sql'), """
 - What is the purpose of SQL JOIN?
 - What is database normalization?
 - What is the difference between PRIMARY KEY and FOREIGN KEY?
-"""
-        elif 'web' in course_title_lower or 'django' in course_title_lower:
-            return """
+"""),
+    (('web', 'django'), """
 - What is the MVC pattern in web development?
 - How does Django handle URL routing?
 - What is the purpose of middleware?
-"""
-        elif 'math' in course_title_lower or 'calculus' in course_title_lower:
-            return """
+"""),
+    (('math', 'calculus'), """
 - What is the derivative of x²?
 - How do you solve quadratic equations?
 - What is the Pythagorean theorem?
-"""
-        elif 'statistics' in course_title_lower or 'probability' in course_title_lower:
-            return """
+"""),
+    (('statistics', 'probability'), """
 - What is the difference between mean and median?
 - How does hypothesis testing work?
 - What is a normal distribution?
 - How do you calculate confidence intervals?
-"""
-        elif 'physics' in course_title_lower:
-            return """
+"""),
+    (('physics',), """
 - What is Newton's second law?
 - How does wave interference work?
 - What is the photoelectric effect?
 - How do you calculate work and energy?
-"""
-        elif 'chemistry' in course_title_lower:
-            return """
+"""),
+    (('chemistry',), """
 - What is the periodic table organization?
 - How does acid-base titration work?
 - What are chemical reaction types?
 - How do you balance chemical equations?
-"""
-        else:
-            return f"""
-- Key concepts from {course_title}
+"""),
+)
+
+DEFAULT_COURSE_EXAMPLES = """
+- Key concepts from {title}
 - Important theories or principles
 - Practical applications
 - Historical context or developments
 """
 
-    def _parse_response(self, response_text):
+# Rough completion size of one question in tokens, JSON syntax included
+QUESTION_TOKEN_ESTIMATES = {
+    'multiple_choice': 150,
+    'true_false': 80,
+    'short_answer': 100,
+}
+RESPONSE_TOKEN_OVERHEAD = 50
+RESPONSE_TOKEN_MARGIN = 1.3
+MIN_COMPLETION_TOKENS = 256
+MAX_COMPLETION_TOKENS = 8000
+
+
+def estimate_max_tokens(num_questions, question_types):
+    """
+    Size ``max_tokens`` for a generation request.
+
+    Question types are spread evenly over the quiz, so the estimate is the
+    mean per-question cost of the requested types times ``num_questions``,
+    plus a safety margin, clamped to ``AI_QUIZ_MAX_COMPLETION_TOKENS``.
+    """
+    if isinstance(question_types, str):
+        question_types = [question_types]
+    costs = [QUESTION_TOKEN_ESTIMATES.get(t, QUESTION_TOKEN_ESTIMATES['multiple_choice'])
+             for t in question_types or ['multiple_choice']]
+    estimate = RESPONSE_TOKEN_OVERHEAD + num_questions * sum(costs) / len(costs)
+    ceiling = getattr(settings, 'AI_QUIZ_MAX_COMPLETION_TOKENS', MAX_COMPLETION_TOKENS)
+    return max(MIN_COMPLETION_TOKENS, min(int(estimate * RESPONSE_TOKEN_MARGIN), ceiling))
+
+
+def course_fingerprint(course):
+    """The course fields the prompt depends on, used as its version"""
+    program = getattr(course, 'program', None)
+    return (
+        getattr(course, 'id', None),
+        getattr(course, 'title', 'General Course'),
+        getattr(course, 'code', 'N/A'),
+        getattr(course, 'summary', '') or getattr(course, 'description', ''),
+        getattr(program, 'title', '') if program else '',
+        getattr(program, 'summary', '') if program else '',
+        getattr(course, 'level', ''),
+        getattr(course, 'year', ''),
+        getattr(course, 'semester', ''),
+        getattr(course, 'credit', 0),
+        getattr(course, 'is_elective', False),
+    )
+
+
+def course_prompt_blocks(course):
+    """
+    The course context and example question blocks of the prompt for
+    ``course``, memoized per course version.
+    """
+    return _render_course_block(course_fingerprint(course))
+
+
+@lru_cache(maxsize=512)
+def _render_course_block(fingerprint):
+    (_, title, code, description, program, program_summary,
+     level, year, semester, credit, is_elective) = fingerprint
+
+    context_parts = [f"Course Title: {title}", f"Course Code: {code}"]
+    if description:
+        context_parts.append(f"Course Description: {description}")
+    if program:
+        context_parts.append(f"Program: {program}")
+        if program_summary:
+            context_parts.append(f"Program Summary: {program_summary}")
+    if level:
+        context_parts.append(f"Academic Level: {level}")
+    if year:
+        context_parts.append(f"Year: {year}")
+    if semester:
+        context_parts.append(f"Semester: {semester}")
+    if credit and credit > 0:
+        context_parts.append(f"Credit Hours: {credit}")
+    context_parts.append(f"Course Type: {'Elective' if is_elective else 'Required'}")
+
+    context = '\n'.join(f"- {part}" for part in context_parts)
+    return context, course_examples(title)
+
+
+def course_examples(title):
+    """Example questions for a course, chosen by keywords in its title"""
+    title_lower = title.lower()
+    for keywords, examples in COURSE_EXAMPLES:
+        if any(keyword in title_lower for keyword in keywords):
+            return examples
+    return DEFAULT_COURSE_EXAMPLES.format(title=title)
+
+
+class QuestionStreamCounter:
+    """
+    Count the questions of a JSON array while it streams in, so progress
+    can be reported before the response is complete. Only brackets and
+    string quoting are tracked, which is all counting needs.
+    """
+
+    def __init__(self, on_progress):
+        self.on_progress = on_progress
+        self._reset()
+
+    def _reset(self):
+        self.depth = 0
+        self.in_string = False
+        self.escaped = False
+        self.count = 0
+
+    async def start(self):
+        """A new attempt starts streaming from scratch"""
+        self._reset()
+
+    async def feed(self, text):
+        before = self.count
+        for char in text:
+            if self.in_string:
+                if self.escaped:
+                    self.escaped = False
+                elif char == '\\':
+                    self.escaped = True
+                elif char == '"':
+                    self.in_string = False
+            elif char == '"':
+                # Quotes in prose before the array don't open strings
+                self.in_string = self.depth > 0
+            elif char in '[{':
+                self.depth += 1
+            elif char in ']}' and self.depth:
+                self.depth -= 1
+                if char == '}' and self.depth == 1:
+                    self.count += 1
+        if self.count > before:
+            await self.on_progress(self.count)
+
+
+class GroqQuizGenerator:
+    def __init__(self, model=None, provider=None):
+        self.provider = with_resilience(provider or get_provider(model=model))
+        self.model = self.provider.model
+
+    def generate_questions(self, course, difficulty, num_questions, question_types, topics=""):
+        """
+        Generate quiz questions, serving from the cache when possible.
+
+        Only one generation runs per cache key at a time: the first caller
+        takes a lock in the cache and the others wait for its result instead
+        of calling the API themselves. This needs a cache shared between
+        processes (memcached, redis) to protect more than a single worker.
+        """
+        cache_key = build_questions_cache_key(
+            course.id, difficulty, question_types, topics, self.model
+        )
+        lock_key = f"{cache_key}:lock"
+        token = uuid.uuid4().hex
+        lock_wait, lock_timeout = generation_lock_times()
+        deadline = time.monotonic() + lock_wait
+
+        while True:
+            cached_questions = cache.get(cache_key)
+            if cached_questions and len(cached_questions) >= num_questions:
+                logger.info(f"Returning cached questions for {cache_key}")
+                self._record(
+                    GroqGenerationMetric.CACHE_HIT, course,
+                    questions_requested=num_questions, questions_parsed=num_questions,
+                )
+                return cached_questions[:num_questions]
+
+            if cache.add(lock_key, token, lock_timeout):
+                try:
+                    return self._generate_and_cache(
+                        cache_key, course, difficulty, num_questions, question_types, topics
+                    )
+                finally:
+                    if cache.get(lock_key) == token:
+                        cache.delete(lock_key)
+
+            if time.monotonic() >= deadline:
+                logger.warning(f"Timed out waiting for generation of {cache_key}")
+                self._record(
+                    GroqGenerationMetric.LOCK_TIMEOUT, course, questions_requested=num_questions
+                )
+                return self._get_fallback_questions(num_questions)
+
+            time.sleep(GENERATION_LOCK_POLL_INTERVAL)
+
+    def _generate_and_cache(self, cache_key, course, difficulty, num_questions, question_types, topics):
+        """Call the API once and cache the parsed pool under ``cache_key``"""
         try:
-            # More robust cleaning
-            cleaned_text = response_text.strip()
+            questions, _ = self.generate_batch(course, difficulty, num_questions, question_types, topics)
+
+            # Cache successful results for 1 hour
+            cache.set(cache_key, questions, QUESTIONS_CACHE_TIMEOUT)
+
+            return questions[:num_questions]
+
+        except Exception as e:
+            logger.error(f"Error generating questions: {str(e)}")
+            # Return fallback questions but don't cache them
+            return self._get_fallback_questions(num_questions)
+
+    async def agenerate_questions(self, course, difficulty, num_questions, question_types, topics="",
+                                  on_progress=None):
+        """
+        ``generate_questions`` for async views: waits on the generation
+        lock and the API with ``await`` instead of blocking a thread.
+        ``course.program`` must already be loaded. ``on_progress`` is
+        awaited with the number of questions received so far while the
+        response streams in.
+        """
+        cache_key = build_questions_cache_key(
+            course.id, difficulty, question_types, topics, self.model
+        )
+        lock_key = f"{cache_key}:lock"
+        token = uuid.uuid4().hex
+        lock_wait, lock_timeout = generation_lock_times()
+        deadline = time.monotonic() + lock_wait
+
+        while True:
+            cached_questions = await cache.aget(cache_key)
+            if cached_questions and len(cached_questions) >= num_questions:
+                logger.info(f"Returning cached questions for {cache_key}")
+                await sync_to_async(self._record)(
+                    GroqGenerationMetric.CACHE_HIT, course,
+                    questions_requested=num_questions, questions_parsed=num_questions,
+                )
+                return cached_questions[:num_questions]
+
+            if await cache.aadd(lock_key, token, lock_timeout):
+                try:
+                    return await self._agenerate_and_cache(
+                        cache_key, course, difficulty, num_questions, question_types, topics,
+                        on_progress,
+                    )
+                finally:
+                    if await cache.aget(lock_key) == token:
+                        await cache.adelete(lock_key)
+
+            if time.monotonic() >= deadline:
+                logger.warning(f"Timed out waiting for generation of {cache_key}")
+                await sync_to_async(self._record)(
+                    GroqGenerationMetric.LOCK_TIMEOUT, course, questions_requested=num_questions
+                )
+                return self._get_fallback_questions(num_questions)
+
+            await asyncio.sleep(GENERATION_LOCK_POLL_INTERVAL)
+
+    async def _agenerate_and_cache(self, cache_key, course, difficulty, num_questions, question_types, topics,
+                                   on_progress=None):
+        try:
+            questions, _ = await self.agenerate_batch(
+                course, difficulty, num_questions, question_types, topics, on_progress=on_progress
+            )
+            await cache.aset(cache_key, questions, QUESTIONS_CACHE_TIMEOUT)
+            return questions[:num_questions]
 
-            # Remove all markdown code blocks
-            if '```json' in cleaned_text:
-                cleaned_text = cleaned_text.split('```json')[1]
-            if '```' in cleaned_text:
-                cleaned_text = cleaned_text.split('```')[0]
+        except Exception as e:
+            logger.error(f"Error generating questions: {str(e)}")
+            return self._get_fallback_questions(num_questions)
+
+    def generate_batch(self, course, difficulty, num_questions, question_types, topics="",
+                       source=GroqGenerationMetric.REQUEST):
+        """
+        Make one uncached API call and return the parsed questions together
+        with the provider response. Raises instead of falling back, so
+        callers never mistake fallback questions for generated ones.
+        """
+        started = time.monotonic()
+        response = None
+        questions = []
+        outcome = GroqGenerationMetric.INVALID_RESPONSE
+        try:
+            messages, max_tokens = self._prepare_batch(
+                course, difficulty, num_questions, question_types, topics
+            )
+            response = self.provider.complete(
+                messages,
+                temperature=0.7,
+                max_tokens=max_tokens,
+                timeout=30  # 30 second timeout
+            )
+            questions = self._questions_from(response, num_questions, max_tokens)
+            outcome = GroqGenerationMetric.GENERATED
+            return questions, response
+
+        except CircuitOpenError:
+            outcome = GroqGenerationMetric.CIRCUIT_OPEN
+            raise
+        except LLMProviderError:
+            outcome = GroqGenerationMetric.PROVIDER_ERROR
+            raise
+        finally:
+            self._record_batch(outcome, course, source, num_questions, questions, response, started)
+
+    async def agenerate_batch(self, course, difficulty, num_questions, question_types, topics="",
+                              source=GroqGenerationMetric.REQUEST, on_progress=None):
+        """``generate_batch`` for async views; ``course.program`` must already be loaded"""
+        started = time.monotonic()
+        response = None
+        questions = []
+        outcome = GroqGenerationMetric.INVALID_RESPONSE
+        try:
+            messages, max_tokens = self._prepare_batch(
+                course, difficulty, num_questions, question_types, topics
+            )
+            response = await self.provider.acomplete(
+                messages, temperature=0.7, max_tokens=max_tokens, timeout=30,
+                observer=QuestionStreamCounter(on_progress) if on_progress else None,
+            )
+            questions = self._questions_from(response, num_questions, max_tokens)
+            outcome = GroqGenerationMetric.GENERATED
+            return questions, response
+
+        except CircuitOpenError:
+            outcome = GroqGenerationMetric.CIRCUIT_OPEN
+            raise
+        except LLMProviderError:
+            outcome = GroqGenerationMetric.PROVIDER_ERROR
+            raise
+        finally:
+            await sync_to_async(self._record_batch)(
+                outcome, course, source, num_questions, questions, response, started
+            )
+
+    def _prepare_batch(self, course, difficulty, num_questions, question_types, topics):
+        """Chat messages and completion token budget for one generation call"""
+        prompt = self._build_prompt(course, difficulty, num_questions, question_types, topics)
+        logger.info(f"Generating {num_questions} questions for course: {course.title}")
+        messages = [{"role": "user", "content": prompt}]
+        return messages, estimate_max_tokens(num_questions, question_types)
+
+    def _questions_from(self, response, num_questions, max_tokens):
+        """Parsed questions of ``response``; raises ValueError if there are none"""
+        if response.completion_tokens >= max_tokens:
+            logger.warning(
+                f"Response used the whole {max_tokens} token budget for "
+                f"{num_questions} questions and may be truncated"
+            )
+
+        response_text = response.text
+        if not response_text:
+            raise ValueError("Empty response from the AI provider")
+
+        logger.debug(f"Raw {self.provider.name} response: {response_text[:200]}...")
+
+        questions = self._parse_response(response_text)
+        if not questions:
+            raise ValueError("No valid questions in AI response")
+        logger.info(f"Successfully parsed {len(questions)} questions")
+        return questions
+
+    def _record_batch(self, outcome, course, source, num_questions, questions, response, started):
+        self._record(
+            outcome,
+            course,
+            source=source,
+            questions_requested=num_questions,
+            questions_parsed=len(questions),
+            # An open circuit never reached the provider
+            latency_ms=(
+                None if outcome == GroqGenerationMetric.CIRCUIT_OPEN
+                else int((time.monotonic() - started) * 1000)
+            ),
+            prompt_tokens=response.prompt_tokens if response else 0,
+            completion_tokens=response.completion_tokens if response else 0,
+        )
+
+    def _record(self, outcome, course, **fields):
+        record_generation(outcome, self.provider.name, self.model, course=course, **fields)
+
+    def _build_prompt(self, course, difficulty, num_questions, question_types, topics):
+        """Build a comprehensive and context-aware prompt for quiz generation."""
+        # Ensure question_types is a list
+        if isinstance(question_types, str):
+            question_types = [question_types]
+
+        course_context, examples = course_prompt_blocks(course)
+        return PROMPT_TEMPLATE.format(
+            course_context=course_context,
+            course_examples=examples,
+            difficulty=difficulty,
+            num_questions=num_questions,
+            question_types=', '.join(question_types),
+            topic_focus=self._build_topic_focus(topics),
+            difficulty_guidelines=self._get_difficulty_guidelines(difficulty),
+            question_specs=self._get_question_type_specifications(question_types),
+            output_examples=',\n'.join(
+                OUTPUT_EXAMPLES[t] for t in QUESTION_TYPE_ORDER if t in question_types
+            ) or OUTPUT_EXAMPLES['multiple_choice'],
+        )
+
+    def _get_difficulty_guidelines(self, difficulty):
+        """Return detailed guidelines for each difficulty level."""
+        return DIFFICULTY_GUIDELINES.get(difficulty.lower(), DIFFICULTY_GUIDELINES['intermediate'])
 
-            # Remove any non-JSON prefixes/suffixes
-            lines = cleaned_text.split('\n')
-            json_lines = []
-            in_json = False
+    def _get_question_type_specifications(self, question_types):
+        """Return detailed specifications for each question type."""
+        return '\n\n'.join(
+            QUESTION_TYPE_SPECS[t] for t in QUESTION_TYPE_ORDER if t in question_types
+        )
 
-            for line in lines:
-                line = line.strip()
-                if line.startswith('[') or line.startswith('{'):
-                    in_json = True
-                if in_json:
-                    json_lines.append(line)
-                if line.endswith(']') or line.endswith('}'):
-                    break
+    def _build_topic_focus(self, topics):
+        """Build topic-specific focus instructions."""
+        topic_list = [t.strip() for t in (topics or '').split(',') if t.strip()]
+        if not topic_list:
+            return "- Specific Topics: Focus on all core course content areas"
 
-            cleaned_text = '\n'.join(json_lines)
-            cleaned_text = cleaned_text.strip()
+        return (
+            f"- Specific Topics to emphasize: {', '.join(topic_list)}"
+            "\n- Ensure questions specifically relate to these topics within the course context"
+        )
 
-            print(f"DEBUG: Cleaning response text: {cleaned_text}")  # Debug line
+    def _parse_response(self, response_text):
+        """Return the valid questions in ``response_text``, or [] if it can't be used"""
+        try:
+            # Keep only the outermost JSON array; models like to wrap it in
+            # markdown fences or prose, and may pretty-print it over many lines
+            cleaned_text = response_text.strip()
+            start = cleaned_text.find('[')
+            end = cleaned_text.rfind(']')
+            if start == -1 or end < start:
+                raise ValueError("No JSON array found in response")
+            cleaned_text = cleaned_text[start:end + 1]
 
             questions = json.loads(cleaned_text)
 
-            # Validate we got the right number of questions
-            if len(questions) < 3:  # If we got too few questions
-                print(f"DEBUG: Only got {len(questions)} questions, using fallback")
-                return self._get_fallback_questions(10)
+            if not isinstance(questions, list) or not questions:
+                logger.warning("AI response is not a list of questions")
+                return []
 
             # Validate question structure
             valid_questions = []
             for question in questions:
-                if all(key in question for key in ['type', 'content', 'correct_answer', 'explanation']):
+                if isinstance(question, dict) and all(key in question for key in ['type', 'content', 'correct_answer', 'explanation']):
                     # Ensure multiple_choice questions have options
                     if question['type'] == 'multiple_choice' and 'options' in question:
                         valid_questions.append(question)
                     elif question['type'] in ['true_false', 'short_answer']:
                         valid_questions.append(question)
 
-            print(f"DEBUG: Validated {len(valid_questions)} questions")  # Debug line
+            if len(valid_questions) < len(questions):
+                logger.warning(
+                    f"Dropped {len(questions) - len(valid_questions)} of {len(questions)} "
+                    "malformed questions from AI response"
+                )
             return valid_questions
 
         except (json.JSONDecodeError, ValueError) as e:
-            print(f"JSON parsing error: {e}")
-            print(f"Raw response was: {response_text}")
-            return self._get_fallback_questions(10)
+            logger.warning(f"Could not parse AI response ({len(response_text)} chars): {e}")
+            logger.debug(f"Unparseable AI response: {response_text[:500]}")
+            return []
 
     def _get_fallback_questions(self, num_questions):
-        """Better fallback questions"""
+        """
+        Generic questions served when generation fails, each marked with
+        ``fallback`` (see ``is_fallback``) so they are never banked for the
+        course
+        """
         fallback_questions = [
             {
                 "type": "multiple_choice",
@@ -468,4 +777,4 @@ IMPORTANT: Return ONLY the JSON array. No markdown, no explanations, no addition
                 "explanation": "Python uses dynamic typing, meaning variable types are determined at runtime rather than compile time."
             }
         ]
-        return fallback_questions[:num_questions]
+        return [{**question, 'fallback': True} for question in fallback_questions[:num_questions]]
@@ -0,0 +1,199 @@
+"""
+Answer grading for AI generated questions.
+
+Every bank question carries an ``answer_key`` compiled once by
+``compile_answer_key`` when the question is stored, so grading a submission
+only has to normalize the learner's answer and compare it against
+precomputed values.
+"""
+import re
+import unicodedata
+
+ANSWER_KEY_VERSION = 2
+
+# Short answers match when their token sets overlap this much (Jaccard)...
+TOKEN_SET_THRESHOLD = 0.75
+# ...or when every word matches the answer's word in the same place, allowing
+# a typo or two in long words. Words shorter than TYPO_MIN_LENGTH must match
+# exactly and the first TYPO_PREFIX_LENGTH characters never differ, so a typo
+# can't turn "hypertension" into "hypotension" or "mitosis" into "meiosis".
+TYPO_MIN_LENGTH = 5
+TYPO_PREFIX_LENGTH = 4
+TYPO_LONG_WORD_LENGTH = 9
+
+STOPWORDS = frozenset(['a', 'an', 'the', 'of', 'to', 'is', 'are', 'it', 'its'])
+
+PUNCTUATION_RE = re.compile(r"[^\w\s.%/-]")
+SEPARATOR_RE = re.compile(r"[\s/_-]+")
+NUMBER_RE = re.compile(r"^[-+]?(?:\d+(?:,\d{3})*(?:\.\d+)?|\.\d+)(?:e[-+]?\d+)?%?$")
+TRUE_VALUES = frozenset(['true', 't', 'yes', 'y'])
+FALSE_VALUES = frozenset(['false', 'f', 'no', 'n'])
+
+
+def normalize(text):
+    """Unicode-normalize, casefold and strip punctuation and extra spaces"""
+    text = unicodedata.normalize('NFKC', str(text)).casefold()
+    text = PUNCTUATION_RE.sub(' ', text)
+    text = SEPARATOR_RE.sub(' ', text)
+    return text.strip(' .')
+
+
+def tokenize(normalized):
+    return frozenset(token for token in normalized.split() if token not in STOPWORDS)
+
+
+def parse_number(text):
+    """Return the value of an answer that is a plain number, else None"""
+    candidate = unicodedata.normalize('NFKC', str(text)).replace(' ', '').casefold()
+    if not candidate or not NUMBER_RE.match(candidate):
+        return None
+    percent = candidate.endswith('%')
+    try:
+        value = float(candidate.rstrip('%').replace(',', ''))
+    except ValueError:
+        return None
+    return value / 100 if percent else value
+
+
+def _alternates(question):
+    answers = [question.get('correct_answer')]
+    for key in ('acceptable_answers', 'synonyms'):
+        extra = question.get(key) or []
+        if isinstance(extra, str):
+            extra = [extra]
+        answers.extend(extra)
+    return [answer for answer in answers if answer not in (None, '')]
+
+
+def compile_answer_key(question):
+    """
+    Precompute everything needed to grade ``question``: the correct option
+    for multiple choice, a boolean for true/false, and the normalized text,
+    token sets and numeric values of every acceptable short answer, plus the
+numeric tolerance the question declares.
+    """
+    question_type = question.get('type')
+    key = {'version': ANSWER_KEY_VERSION, 'type': question_type}
+
+    if question_type == 'multiple_choice':
+        try:
+            key['option'] = int(question.get('correct_answer'))
+        except (TypeError, ValueError):
+            key['option'] = None
+    elif question_type == 'true_false':
+        key['value'] = _parse_bool(normalize(question.get('correct_answer', '')))
+    else:
+        answers = []
+        for answer in _alternates(question):
+            normalized = normalize(answer)
+            if not normalized or normalized in answers:
+                continue
+            answers.append(normalized)
+        key['answers'] = answers
+        key['tokens'] = [sorted(tokenize(answer)) for answer in answers]
+        key['numbers'] = [
+            number for number in (parse_number(answer) for answer in _alternates(question))
+            if number is not None
+        ]
+        key['tolerance'] = _parse_tolerance(question.get('tolerance'))
+    return key
+
+
+def _parse_tolerance(value):
+    """The absolute numeric tolerance a question declares, 0 (exact) by default"""
+    if value in (None, ''):
+        return 0.0
+    tolerance = parse_number(value)
+    return tolerance if tolerance is not None and tolerance > 0 else 0.0
+
+
+def _parse_bool(normalized):
+    if normalized in TRUE_VALUES:
+        return True
+    if normalized in FALSE_VALUES:
+        return False
+    return None
+
+
+def edit_distance(a, b, limit):
+    """
+    Damerau-Levenshtein (optimal string alignment) distance between ``a``
+    and ``b``, or ``limit + 1`` as soon as it is known to exceed ``limit``
+    """
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous, current = None, list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        previous, before, current = current, previous, [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = a[i - 1] != b[j - 1]
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                current[j] = min(current[j], before[j - 2] + 1)
+        if min(current) > limit:
+            return limit + 1
+    return current[-1]
+
+
+def _word_matches(expected, actual):
+    if expected == actual:
+        return True
+    if min(len(expected), len(actual)) < TYPO_MIN_LENGTH:
+        return False
+    if expected[:TYPO_PREFIX_LENGTH] != actual[:TYPO_PREFIX_LENGTH]:
+        return False
+    limit = 2 if len(expected) >= TYPO_LONG_WORD_LENGTH else 1
+    return edit_distance(expected, actual, limit) <= limit
+
+
+def _words_match(answer, normalized):
+    expected, actual = answer.split(), normalized.split()
+    return len(expected) == len(actual) and all(map(_word_matches, expected, actual))
+
+
+def _grade_short_answer(key, user_answer):
+    number = parse_number(user_answer) if key['numbers'] else None
+    if number is not None:
+        # Numbers are compared by value only, exactly unless the question
+        # declares a tolerance, so neither 1944 nor 101 pass for 1945 or 100
+        return any(abs(expected - number) <= key['tolerance'] for expected in key['numbers'])
+
+    normalized = normalize(user_answer)
+    if not normalized:
+        return False
+    if normalized in key['answers']:
+        return True
+
+    user_tokens = tokenize(normalized)
+    for answer, tokens in zip(key['answers'], key['tokens']):
+        tokens = set(tokens)
+        if tokens and user_tokens:
+            overlap = len(tokens & user_tokens) / len(tokens | user_tokens)
+            if overlap >= TOKEN_SET_THRESHOLD:
+                return True
+        if _words_match(answer, normalized):
+            return True
+    return False
+
+
+def grade(key, user_answer):
+    """Whether ``user_answer`` is correct according to a compiled answer key"""
+    if user_answer is None:
+        return False
+    question_type = key.get('type')
+    if question_type == 'multiple_choice':
+        try:
+            return key['option'] is not None and int(user_answer) == key['option']
+        except (TypeError, ValueError):
+            return False
+    if question_type == 'true_false':
+        value = _parse_bool(normalize(user_answer))
+        return value is not None and value == key['value']
+    return _grade_short_answer(key, user_answer)
+
+
+def get_answer_key(question, key=None):
+    """``key`` if it was compiled by the current grader, else a fresh one for ``question``"""
+    if key and key.get('version') == ANSWER_KEY_VERSION:
+        return key
+    return compile_answer_key(question)
@@ -0,0 +1,169 @@
+"""
+Question generation jobs behind the AI quiz progress page.
+
+``ai_quiz_start`` only queues a ``GroqGenerationJob``. The first progress
+stream (server-sent events or long-poll) that claims the job runs the
+generation; every other connection watching the same job just reports the
+row's progress, so reloading the page or submitting twice never starts a
+second generation or creates a second session.
+"""
+import asyncio
+import json
+import logging
+
+from asgiref.sync import sync_to_async
+from django.utils import timezone
+
+from .gemini_quiz import GroqQuizGenerator, is_fallback
+from .llm_providers import get_provider
+from .models import GroqGenerationJob, GroqQuizSession
+
+logger = logging.getLogger(__name__)
+
+JOB_POLL_INTERVAL = 0.5  # seconds between progress checks of a watched job
+EVENT_STREAM_TIMEOUT = 120  # seconds before an event stream tells the client to reconnect
+HEARTBEAT_INTERVAL = 15  # seconds between keep-alive comments on an idle stream
+LONG_POLL_TIMEOUT = 25
+GENERATION_UNAVAILABLE = "AI question generation is unavailable right now. Please try again later."
+
+# Strong references to running generations; the event loop only keeps weak ones
+_running_jobs = set()
+
+
+async def _update_job(job_id, **fields):
+    """
+    ``aupdate`` skips ``auto_now``, so bump ``updated_at`` by hand: ``claim``
+    treats a job whose ``updated_at`` is old as abandoned
+    """
+    await GroqGenerationJob.objects.filter(pk=job_id).aupdate(updated_at=timezone.now(), **fields)
+
+
+async def run_job(job_id):
+    """Generate the questions of a claimed job and create its session"""
+    job = await GroqGenerationJob.objects.select_related(
+        'user', 'config__course__program'
+    ).aget(pk=job_id)
+    config = job.config
+    question_types = config.question_types
+    if isinstance(question_types, str):
+        question_types = [question_types]
+
+    reported = 0
+
+    async def on_progress(parsed):
+        nonlocal reported
+        # A retried call streams from zero again; never report going backwards
+        parsed = min(parsed, job.questions_requested)
+        if parsed > reported:
+            reported = parsed
+            await _update_job(job.pk, questions_parsed=parsed)
+
+    try:
+        generator = GroqQuizGenerator(provider=get_provider())
+        questions = await generator.agenerate_questions(
+            course=config.course,
+            difficulty=config.difficulty,
+            num_questions=config.num_questions,
+            question_types=question_types,
+            topics=config.topics,
+            on_progress=on_progress,
+        )
+        if not questions or is_fallback(questions):
+            # Generic fallback questions say nothing about the course and must
+            # not end up in its bank, so the learner is asked to retry instead
+            await _update_job(job.pk, status=GroqGenerationJob.FAILED, error=GENERATION_UNAVAILABLE)
+            return
+
+        session = await sync_to_async(GroqQuizSession.objects.create_with_questions)(
+            user=job.user,
+            course=config.course,
+            config=config,
+            questions=questions,
+        )
+        await _update_job(
+            job.pk,
+            status=GroqGenerationJob.DONE,
+            session=session,
+            questions_parsed=len(questions),
+        )
+    except Exception as e:
+        logger.error(f"AI generation job {job.pk} failed: {e}")
+        await _update_job(job.pk, status=GroqGenerationJob.FAILED, error=str(e)[:255])
+
+
+async def start_if_claimed(job_id):
+    """Run the job in the background if this caller is the one to claim it"""
+    if not await sync_to_async(GroqGenerationJob.objects.claim)(job_id):
+        return None
+    task = asyncio.create_task(run_job(job_id))
+    _running_jobs.add(task)
+    task.add_done_callback(_running_jobs.discard)
+    return task
+
+
+async def get_progress(job_id):
+    job = await GroqGenerationJob.objects.aget(pk=job_id)
+    return job.progress()
+
+
+def _is_finished(progress):
+    return progress['status'] in (GroqGenerationJob.DONE, GroqGenerationJob.FAILED)
+
+
+def _event(name, data):
+    return f"event: {name}\ndata: {json.dumps(data)}\n\n"
+
+
+async def progress_events(job_id):
+    """
+    Server-sent events for a job: ``progress`` whenever its state changes,
+    then ``done`` or ``failed``. Streams past ``EVENT_STREAM_TIMEOUT`` end
+    with ``timeout`` and the browser reconnects.
+    """
+    await start_if_claimed(job_id)
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + EVENT_STREAM_TIMEOUT
+    last_sent = loop.time()
+    previous = None
+
+    yield "retry: 2000\n\n"
+    while True:
+        progress = await get_progress(job_id)
+        if _is_finished(progress):
+            yield _event(progress['status'], progress)
+            return
+        if progress != previous:
+            yield _event('progress', progress)
+            previous = progress
+            last_sent = loop.time()
+        elif loop.time() - last_sent >= HEARTBEAT_INTERVAL:
+            yield ": keep-alive\n\n"
+            last_sent = loop.time()
+
+        if loop.time() >= deadline:
+            yield _event('timeout', progress)
+            return
+        await asyncio.sleep(JOB_POLL_INTERVAL)
+
+
+async def wait_for_change(job_id, since=None, timeout=LONG_POLL_TIMEOUT):
+    """
+    Long-poll fallback: return the job's progress once it differs from
+    ``since`` (``"<status>:<parsed>"``) or ``timeout`` seconds have passed.
+    The poll that claims the job waits for the whole generation instead,
+    since under WSGI the event loop doesn't outlive the request.
+    """
+    task = await start_if_claimed(job_id)
+    if task is not None:
+        await task
+        return await get_progress(job_id)
+
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while True:
+        progress = await get_progress(job_id)
+        if _is_finished(progress) or f"{progress['status']}:{progress['parsed']}" != since:
+            return progress
+        if loop.time() >= deadline:
+            return progress
+        await asyncio.sleep(JOB_POLL_INTERVAL)
@@ -0,0 +1,360 @@
+import asyncio
+import hashlib
+import json
+import logging
+import random
+import re
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+try:
+    from groq import AsyncGroq, Groq
+except ImportError:  # pragma: no cover - only the fake provider works without groq
+    AsyncGroq = Groq = None
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_GROQ_MODEL = 'llama3-70b-8192'
+# Ceiling for a single HTTP call; each request also passes its own, shorter
+# timeout. The SDK's own retries are off so ResilientProvider owns them all.
+GROQ_CLIENT_TIMEOUT = 60
+
+
+class LLMProviderError(Exception):
+    """
+    Raised when a provider fails to return a completion.
+
+    ``retryable`` tells callers whether the same request may succeed if
+    sent again (timeouts, server errors, rate limits); ``retry_after`` is
+    the delay in seconds the backend asked for, if any.
+    """
+
+    def __init__(self, message, retryable=True, retry_after=None):
+        super().__init__(message)
+        self.retryable = retryable
+        self.retry_after = retry_after
+
+
+class LLMRateLimitError(LLMProviderError):
+    """The backend rejected the request with HTTP 429"""
+
+
+class LLMResponse:
+    """Text returned by a provider together with its token usage"""
+
+    def __init__(self, text, prompt_tokens=0, completion_tokens=0):
+        self.text = text
+        self.prompt_tokens = prompt_tokens
+        self.completion_tokens = completion_tokens
+
+    def __repr__(self):
+        return f"<LLMResponse {len(self.text or '')} chars>"
+
+
+class BaseLLMProvider:
+    """
+    Interface between the quiz generator and a chat completion backend.
+
+    Subclasses implement ``complete`` and return an ``LLMResponse``; any
+    failure should be raised as ``LLMProviderError``. Providers with an
+    async client also override ``acomplete`` so async views can await the
+    call without tying up a thread.
+
+    ``acomplete`` accepts an ``observer`` that is told when an attempt
+    starts (``await observer.start()``) and fed the completion text as it
+    arrives (``await observer.feed(text)``). Streaming providers feed it
+    chunk by chunk; the others feed the whole text once.
+    """
+
+    name = None
+
+    def __init__(self, model=None):
+        self.model = model
+
+    def is_configured(self):
+        return True
+
+    def complete(self, messages, max_tokens, temperature=0.7, timeout=30):
+        raise NotImplementedError
+
+    async def acomplete(self, messages, max_tokens, temperature=0.7, timeout=30, observer=None):
+        """Async ``complete``; by default the sync call runs in a worker thread"""
+        response = await sync_to_async(self.complete, thread_sensitive=False)(
+            messages, max_tokens=max_tokens, temperature=temperature, timeout=timeout
+        )
+        if observer is not None:
+            await observer.feed(response.text or '')
+        return response
+
+    def ping(self):
+        """Send a tiny request to check the backend is reachable"""
+        return self.complete([{"role": "user", "content": "Say 'OK'"}], max_tokens=5)
+
+    async def aping(self):
+        return await self.acomplete([{"role": "user", "content": "Say 'OK'"}], max_tokens=5)
+
+
+class GroqProvider(BaseLLMProvider):
+    name = 'groq'
+
+    def __init__(self, model=None, api_key=None):
+        super().__init__(
+            model or getattr(settings, 'GROQ_MODELS', {}).get('quiz_generation', DEFAULT_GROQ_MODEL)
+        )
+        self.api_key = api_key if api_key is not None else getattr(settings, 'GROQ_API_KEY', "")
+        self._client = None
+        self._async_client = None
+
+    def is_configured(self):
+        return bool(self.api_key) and Groq is not None
+
+    @property
+    def client(self):
+        if self._client is None:
+            if not self.api_key:
+                logger.error("GROQ_API_KEY not found in settings")
+                raise ValueError("Groq API key not configured. Please set GROQ_API_KEY in your environment variables.")
+            if Groq is None:
+                raise ValueError("The groq package is not installed.")
+            self._client = Groq(
+                api_key=self.api_key, max_retries=0, timeout=GROQ_CLIENT_TIMEOUT
+            )
+        return self._client
+
+    @property
+    def async_client(self):
+        if self._async_client is None:
+            if not self.api_key:
+                logger.error("GROQ_API_KEY not found in settings")
+                raise ValueError("Groq API key not configured. Please set GROQ_API_KEY in your environment variables.")
+            if AsyncGroq is None:
+                raise ValueError("The groq package is not installed.")
+            self._async_client = AsyncGroq(
+                api_key=self.api_key, max_retries=0, timeout=GROQ_CLIENT_TIMEOUT
+            )
+        return self._async_client
+
+    def complete(self, messages, max_tokens, temperature=0.7, timeout=30):
+        try:
+            response = self.client.chat.completions.create(
+                model=self.model,
+                messages=messages,
+                temperature=temperature,
+                max_tokens=max_tokens,
+                timeout=timeout,
+            )
+        except ValueError:
+            raise
+        except Exception as e:
+            raise self._translate_error(e) from e
+        return self._to_response(response)
+
+    async def acomplete(self, messages, max_tokens, temperature=0.7, timeout=30, observer=None):
+        try:
+            response = await self.async_client.chat.completions.create(
+                model=self.model,
+                messages=messages,
+                temperature=temperature,
+                max_tokens=max_tokens,
+                timeout=timeout,
+                stream=observer is not None,
+            )
+            if observer is not None:
+                return await self._read_stream(response, observer)
+        except ValueError:
+            raise
+        except Exception as e:
+            raise self._translate_error(e) from e
+        return self._to_response(response)
+
+    async def _read_stream(self, stream, observer):
+        parts = []
+        usage = None
+        async for chunk in stream:
+            if chunk.choices:
+                text = chunk.choices[0].delta.content or ''
+                if text:
+                    parts.append(text)
+                    await observer.feed(text)
+            # Groq reports usage on the last chunk, under x_groq
+            usage = getattr(getattr(chunk, 'x_groq', None), 'usage', None) or usage
+        return LLMResponse(
+            ''.join(parts),
+            prompt_tokens=getattr(usage, 'prompt_tokens', 0) or 0,
+            completion_tokens=getattr(usage, 'completion_tokens', 0) or 0,
+        )
+
+    def _to_response(self, response):
+        usage = getattr(response, 'usage', None)
+        return LLMResponse(
+            response.choices[0].message.content,
+            prompt_tokens=getattr(usage, 'prompt_tokens', 0) or 0,
+            completion_tokens=getattr(usage, 'completion_tokens', 0) or 0,
+        )
+
+    def _translate_error(self, error):
+        """Classify a groq client exception by its HTTP status, if it has one"""
+        status_code = getattr(error, 'status_code', None)
+        if status_code is None:
+            # Timeouts and connection errors
+            return LLMProviderError(str(error))
+
+        headers = getattr(getattr(error, 'response', None), 'headers', None) or {}
+        try:
+            retry_after = float(headers.get('retry-after'))
+        except (TypeError, ValueError):
+            retry_after = None
+
+        if status_code == 429:
+            return LLMRateLimitError(str(error), retry_after=retry_after)
+        retryable = status_code >= 500 or status_code in (408, 409)
+        return LLMProviderError(str(error), retryable=retryable, retry_after=retry_after)
+
+
+class FakeLLMProvider(BaseLLMProvider):
+    """
+    Deterministic offline provider for tests and benchmarks.
+
+    The response depends only on ``seed`` and the prompt, so identical
+    prompts always produce identical questions and malformed output.
+    ``latency`` is slept before answering, ``rate_limit_rate`` and
+    ``error_rate`` are the shares of calls that raise ``LLMRateLimitError``
+    and ``LLMProviderError``, and ``malformed_rate`` the share that return
+    unparseable JSON. Errors are drawn per attempt of a prompt, so retries
+    behave like they would against a flaky backend.
+    """
+
+    name = 'fake'
+
+    NUM_QUESTIONS_RE = re.compile(r"Number of Questions:\s*(\d+)")
+    QUESTION_TYPES_RE = re.compile(r"Question Types:\s*([a-z_, ]+)")
+    COURSE_TITLE_RE = re.compile(r"Course Title:\s*(.+)")
+    TOPICS_RE = re.compile(r"Specific Topics to emphasize:\s*(.+)")
+    STREAM_CHUNKS = 8
+
+    def __init__(self, model=None, latency=0.0, error_rate=0.0, malformed_rate=0.0,
+                 rate_limit_rate=0.0, seed=0):
+        super().__init__(model or 'fake-model')
+        self.latency = float(latency)
+        self.error_rate = float(error_rate)
+        self.malformed_rate = float(malformed_rate)
+        self.rate_limit_rate = float(rate_limit_rate)
+        self.seed = seed
+        self.calls = 0
+        self._attempts = {}
+
+    def _rng(self, prompt):
+        digest = hashlib.sha256(f"{self.seed}:{prompt}".encode('utf-8')).hexdigest()
+        return random.Random(digest)
+
+    def complete(self, messages, max_tokens, temperature=0.7, timeout=30):
+        if self.latency:
+            time.sleep(self.latency)
+        return self._respond(messages)
+
+    async def acomplete(self, messages, max_tokens, temperature=0.7, timeout=30, observer=None):
+        if observer is None:
+            if self.latency:
+                await asyncio.sleep(self.latency)
+            return self._respond(messages)
+
+        # Stream the text in a few chunks spread over the latency
+        response = self._respond(messages)
+        chunk_size = max(len(response.text) // self.STREAM_CHUNKS, 1)
+        for start in range(0, len(response.text), chunk_size):
+            if self.latency:
+                await asyncio.sleep(self.latency / self.STREAM_CHUNKS)
+            await observer.feed(response.text[start:start + chunk_size])
+        return response
+
+    def _respond(self, messages):
+        self.calls += 1
+        prompt = messages[-1]['content']
+        rng = self._rng(prompt)
+        # Failures are drawn per attempt, so a retried prompt can succeed
+        attempt = self._attempts[prompt] = self._attempts.get(prompt, 0) + 1
+        attempt_rng = self._rng(f"{prompt}:{attempt}")
+
+        if attempt_rng.random() < self.rate_limit_rate:
+            raise LLMRateLimitError("Fake provider rate limit", retry_after=0)
+        if attempt_rng.random() < self.error_rate:
+            raise LLMProviderError("Fake provider error")
+
+        questions = self._build_questions(prompt, rng)
+        text = json.dumps(questions, indent=2)
+        if rng.random() < self.malformed_rate:
+            text = self._malform(text, rng)
+
+        return LLMResponse(
+            text,
+            prompt_tokens=len(prompt) // 4,
+            completion_tokens=len(text) // 4,
+        )
+
+    def _build_questions(self, prompt, rng):
+        match = self.NUM_QUESTIONS_RE.search(prompt)
+        num_questions = int(match.group(1)) if match else 5
+        match = self.QUESTION_TYPES_RE.search(prompt)
+        question_types = (
+            [t.strip() for t in match.group(1).split(',') if t.strip()]
+            if match else ['multiple_choice']
+        )
+        match = self.COURSE_TITLE_RE.search(prompt)
+        course_title = match.group(1).strip() if match else 'the course'
+        match = self.TOPICS_RE.search(prompt)
+        topics = (
+            [t.strip() for t in match.group(1).split(',') if t.strip()]
+            if match else [course_title]
+        )
+
+        questions = []
+        for i in range(num_questions):
+            question_type = question_types[i % len(question_types)]
+            question = {
+                'type': question_type,
+                'content': f"[fake] Question {i + 1} about {course_title}",
+                'explanation': f"Fake explanation {i + 1}.",
+                'topic': topics[i % len(topics)],
+            }
+            if question_type == 'multiple_choice':
+                question['options'] = [f"Option {letter}" for letter in 'ABCD']
+                question['correct_answer'] = rng.randrange(4)
+            elif question_type == 'true_false':
+                question['correct_answer'] = rng.choice(['True', 'False'])
+            else:
+                question['correct_answer'] = f"answer {i + 1}"
+            questions.append(question)
+        return questions
+
+    def _malform(self, text, rng):
+        return rng.choice([
+            text[:len(text) // 2],
+            text.replace('"', "'"),
+            "Sure! Here are your questions, one moment...",
+        ])
+
+
+PROVIDERS = {
+    GroqProvider.name: GroqProvider,
+    FakeLLMProvider.name: FakeLLMProvider,
+}
+
+
+def get_provider(name=None, **options):
+    """
+    Return the provider named by ``AI_QUIZ_PROVIDER`` (default ``groq``).
+
+    Options for the fake provider are read from ``AI_QUIZ_FAKE_PROVIDER``
+    and can be overridden with keyword arguments.
+    """
+    name = name or getattr(settings, 'AI_QUIZ_PROVIDER', GroqProvider.name)
+    try:
+        provider_class = PROVIDERS[name]
+    except KeyError:
+        raise ValueError(f"Unknown AI quiz provider: {name}")
+
+    if provider_class is FakeLLMProvider:
+        options = {**getattr(settings, 'AI_QUIZ_FAKE_PROVIDER', {}), **options}
+    return provider_class(**options)
@@ -0,0 +1,170 @@
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client, override_settings
+from django.urls import resolve, reverse
+
+from accounts.models import User
+from course.models import Course
+from quiz.models import GroqGenerationJob, GroqQuestion, GroqQuizConfig, GroqQuizSessionQuestion
+
+BENCHMARK_USERNAME = "ai_quiz_benchmark"
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark ai_quiz_start -> AIQuizTakeView end to end against the offline "
+        "fake LLM provider and report throughput, latency and parse success rate"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=50, help="Number of quizzes to start")
+        parser.add_argument("--concurrency", type=int, default=1, help="Parallel clients")
+        parser.add_argument("--course", type=int, help="Course id (defaults to the first course)")
+        parser.add_argument("--num-questions", type=int, default=10)
+        parser.add_argument(
+            "--question-types",
+            default="multiple_choice,true_false,short_answer",
+            help="Comma-separated question types",
+        )
+        parser.add_argument("--latency", type=float, default=0.0, help="Fake provider latency in seconds")
+        parser.add_argument("--error-rate", type=float, default=0.0, help="Share of calls that raise")
+        parser.add_argument("--malformed-rate", type=float, default=0.0, help="Share of calls returning bad JSON")
+        parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="Share of calls rejected with 429")
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        course = self._get_course(options["course"])
+        user, created_user = User.objects.get_or_create(
+            username=BENCHMARK_USERNAME, defaults={"is_student": True}
+        )
+        question_types = [t.strip() for t in options["question_types"].split(",") if t.strip()]
+
+        # Every config gets its own topic so each request misses the question cache
+        configs = GroqQuizConfig.objects.bulk_create(
+            GroqQuizConfig(
+                user=user,
+                course=course,
+                difficulty="beginner",
+                num_questions=options["num_questions"],
+                questions_per_session=options["num_questions"],
+                question_types=question_types,
+                topics=f"benchmark run {time.time_ns()} request {i}",
+            )
+            for i in range(options["requests"])
+        )
+        # bulk_create only sets primary keys on some backends
+        if configs and configs[0].pk is None:
+            configs = list(
+                GroqQuizConfig.objects.filter(user=user, topics__startswith="benchmark run").order_by("pk")
+            )
+
+        fake_options = {
+            "latency": options["latency"],
+            "error_rate": options["error_rate"],
+            "malformed_rate": options["malformed_rate"],
+            "rate_limit_rate": options["rate_limit_rate"],
+            "seed": options["seed"],
+        }
+        overrides = {
+            "AI_QUIZ_PROVIDER": "fake",
+            "AI_QUIZ_FAKE_PROVIDER": fake_options,
+            "ALLOWED_HOSTS": [*settings.ALLOWED_HOSTS, "testserver"],
+        }
+
+        local = threading.local()
+
+        def run_one(config):
+            if not hasattr(local, "client"):
+                local.client = Client()
+                local.client.force_login(user)
+            started = time.perf_counter()
+            response = local.client.get(reverse("ai_quiz_start", kwargs={"pk": config.pk}))
+            url = response.url if response.status_code == 302 else None
+            # A generated quiz redirects to its job's progress page; follow the
+            # job like the page does until it finishes
+            if url and resolve(url).url_name == "ai_quiz_progress":
+                url = self._wait_for_job(local.client, resolve(url).kwargs["job_id"])
+            session_id = None
+            if url and resolve(url).url_name == "ai_quiz_take":
+                session_id = resolve(url).kwargs["session_id"]
+                response = local.client.get(url)
+            elapsed = time.perf_counter() - started
+            return elapsed, response.status_code, session_id
+
+        try:
+            with override_settings(**overrides):
+                started = time.perf_counter()
+                with ThreadPoolExecutor(max_workers=options["concurrency"]) as pool:
+                    results = list(pool.map(self._closing(run_one), configs))
+                wall_time = time.perf_counter() - started
+
+            self._report(results, wall_time)
+        finally:
+            GroqQuizConfig.objects.filter(pk__in=[c.pk for c in configs]).delete()
+            GroqQuestion.objects.filter(course=course, content__startswith="[fake]").delete()
+            if created_user:
+                user.delete()
+
+    def _wait_for_job(self, client, job_id):
+        """Long-poll a generation job; return its quiz url, or None if it failed"""
+        status_url = reverse("ai_quiz_job_status", kwargs={"job_id": job_id})
+        since = None
+        while True:
+            response = client.get(status_url, {"since": since} if since else {})
+            if response.status_code != 200:
+                return None
+            progress = response.json()
+            if progress["status"] == GroqGenerationJob.DONE:
+                return progress.get("url")
+            if progress["status"] == GroqGenerationJob.FAILED:
+                return None
+            since = f"{progress['status']}:{progress['parsed']}"
+
+    def _closing(self, func):
+        def wrapper(*args):
+            try:
+                return func(*args)
+            finally:
+                if threading.current_thread() is not threading.main_thread():
+                    connection.close()
+        return wrapper
+
+    def _get_course(self, course_id):
+        if course_id:
+            course = Course.objects.filter(pk=course_id).first()
+        else:
+            course = Course.objects.order_by("pk").first()
+        if course is None:
+            raise CommandError("No course found. Create a course or pass --course.")
+        return course
+
+    def _report(self, results, wall_time):
+        latencies = sorted(r[0] for r in results)
+        session_ids = [r[2] for r in results if r[2]]
+        failed = sum(1 for r in results if r[2] is None or r[1] != 200)
+
+        parsed = GroqQuizSessionQuestion.objects.filter(
+            session_id__in=session_ids, position=0, question__content__startswith="[fake]"
+        ).count()
+
+        total = len(results)
+        self.stdout.write(self.style.SUCCESS("AI quiz benchmark"))
+        self.stdout.write(f"  requests:        {total}")
+        self.stdout.write(f"  wall time:       {wall_time:.2f}s")
+        self.stdout.write(f"  throughput:      {total / wall_time if wall_time else 0:.1f} quizzes/s")
+        if latencies:
+            p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+            self.stdout.write(f"  latency p50:     {statistics.median(latencies) * 1000:.1f} ms")
+            self.stdout.write(f"  latency p95:     {p95 * 1000:.1f} ms")
+        self.stdout.write(f"  failed requests: {failed}")
+        self.stdout.write(
+            f"  parse success:   {parsed}/{len(session_ids)}"
+            f" ({parsed / len(session_ids) * 100 if session_ids else 0:.1f}%)"
+        )
+        self.stdout.write(f"  fallback used:   {len(session_ids) - parsed}")
@@ -0,0 +1,266 @@
+import gzip
+import json
+import os
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import Exists, F, OuterRef, Prefetch
+from django.utils import timezone
+
+from quiz.models import (
+    GroqGenerationJob,
+    GroqGenerationMetric,
+    GroqQuizConfig,
+    GroqQuizSession,
+    GroqQuizSessionQuestion,
+    GroqQuizSummary,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Apply the AI quiz retention policy: merge duplicate configs, archive "
+        "completed sessions older than the retention period to gzipped JSON "
+        "lines, fold them into monthly summary rows and delete them, then drop "
+        "old finished generation jobs, old configs no session uses and "
+        "generation metrics past their own retention period"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--days",
+            type=int,
+            default=getattr(settings, "AI_QUIZ_RETENTION_DAYS", 180),
+            help="Keep completed sessions for this many days",
+        )
+        parser.add_argument(
+            "--archive-dir",
+            default=getattr(settings, "AI_QUIZ_ARCHIVE_DIR", None),
+            help="Private directory the session archives are written to, outside "
+            "MEDIA_ROOT (default: the AI_QUIZ_ARCHIVE_DIR setting)",
+        )
+        parser.add_argument(
+            "--metrics-days",
+            type=int,
+            default=getattr(settings, "AI_QUIZ_METRICS_RETENTION_DAYS", 90),
+            help="Keep generation metrics for this many days",
+        )
+        parser.add_argument("--batch-size", type=int, default=500)
+        parser.add_argument(
+            "--dry-run", action="store_true", help="Report what would change without saving"
+        )
+
+    def handle(self, *args, **options):
+        if options["days"] < 1 or options["metrics_days"] < 1:
+            raise CommandError("--days and --metrics-days must be at least 1")
+        cutoff = timezone.now() - timedelta(days=options["days"])
+        dry_run = options["dry_run"]
+        if not dry_run:
+            self._check_archive_dir(options["archive_dir"])
+
+        merged = self._merge_duplicate_configs(dry_run)
+        archived, archive_path = self._compact_sessions(
+            cutoff, options["archive_dir"], options["batch_size"], dry_run
+        )
+        jobs = self._delete_finished_jobs(cutoff, dry_run)
+        unused = self._delete_unused_configs(cutoff, dry_run)
+        metrics = self._delete_old_metrics(
+            timezone.now() - timedelta(days=options["metrics_days"]),
+            options["batch_size"],
+            dry_run,
+        )
+
+        prefix = "[dry run] " if dry_run else ""
+        message = (
+            f"{prefix}Merged {merged} duplicate configs, compacted {archived} sessions, "
+            f"deleted {jobs} finished generation jobs, {unused} unused configs "
+            f"and {metrics} old generation metrics"
+        )
+        if archive_path:
+            message += f"; archive: {archive_path}"
+        self.stdout.write(self.style.SUCCESS(message))
+
+    def _check_archive_dir(self, archive_dir):
+        """Archives hold learners' answers, so they must never be publicly served"""
+        if not archive_dir:
+            raise CommandError("Set AI_QUIZ_ARCHIVE_DIR or pass --archive-dir")
+        archive_dir = os.path.realpath(archive_dir)
+        media_root = os.path.realpath(settings.MEDIA_ROOT)
+        if os.path.commonpath([archive_dir, media_root]) == media_root:
+            raise CommandError("The archive directory must be outside MEDIA_ROOT")
+
+    def _merge_duplicate_configs(self, dry_run):
+        """Point sessions of duplicate configs at the oldest one and delete the rest"""
+        # Configs with a generation in flight are merged on a later run
+        generating = set(
+            GroqGenerationJob.objects.filter(status__in=GroqGenerationJob.ACTIVE).values_list(
+                "config_id", flat=True
+            )
+        )
+        survivors = {}
+        duplicates = defaultdict(list)
+        for config in GroqQuizConfig.objects.order_by("pk").iterator(chunk_size=2000):
+            key = config.parameters()
+            if key not in survivors:
+                survivors[key] = config.pk
+            elif config.pk not in generating:
+                duplicates[survivors[key]].append(config.pk)
+
+        if not dry_run:
+            for survivor, duplicate_ids in duplicates.items():
+                with transaction.atomic():
+                    GroqQuizSession.objects.filter(config_id__in=duplicate_ids).update(
+                        config_id=survivor
+                    )
+                    GroqGenerationJob.objects.filter(config_id__in=duplicate_ids).update(
+                        config_id=survivor
+                    )
+                    GroqQuizConfig.objects.filter(pk__in=duplicate_ids).delete()
+        return sum(len(ids) for ids in duplicates.values())
+
+    def _compact_sessions(self, cutoff, archive_dir, batch_size, dry_run):
+        sessions = GroqQuizSession.objects.filter(completed=True, completed_at__lt=cutoff)
+        if dry_run:
+            return sessions.count(), None
+
+        os.makedirs(archive_dir, exist_ok=True)
+        archive_path = os.path.join(
+            archive_dir, f"ai_quiz_sessions_{timezone.now():%Y%m%d_%H%M%S}.jsonl.gz"
+        )
+        items = GroqQuizSessionQuestion.objects.select_related("question", "answer")
+
+        archived = 0
+        with gzip.open(archive_path, "wt", encoding="utf-8") as archive:
+            while True:
+                batch = list(
+                    sessions.select_related("config")
+                    .prefetch_related(Prefetch("items", queryset=items))
+                    .order_by("pk")[:batch_size]
+                )
+                if not batch:
+                    break
+
+                for session in batch:
+                    archive.write(json.dumps(self._serialize(session), cls=DjangoJSONEncoder))
+                    archive.write("\n")
+                # The rows are only deleted once their archive lines are on disk
+                archive.flush()
+                os.fsync(archive.fileno())
+
+                with transaction.atomic():
+                    self._add_to_summaries(batch)
+                    GroqQuizSession.objects.filter(pk__in=[s.pk for s in batch]).delete()
+                archived += len(batch)
+
+        if not archived:
+            os.remove(archive_path)
+            return 0, None
+        return archived, archive_path
+
+    def _serialize(self, session):
+        config = session.config
+        return {
+            "id": session.pk,
+            "user_id": session.user_id,
+            "course_id": session.course_id,
+            "config": {
+                "difficulty": config.difficulty,
+                "num_questions": config.num_questions,
+                "questions_per_session": config.questions_per_session,
+                "question_types": config.question_types,
+                "topics": config.topics,
+                "adaptive": config.adaptive,
+            },
+            "started_at": session.started_at,
+            "completed_at": session.completed_at,
+            "score": session.score,
+            "questions_answered": session.questions_answered,
+            "percentage": session.percentage,
+            "ability": session.ability,
+            "items": [self._serialize_item(item) for item in session.items.all()],
+        }
+
+    def _serialize_item(self, item):
+        row = {
+            "position": item.position,
+            "session_number": item.session_number,
+            "question_id": item.question_id,
+            "question": item.question.data,
+        }
+        answer = getattr(item, "answer", None)
+        if answer is not None:
+            row.update(
+                answer=answer.answer,
+                is_correct=answer.is_correct,
+                latency_ms=answer.latency_ms,
+                answered_at=answer.answered_at,
+            )
+        return row
+
+    def _add_to_summaries(self, sessions):
+        totals = defaultdict(lambda: [0, 0, 0])
+        for session in sessions:
+            month = timezone.localtime(session.completed_at).date().replace(day=1)
+            row = totals[(session.user_id, session.course_id, month)]
+            row[0] += 1
+            row[1] += session.questions_answered
+            row[2] += session.score
+
+        for (user_id, course_id, month), (count, answered, correct) in totals.items():
+            updated = GroqQuizSummary.objects.filter(
+                user_id=user_id, course_id=course_id, month=month
+            ).update(
+                sessions=F("sessions") + count,
+                questions_answered=F("questions_answered") + answered,
+                correct=F("correct") + correct,
+            )
+            if not updated:
+                GroqQuizSummary.objects.create(
+                    user_id=user_id,
+                    course_id=course_id,
+                    month=month,
+                    sessions=count,
+                    questions_answered=answered,
+                    correct=correct,
+                )
+
+    def _delete_finished_jobs(self, cutoff, dry_run):
+        jobs = GroqGenerationJob.objects.filter(updated_at__lt=cutoff).exclude(
+            status__in=GroqGenerationJob.ACTIVE
+        )
+        if dry_run:
+            return jobs.count()
+        return jobs.delete()[0]
+
+    def _delete_unused_configs(self, cutoff, dry_run):
+        unused = (
+            GroqQuizConfig.objects.filter(created_at__lt=cutoff)
+            .exclude(Exists(GroqQuizSession.objects.filter(config=OuterRef("pk"))))
+            # A reused old config may have a generation in flight
+            .exclude(
+                Exists(
+                    GroqGenerationJob.objects.filter(
+                        config=OuterRef("pk"), status__in=GroqGenerationJob.ACTIVE
+                    )
+                )
+            )
+        )
+        if dry_run:
+            return unused.count()
+        return unused.delete()[1].get(GroqQuizConfig._meta.label, 0)
+
+    def _delete_old_metrics(self, cutoff, batch_size, dry_run):
+        """Delete in batches so one run never holds a long lock on a busy table"""
+        metrics = GroqGenerationMetric.objects.filter(created_at__lt=cutoff)
+        if dry_run:
+            return metrics.count()
+        deleted = 0
+        while True:
+            batch = list(metrics.values_list("pk", flat=True)[:batch_size])
+            if not batch:
+                return deleted
+            deleted += GroqGenerationMetric.objects.filter(pk__in=batch).delete()[0]
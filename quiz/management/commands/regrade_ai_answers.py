@@ -0,0 +1,105 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, Q
+
+from quiz.grading import ANSWER_KEY_VERSION, compile_answer_key, grade
+from quiz.models import GroqQuestion, GroqQuizAnswer, GroqQuizSession
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompile stale AI question answer keys and regrade stored AI quiz "
+        "answers with the current grader, updating session scores"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--course", type=int, help="Only regrade answers for this course id")
+        parser.add_argument("--batch-size", type=int, default=500)
+        parser.add_argument(
+            "--dry-run", action="store_true", help="Report what would change without saving"
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        dry_run = options["dry_run"]
+
+        questions = GroqQuestion.objects.exclude(answer_key__version=ANSWER_KEY_VERSION)
+        answers = GroqQuizAnswer.objects.select_related("item__question").only(
+            "is_correct",
+            "answer",
+            "session_id",
+            "item__question__data",
+            "item__question__answer_key",
+        )
+        if options["course"]:
+            questions = questions.filter(course_id=options["course"])
+            answers = answers.filter(session__course_id=options["course"])
+
+        recompiled = self._recompile_keys(questions, batch_size, dry_run)
+
+        checked = 0
+        changed = []
+        flipped = 0
+        sessions = set()
+        for answer in answers.order_by("pk").iterator(chunk_size=batch_size):
+            checked += 1
+            question = answer.item.question
+            if question.answer_key.get("version") != ANSWER_KEY_VERSION:
+                question.answer_key = compile_answer_key(question.data)
+            is_correct = grade(question.answer_key, answer.answer)
+            if is_correct != answer.is_correct:
+                answer.is_correct = is_correct
+                changed.append(answer)
+                sessions.add(answer.session_id)
+            if len(changed) >= batch_size:
+                flipped += self._save_answers(changed, dry_run)
+                changed = []
+        flipped += self._save_answers(changed, dry_run)
+
+        rescored = self._rescore_sessions(sessions, batch_size, dry_run)
+
+        prefix = "[dry run] " if dry_run else ""
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{prefix}Recompiled {recompiled} answer keys, checked {checked} answers, "
+                f"regraded {flipped}, rescored {rescored} sessions"
+            )
+        )
+
+    def _recompile_keys(self, questions, batch_size, dry_run):
+        count = 0
+        batch = []
+        for question in questions.only("data").iterator(chunk_size=batch_size):
+            question.answer_key = compile_answer_key(question.data)
+            batch.append(question)
+            count += 1
+            if len(batch) >= batch_size and not dry_run:
+                GroqQuestion.objects.bulk_update(batch, ["answer_key"])
+                batch = []
+        if batch and not dry_run:
+            GroqQuestion.objects.bulk_update(batch, ["answer_key"])
+        return count
+
+    def _save_answers(self, answers, dry_run):
+        if answers and not dry_run:
+            GroqQuizAnswer.objects.bulk_update(answers, ["is_correct"])
+        return len(answers)
+
+    def _rescore_sessions(self, session_ids, batch_size, dry_run):
+        session_ids = sorted(session_ids)
+        if dry_run:
+            return len(session_ids)
+        for start in range(0, len(session_ids), batch_size):
+            chunk = session_ids[start:start + batch_size]
+            sessions = list(
+                GroqQuizSession.objects.filter(pk__in=chunk)
+                .annotate(correct=Count("answers", filter=Q(answers__is_correct=True)))
+                .only("pk", "score", "completed", "questions_answered", "percentage")
+            )
+            for session in sessions:
+                session.score = session.correct
+                if session.completed and session.questions_answered:
+                    session.percentage = round(session.score / session.questions_answered * 100)
+            with transaction.atomic():
+                GroqQuizSession.objects.bulk_update(sessions, ["score", "percentage"])
+        return len(session_ids)
@@ -0,0 +1,154 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count
+
+from core.models import Semester
+from course.models import Course
+from quiz.gemini_quiz import GroqQuizGenerator
+from quiz.llm_providers import get_provider
+from quiz.models import GroqGenerationMetric, GroqQuestion, GroqQuizConfig
+
+
+class Command(BaseCommand):
+    help = (
+        "Pre-generate AI question pools for the current semester's courses, per "
+        "difficulty and question type, so students are served without waiting "
+        "for the LLM. Meant to run from cron; stops when the call or token "
+        "budget is spent."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--target",
+            type=int,
+            default=getattr(settings, "AI_QUIZ_POOL_TARGET", 30),
+            help="Questions wanted per course, difficulty and question type",
+        )
+        parser.add_argument("--batch-size", type=int, default=10, help="Questions per LLM call")
+        parser.add_argument("--max-calls", type=int, default=20, help="LLM calls allowed in this run")
+        parser.add_argument(
+            "--max-tokens", type=int, default=100000, help="Prompt plus completion tokens allowed in this run"
+        )
+        parser.add_argument("--course", type=int, action="append", help="Only warm these course ids")
+        parser.add_argument(
+            "--difficulty",
+            action="append",
+            choices=[d for d, _ in GroqQuizConfig.DIFFICULTY_LEVELS],
+            help="Only warm these difficulties",
+        )
+        parser.add_argument(
+            "--question-type",
+            action="append",
+            choices=[t for t, _ in GroqQuizConfig.QUESTION_TYPES],
+            help="Only warm these question types",
+        )
+        parser.add_argument(
+            "--all-courses", action="store_true", help="Ignore the current semester and warm every course"
+        )
+        parser.add_argument("--dry-run", action="store_true", help="Only report the pool deficits")
+
+    def handle(self, *args, **options):
+        courses = self._get_courses(options)
+        difficulties = options["difficulty"] or [d for d, _ in GroqQuizConfig.DIFFICULTY_LEVELS]
+        question_types = options["question_type"] or [t for t, _ in GroqQuizConfig.QUESTION_TYPES]
+        target = options["target"]
+
+        deficits = self._get_deficits(courses, difficulties, question_types, target)
+        if not deficits:
+            self.stdout.write(self.style.SUCCESS("All question pools are warm"))
+            return
+
+        for course, difficulty, question_type, missing in deficits:
+            self.stdout.write(f"{course.code} {difficulty} {question_type}: {missing} missing")
+        if options["dry_run"]:
+            return
+
+        provider = get_provider()
+        if not provider.is_configured():
+            raise CommandError("The AI quiz provider is not configured")
+        generator = GroqQuizGenerator(provider=provider)
+
+        calls = tokens = added = 0
+        for course, difficulty, question_type, missing in deficits:
+            while missing > 0:
+                if calls >= options["max_calls"] or tokens >= options["max_tokens"]:
+                    self._report(calls, tokens, added, budget_spent=True)
+                    return
+
+                calls += 1
+                try:
+                    questions, response = generator.generate_batch(
+                        course,
+                        difficulty,
+                        min(options["batch_size"], missing),
+                        [question_type],
+                        source=GroqGenerationMetric.WARM,
+                    )
+                except Exception as e:
+                    self.stderr.write(f"{course.code} {difficulty} {question_type}: {e}")
+                    break
+                tokens += response.prompt_tokens + response.completion_tokens
+
+                questions = [q for q in questions if q.get("type") == question_type]
+                before = self._pool_size(course, difficulty, question_type)
+                GroqQuestion.objects.get_or_create_many(course, difficulty, questions)
+                new = self._pool_size(course, difficulty, question_type) - before
+                added += new
+                missing -= new
+                if not new:
+                    # The model only repeats questions the pool already has
+                    self.stdout.write(f"{course.code} {difficulty} {question_type}: saturated")
+                    break
+
+        self._report(calls, tokens, added, budget_spent=False)
+
+    def _get_courses(self, options):
+        courses = Course.objects.select_related("program").order_by("pk")
+        if options["course"]:
+            return list(courses.filter(pk__in=options["course"]))
+        if options["all_courses"]:
+            return list(courses)
+
+        semester = Semester.objects.filter(is_current_semester=True).first()
+        if semester is None:
+            raise CommandError("No current semester is set. Pass --all-courses or --course.")
+        return list(courses.filter(semester=semester.semester))
+
+    def _get_deficits(self, courses, difficulties, question_types, target):
+        """Missing questions per pool, most popular courses and biggest gaps first"""
+        sizes = {
+            (row["course"], row["difficulty"], row["question_type"]): row["size"]
+            for row in GroqQuestion.objects.filter(
+                course__in=courses, difficulty__in=difficulties, question_type__in=question_types
+            )
+            .values("course", "difficulty", "question_type")
+            .annotate(size=Count("id"))
+        }
+        demand = dict(
+            GroqQuizConfig.objects.filter(course__in=courses)
+            .values("course")
+            .annotate(configs=Count("id"))
+            .values_list("course", "configs")
+        )
+
+        deficits = []
+        for course in courses:
+            for difficulty in difficulties:
+                for question_type in question_types:
+                    missing = target - sizes.get((course.pk, difficulty, question_type), 0)
+                    if missing > 0:
+                        deficits.append((course, difficulty, question_type, missing))
+        deficits.sort(key=lambda d: (-demand.get(d[0].pk, 0), -d[3], d[0].pk))
+        return deficits
+
+    def _pool_size(self, course, difficulty, question_type):
+        return GroqQuestion.objects.filter(
+            course=course, difficulty=difficulty, question_type=question_type
+        ).count()
+
+    def _report(self, calls, tokens, added, budget_spent):
+        message = f"Added {added} questions with {calls} LLM calls ({tokens} tokens)"
+        if budget_spent:
+            self.stdout.write(self.style.WARNING(f"{message}; budget spent, some pools are still cold"))
+        else:
+            self.stdout.write(self.style.SUCCESS(message))
@@ -0,0 +1,184 @@
+"""
+Instrumentation for AI question generation.
+
+Every request for questions is recorded as a ``GroqGenerationMetric`` row;
+the summary page and the Prometheus endpoint are both computed from that
+table with aggregate queries over a bounded window, and
+``compact_ai_quiz_data`` drops rows past their retention period.
+"""
+import logging
+import math
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import DatabaseError, transaction
+from django.db.models import Count, Q, Sum
+from django.utils import timezone
+
+from .models import GroqGenerationMetric
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds of the generation latency histogram, in seconds
+LATENCY_BUCKETS = (0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60)
+
+
+def record_generation(outcome, provider, model, course=None, source=GroqGenerationMetric.REQUEST,
+                      questions_requested=0, questions_parsed=0, latency_ms=None,
+                      prompt_tokens=0, completion_tokens=0):
+    """Store one generation metric; failures are logged and never raised"""
+    logger.info(
+        f"ai_generation outcome={outcome} provider={provider} model={model} source={source} "
+        f"latency_ms={latency_ms} prompt_tokens={prompt_tokens} completion_tokens={completion_tokens} "
+        f"questions={questions_parsed}/{questions_requested}"
+    )
+    try:
+        # A savepoint, so a failed insert can't break the caller's transaction
+        with transaction.atomic():
+            GroqGenerationMetric.objects.create(
+                outcome=outcome,
+                provider=provider,
+                model=model,
+                course_id=getattr(course, 'pk', None),
+                source=source,
+                questions_requested=questions_requested,
+                questions_parsed=questions_parsed,
+                latency_ms=latency_ms,
+                prompt_tokens=prompt_tokens,
+                completion_tokens=completion_tokens,
+            )
+    except DatabaseError as e:
+        logger.warning(f"Could not record AI generation metric: {e}")
+
+
+def _latency_histogram(queryset):
+    """Cumulative bucket counts, latency sum and count for LLM calls in ``queryset``"""
+    calls = queryset.filter(latency_ms__isnull=False)
+    aggregates = {
+        f"le_{i}": Count('id', filter=Q(latency_ms__lte=bound * 1000))
+        for i, bound in enumerate(LATENCY_BUCKETS)
+    }
+    row = calls.aggregate(count=Count('id'), total_ms=Sum('latency_ms'), **aggregates)
+    buckets = [(bound, row[f"le_{i}"]) for i, bound in enumerate(LATENCY_BUCKETS)]
+    return buckets, (row['total_ms'] or 0) / 1000, row['count']
+
+
+def _quantile(buckets, count, q):
+    """Upper bound of the histogram bucket holding quantile ``q``"""
+    if not count:
+        return None
+    rank = math.ceil(q * count)
+    for bound, cumulative in buckets:
+        if cumulative >= rank:
+            return bound
+    return math.inf
+
+
+def summarize(queryset=None):
+    """Rates, latency quantiles and token totals for ``queryset`` of metrics"""
+    if queryset is None:
+        queryset = GroqGenerationMetric.objects.all()
+
+    totals = queryset.aggregate(
+        total=Count('id'),
+        requests=Count('id', filter=Q(source=GroqGenerationMetric.REQUEST)),
+        cache_hits=Count('id', filter=Q(outcome=GroqGenerationMetric.CACHE_HIT)),
+        llm_calls=Count('id', filter=Q(latency_ms__isnull=False)),
+        invalid=Count('id', filter=Q(outcome=GroqGenerationMetric.INVALID_RESPONSE)),
+        fallbacks=Count(
+            'id',
+            filter=Q(source=GroqGenerationMetric.REQUEST, outcome__in=GroqGenerationMetric.FALLBACK_OUTCOMES),
+        ),
+        prompt_tokens=Sum('prompt_tokens'),
+        completion_tokens=Sum('completion_tokens'),
+        questions_requested=Sum('questions_requested'),
+        questions_parsed=Sum('questions_parsed'),
+    )
+    buckets, latency_sum, latency_count = _latency_histogram(queryset)
+
+    def ratio(part, whole):
+        return round(part / whole * 100, 1) if whole else 0
+
+    return {
+        **totals,
+        'prompt_tokens': totals['prompt_tokens'] or 0,
+        'completion_tokens': totals['completion_tokens'] or 0,
+        'cache_hit_rate': ratio(totals['cache_hits'], totals['requests']),
+        'parse_failure_rate': ratio(totals['invalid'], totals['llm_calls']),
+        'fallback_rate': ratio(totals['fallbacks'], totals['requests']),
+        'latency_p50': _quantile(buckets, latency_count, 0.5),
+        'latency_p95': _quantile(buckets, latency_count, 0.95),
+        'latency_avg': round(latency_sum / latency_count, 2) if latency_count else None,
+        'latency_buckets': [
+            {'le': bound, 'count': cumulative} for bound, cumulative in buckets
+        ],
+        'by_outcome': list(
+            queryset.values('outcome').annotate(count=Count('id')).order_by('-count')
+        ),
+        'by_model': list(
+            queryset.values('provider', 'model')
+            .annotate(
+                count=Count('id'),
+                prompt_tokens=Sum('prompt_tokens'),
+                completion_tokens=Sum('completion_tokens'),
+            )
+            .order_by('-count')
+        ),
+    }
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def prometheus_text():
+    """
+    Metrics of the last ``AI_QUIZ_METRICS_WINDOW_MINUTES`` in the Prometheus
+    text exposition format. They are gauges over that window rather than
+    all-time counters, so a scrape only aggregates recent, indexed rows.
+    """
+    minutes = getattr(settings, 'AI_QUIZ_METRICS_WINDOW_MINUTES', 60)
+    recent = GroqGenerationMetric.objects.filter(
+        created_at__gte=timezone.now() - timedelta(minutes=minutes)
+    )
+    lines = [
+        f"# HELP ai_quiz_generation_total AI question requests by outcome in the last {minutes} minutes.",
+        "# TYPE ai_quiz_generation_total gauge",
+    ]
+    by_labels = (
+        recent.values('provider', 'model', 'source', 'outcome')
+        .annotate(count=Count('id'), prompt=Sum('prompt_tokens'), completion=Sum('completion_tokens'))
+        .order_by('provider', 'model', 'source', 'outcome')
+    )
+    tokens = {}
+    for row in by_labels:
+        labels = (
+            f'provider="{_escape(row["provider"])}",model="{_escape(row["model"])}",'
+            f'source="{row["source"]}",outcome="{row["outcome"]}"'
+        )
+        lines.append(f"ai_quiz_generation_total{{{labels}}} {row['count']}")
+        key = (row['provider'], row['model'])
+        prompt, completion = tokens.get(key, (0, 0))
+        tokens[key] = (prompt + (row['prompt'] or 0), completion + (row['completion'] or 0))
+
+    lines += [
+        f"# HELP ai_quiz_tokens_total Tokens sent to and received from the LLM in the last {minutes} minutes.",
+        "# TYPE ai_quiz_tokens_total gauge",
+    ]
+    for (provider, model), (prompt, completion) in sorted(tokens.items()):
+        labels = f'provider="{_escape(provider)}",model="{_escape(model)}"'
+        lines.append(f'ai_quiz_tokens_total{{{labels},direction="prompt"}} {prompt}')
+        lines.append(f'ai_quiz_tokens_total{{{labels},direction="completion"}} {completion}')
+
+    buckets, latency_sum, latency_count = _latency_histogram(recent)
+    lines += [
+        "# HELP ai_quiz_generation_latency_seconds Time spent in LLM calls, retries included, "
+        f"in the last {minutes} minutes.",
+        "# TYPE ai_quiz_generation_latency_seconds gauge",
+    ]
+    for bound, cumulative in buckets:
+        lines.append(f'ai_quiz_generation_latency_seconds_bucket{{le="{bound}"}} {cumulative}')
+    lines.append(f'ai_quiz_generation_latency_seconds_bucket{{le="+Inf"}} {latency_count}')
+    lines.append(f"ai_quiz_generation_latency_seconds_sum {latency_sum}")
+    lines.append(f"ai_quiz_generation_latency_seconds_count {latency_count}")
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,189 @@
+# Generated by Django 4.2.11 on 2026-10-19 14:05
+
+import hashlib
+import json
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def _content_hash(question):
+    options = question.get("options") or []
+    payload = {
+        "type": question.get("type", ""),
+        "content": " ".join(str(question.get("content", "")).lower().split()),
+        "options": [" ".join(str(option).lower().split()) for option in options],
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def move_questions_to_bank(apps, schema_editor):
+    GroqQuizSession = apps.get_model("quiz", "GroqQuizSession")
+    GroqQuestion = apps.get_model("quiz", "GroqQuestion")
+    GroqQuizSessionQuestion = apps.get_model("quiz", "GroqQuizSessionQuestion")
+
+    sessions = GroqQuizSession.objects.select_related("config").iterator()
+    for session in sessions:
+        questions = [q for q in (session.questions or []) if isinstance(q, dict)]
+        questions_per_session = max(session.config.questions_per_session, 1)
+        served = session.session_number * questions_per_session
+
+        items = []
+        for position, question in enumerate(questions):
+            bank_question, _ = GroqQuestion.objects.get_or_create(
+                course_id=session.course_id,
+                content_hash=_content_hash(question),
+                defaults={
+                    "difficulty": session.config.difficulty,
+                    "question_type": question.get("type", ""),
+                    "content": question.get("content", ""),
+                    "data": question,
+                },
+            )
+            items.append(
+                GroqQuizSessionQuestion(
+                    session=session,
+                    question=bank_question,
+                    position=position,
+                    session_number=(
+                        position // questions_per_session + 1
+                        if position < served
+                        else None
+                    ),
+                )
+            )
+        GroqQuizSessionQuestion.objects.bulk_create(items)
+        session.total_questions = len(items)
+        session.save(update_fields=["total_questions"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("course", "0001_initial"),
+        ("quiz", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="GroqQuestion",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "difficulty",
+                    models.CharField(
+                        choices=[
+                            ("beginner", "Beginner"),
+                            ("intermediate", "Intermediate"),
+                            ("advanced", "Advanced"),
+                        ],
+                        max_length=20,
+                    ),
+                ),
+                (
+                    "question_type",
+                    models.CharField(
+                        choices=[
+                            ("multiple_choice", "Multiple Choice"),
+                            ("true_false", "True/False"),
+                            ("short_answer", "Short Answer"),
+                        ],
+                        max_length=20,
+                    ),
+                ),
+                ("content", models.TextField()),
+                ("data", models.JSONField()),
+                ("content_hash", models.CharField(max_length=64)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                (
+                    "course",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE, to="course.course"
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "AI Question",
+                "verbose_name_plural": "AI Questions",
+            },
+        ),
+        migrations.AddConstraint(
+            model_name="groqquestion",
+            constraint=models.UniqueConstraint(
+                fields=("course", "content_hash"), name="unique_ai_question_per_course"
+            ),
+        ),
+        migrations.AddField(
+            model_name="groqquizsession",
+            name="total_questions",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.CreateModel(
+            name="GroqQuizSessionQuestion",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("position", models.PositiveIntegerField()),
+                (
+                    "session_number",
+                    models.PositiveIntegerField(blank=True, null=True),
+                ),
+                (
+                    "question",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="session_items",
+                        to="quiz.groqquestion",
+                    ),
+                ),
+                (
+                    "session",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="items",
+                        to="quiz.groqquizsession",
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["position"],
+                "indexes": [
+                    models.Index(
+                        fields=["session", "session_number"],
+                        name="quiz_groqqu_session_c3b971_idx",
+                    )
+                ],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name="groqquizsessionquestion",
+            constraint=models.UniqueConstraint(
+                fields=("session", "position"),
+                name="unique_ai_session_question_position",
+            ),
+        ),
+        migrations.RunPython(move_questions_to_bank, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name="groqquizsession",
+            name="questions",
+        ),
+        migrations.RemoveField(
+            model_name="groqquizsession",
+            name="session_questions",
+        ),
+    ]
@@ -0,0 +1,64 @@
+# Generated by Django 4.2.11 on 2026-10-19 14:03
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("quiz", "0002_ai_question_bank"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="groqquestion",
+            name="topic",
+            field=models.CharField(blank=True, max_length=100),
+        ),
+        migrations.CreateModel(
+            name="GroqQuizAnswer",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("answer", models.TextField(blank=True)),
+                ("is_correct", models.BooleanField(default=False)),
+                (
+                    "latency_ms",
+                    models.PositiveIntegerField(
+                        blank=True,
+                        help_text="Time from question shown to answer submitted",
+                        null=True,
+                    ),
+                ),
+                ("answered_at", models.DateTimeField(auto_now_add=True)),
+                (
+                    "item",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="answer",
+                        to="quiz.groqquizsessionquestion",
+                    ),
+                ),
+                (
+                    "session",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="answers",
+                        to="quiz.groqquizsession",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "AI Quiz Answer",
+                "verbose_name_plural": "AI Quiz Answers",
+            },
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 4.2.11 on 2026-10-19 14:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("quiz", "0003_ai_quiz_answers"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="groqquizconfig",
+            name="adaptive",
+            field=models.BooleanField(
+                default=False,
+                help_text="Pick each new batch by the learner's running ability and stop at mastery",
+            ),
+        ),
+        migrations.AddField(
+            model_name="groqquizsession",
+            name="ability",
+            field=models.FloatField(
+                default=0.0, help_text="Running Elo estimate of the learner's ability"
+            ),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 4.2.11 on 2026-10-19 14:20
+
+from django.db import migrations, models
+
+from quiz.grading import compile_answer_key
+
+
+def compile_answer_keys(apps, schema_editor):
+    GroqQuestion = apps.get_model("quiz", "GroqQuestion")
+
+    batch = []
+    for question in GroqQuestion.objects.only("data").iterator(chunk_size=500):
+        question.answer_key = compile_answer_key(question.data)
+        batch.append(question)
+        if len(batch) >= 500:
+            GroqQuestion.objects.bulk_update(batch, ["answer_key"])
+            batch = []
+    GroqQuestion.objects.bulk_update(batch, ["answer_key"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("quiz", "0004_ai_quiz_adaptive"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="groqquestion",
+            name="answer_key",
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.RunPython(compile_answer_keys, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,75 @@
+# Generated by Django 4.2.11 on 2026-10-19 14:14
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("course", "0001_initial"),
+        ("quiz", "0005_ai_question_answer_key"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="GroqGenerationMetric",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("created_at", models.DateTimeField(auto_now_add=True, db_index=True)),
+                (
+                    "source",
+                    models.CharField(
+                        choices=[
+                            ("request", "Student request"),
+                            ("warm", "Pool warming"),
+                        ],
+                        default="request",
+                        max_length=10,
+                    ),
+                ),
+                (
+                    "outcome",
+                    models.CharField(
+                        choices=[
+                            ("cache_hit", "Cache hit"),
+                            ("generated", "Generated"),
+                            ("invalid_response", "Invalid response"),
+                            ("provider_error", "Provider error"),
+                            ("circuit_open", "Circuit open"),
+                            ("lock_timeout", "Lock timeout"),
+                        ],
+                        max_length=20,
+                    ),
+                ),
+                ("provider", models.CharField(max_length=20)),
+                ("model", models.CharField(max_length=100)),
+                ("questions_requested", models.PositiveIntegerField(default=0)),
+                ("questions_parsed", models.PositiveIntegerField(default=0)),
+                ("latency_ms", models.PositiveIntegerField(blank=True, null=True)),
+                ("prompt_tokens", models.PositiveIntegerField(default=0)),
+                ("completion_tokens", models.PositiveIntegerField(default=0)),
+                (
+                    "course",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        to="course.course",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "AI Generation Metric",
+                "verbose_name_plural": "AI Generation Metrics",
+            },
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 4.2.11 on 2026-10-19 14:40
+
+import hashlib
+
+from django.db import migrations, models
+
+
+def hash_question_content(apps, schema_editor):
+    Question = apps.get_model("quiz", "Question")
+
+    batch = []
+    for question in Question.objects.only("content").iterator(chunk_size=500):
+        content = " ".join(question.content.lower().split())
+        question.content_hash = hashlib.sha256(content.encode("utf-8")).hexdigest()
+        batch.append(question)
+        if len(batch) >= 500:
+            Question.objects.bulk_update(batch, ["content_hash"])
+            batch = []
+    Question.objects.bulk_update(batch, ["content_hash"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("quiz", "0006_ai_generation_metrics"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="question",
+            name="content_hash",
+            field=models.CharField(
+                blank=True, db_index=True, editable=False, max_length=64
+            ),
+        ),
+        migrations.RunPython(hash_question_content, migrations.RunPython.noop),
+    ]
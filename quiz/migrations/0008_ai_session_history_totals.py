@@ -0,0 +1,56 @@
+# Generated by Django 4.2.11 on 2026-10-19 14:55
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def store_session_totals(apps, schema_editor):
+    GroqQuizSession = apps.get_model("quiz", "GroqQuizSession")
+
+    sessions = GroqQuizSession.objects.filter(completed=True).annotate(
+        answer_count=Count("answers")
+    )
+    batch = []
+    for session in sessions.iterator(chunk_size=500):
+        # Sessions finished before answers were recorded only have their score
+        session.questions_answered = session.answer_count or session.total_questions
+        session.percentage = (
+            min(round(session.score / session.questions_answered * 100), 100)
+            if session.questions_answered
+            else 0
+        )
+        batch.append(session)
+        if len(batch) >= 500:
+            GroqQuizSession.objects.bulk_update(
+                batch, ["questions_answered", "percentage"]
+            )
+            batch = []
+    GroqQuizSession.objects.bulk_update(batch, ["questions_answered", "percentage"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("quiz", "0007_question_content_hash"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="groqquizsession",
+            name="percentage",
+            field=models.PositiveSmallIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="groqquizsession",
+            name="questions_answered",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name="groqquizsession",
+            index=models.Index(
+                fields=["user", "completed", "-completed_at"],
+                name="quiz_groqqu_user_id_6d206f_idx",
+            ),
+        ),
+        migrations.RunPython(store_session_totals, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,63 @@
+# Generated by Django 4.2.11 on 2026-10-19 15:10
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("course", "0001_initial"),
+        ("quiz", "0008_ai_session_history_totals"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="GroqQuizSummary",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "month",
+                    models.DateField(
+                        help_text="First day of the month the sessions were completed in"
+                    ),
+                ),
+                ("sessions", models.PositiveIntegerField(default=0)),
+                ("questions_answered", models.PositiveIntegerField(default=0)),
+                ("correct", models.PositiveIntegerField(default=0)),
+                (
+                    "course",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE, to="course.course"
+                    ),
+                ),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "AI Quiz Summary",
+                "verbose_name_plural": "AI Quiz Summaries",
+            },
+        ),
+        migrations.AddConstraint(
+            model_name="groqquizsummary",
+            constraint=models.UniqueConstraint(
+                fields=("user", "course", "month"), name="unique_ai_quiz_summary_month"
+            ),
+        ),
+    ]
@@ -0,0 +1,83 @@
+# Generated by Django 4.2.11 on 2026-10-19 15:40
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("quiz", "0009_ai_quiz_retention"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="GroqGenerationJob",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("queued", "Queued"),
+                            ("generating", "Generating"),
+                            ("done", "Done"),
+                            ("failed", "Failed"),
+                        ],
+                        default="queued",
+                        max_length=10,
+                    ),
+                ),
+                ("questions_requested", models.PositiveIntegerField(default=0)),
+                ("questions_parsed", models.PositiveIntegerField(default=0)),
+                ("error", models.CharField(blank=True, max_length=255)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                (
+                    "config",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="quiz.groqquizconfig",
+                    ),
+                ),
+                (
+                    "session",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        to="quiz.groqquizsession",
+                    ),
+                ),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "AI Generation Job",
+                "verbose_name_plural": "AI Generation Jobs",
+            },
+        ),
+        migrations.AddConstraint(
+            model_name="groqgenerationjob",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("status__in", ["queued", "generating"])),
+                fields=("user", "config"),
+                name="unique_active_ai_generation_job",
+            ),
+        ),
+    ]
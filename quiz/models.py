@@ -1,5 +1,9 @@
+import hashlib
 import json
+import math
+import random
 import re
+from datetime import timedelta
 
 from django.conf import settings
 from django.core.exceptions import ImproperlyConfigured, ValidationError
@@ -7,10 +11,12 @@ from django.core.validators import (
     MaxValueValidator,
     validate_comma_separated_integer_list,
 )
-from django.db import models
-from django.db.models import Q
+from django.db import IntegrityError, models, transaction
+from django.db.models import Avg, Case, Count, Exists, F, FloatField, OuterRef, Q, Value, When
+from django.db.models.functions import Abs
 from django.db.models.signals import pre_save
 from django.urls import reverse
+from django.utils.functional import cached_property
 from django.utils.timezone import now
 from django.utils.translation import gettext_lazy as _
 from django.dispatch import receiver
@@ -18,6 +24,7 @@ from model_utils.managers import InheritanceManager
 
 from course.models import Course
 from core.utils import unique_slug_generator
+from .grading import compile_answer_key, get_answer_key, grade
 
 CHOICE_ORDER_OPTIONS = (
     ("content", _("Content")),
@@ -369,6 +376,11 @@ class Sitting(models.Model):
         return answered, total
 
 
+def question_text_hash(content):
+    """Hash of a question's wording, ignoring case and whitespace"""
+    return hashlib.sha256(' '.join(str(content).lower().split()).encode('utf-8')).hexdigest()
+
+
 class Question(models.Model):
     quiz = models.ManyToManyField(Quiz, verbose_name=_("Quiz"), blank=True)
     figure = models.ImageField(
@@ -388,6 +400,7 @@ class Question(models.Model):
         help_text=_("Explanation to be shown after the question has been answered."),
         verbose_name=_("Explanation"),
     )
+    content_hash = models.CharField(max_length=64, blank=True, db_index=True, editable=False)
 
     objects = InheritanceManager()
 
@@ -398,6 +411,13 @@ class Question(models.Model):
     def __str__(self):
         return self.content
 
+    def save(self, *args, **kwargs):
+        self.content_hash = question_text_hash(self.content)
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and "content" in update_fields:
+            kwargs["update_fields"] = {*update_fields, "content_hash"}
+        super().save(*args, **kwargs)
+
 
 class MCQuestion(Question):
     choice_order = models.CharField(
@@ -486,6 +506,20 @@ class EssayQuestion(Question):
 # AI-Generated Quiz Models
 
 
+class GroqQuizConfigManager(models.Manager):
+    def find_duplicate(self, config):
+        """The oldest saved config of the same user with the same parameters as ``config``"""
+        candidates = self.filter(
+            user_id=config.user_id,
+            course_id=config.course_id,
+            difficulty=config.difficulty,
+            num_questions=config.num_questions,
+            questions_per_session=config.questions_per_session,
+            adaptive=config.adaptive,
+        ).exclude(pk=config.pk).order_by('pk')
+        return next((c for c in candidates if c.parameters() == config.parameters()), None)
+
+
 class GroqQuizConfig(models.Model):
     DIFFICULTY_LEVELS = [
         ('beginner', 'Beginner'),
@@ -506,8 +540,14 @@ class GroqQuizConfig(models.Model):
     questions_per_session = models.IntegerField(default=20, help_text="Number of questions to show per quiz session")
     question_types = models.JSONField(default=list)  # Store multiple question types
     topics = models.TextField(blank=True, help_text="Comma-separated topics")
+    adaptive = models.BooleanField(
+        default=False,
+        help_text="Pick each new batch by the learner's running ability and stop at mastery",
+    )
     created_at = models.DateTimeField(auto_now_add=True)
 
+    objects = GroqQuizConfigManager()
+
     class Meta:
         verbose_name = _("AI Quiz Configuration")
         verbose_name_plural = _("AI Quiz Configurations")
@@ -515,60 +555,409 @@ class GroqQuizConfig(models.Model):
     def __str__(self):
         return f"{self.user.username} - {self.course.title} - {self.difficulty}"
 
+    def parameters(self):
+        """Everything that makes two configs produce the same kind of quiz"""
+        return (
+            self.user_id,
+            self.course_id,
+            self.difficulty,
+            self.num_questions,
+            self.questions_per_session,
+            self.adaptive,
+            tuple(sorted(self.question_types or [])),
+            ' '.join(self.topics.lower().split()),
+        )
+
+
+# Elo-style ability scale: a learner whose ability equals a question's rating
+# answers it correctly half of the time
+DIFFICULTY_RATINGS = {
+    'beginner': -1.0,
+    'intermediate': 0.0,
+    'advanced': 1.0,
+}
+ABILITY_K_FACTOR = 0.4
+MASTERY_ABILITY = 1.5
+MASTERY_MIN_ANSWERS = 5
+
+
+def expected_score(ability, difficulty):
+    """Probability that a learner of ``ability`` answers a ``difficulty`` question correctly"""
+    return 1 / (1 + math.exp(DIFFICULTY_RATINGS.get(difficulty, 0.0) - ability))
+
+
+def update_ability(ability, difficulty, is_correct):
+    return ability + ABILITY_K_FACTOR * (int(is_correct) - expected_score(ability, difficulty))
+
+
+def question_content_hash(question):
+    """Stable hash of a generated question's type, wording and options"""
+    options = question.get('options') or []
+    payload = {
+        'type': question.get('type', ''),
+        'content': ' '.join(str(question.get('content', '')).lower().split()),
+        'options': [' '.join(str(option).lower().split()) for option in options],
+    }
+    return hashlib.sha256(
+        json.dumps(payload, sort_keys=True).encode('utf-8')
+    ).hexdigest()
+
+
+class GroqQuestionQuerySet(models.QuerySet):
+    def nearest_to(self, ability):
+        """Order questions by how close their difficulty rating is to ``ability``"""
+        rating = Case(
+            *[When(difficulty=level, then=Value(value)) for level, value in DIFFICULTY_RATINGS.items()],
+            default=Value(0.0),
+            output_field=FloatField(),
+        )
+        return self.annotate(distance=Abs(rating - Value(ability))).order_by('distance', 'pk')
+
+    def draw(self, num_questions, question_types, user=None):
+        """
+        Pick ``num_questions`` random questions spread evenly over
+        ``question_types``, leaving out any ``user`` has been served before.
+        Returns None if the pool can't fill the request.
+        """
+        question_types = list(question_types) or ['multiple_choice']
+        wanted = {
+            question_type: num_questions // len(question_types) + (i < num_questions % len(question_types))
+            for i, question_type in enumerate(question_types)
+        }
+
+        queryset = self.filter(question_type__in=question_types)
+        if user is not None:
+            queryset = queryset.exclude(Exists(
+                GroqQuizSessionQuestion.objects.filter(question=OuterRef('pk'), session__user=user)
+            ))
+
+        candidates = {question_type: [] for question_type in question_types}
+        for pk, question_type in queryset.values_list('pk', 'question_type'):
+            candidates[question_type].append(pk)
+
+        chosen = []
+        for question_type, count in wanted.items():
+            if len(candidates[question_type]) < count:
+                return None
+            chosen.extend(random.sample(candidates[question_type], count))
+
+        random.shuffle(chosen)
+        bank = self.model.objects.in_bulk(chosen)
+        return [bank[pk] for pk in chosen]
+
+    def promote_to_quiz(self, quiz):
+        """
+        Copy the multiple choice and true/false questions into ``quiz`` as
+        MCQuestion and Choice rows, in one transaction. Questions whose
+        wording already exists in one of the course's quizzes are linked
+        instead of copied, and the ones ``quiz`` already has are left alone.
+        Returns how many questions were created, linked and skipped.
+        """
+        candidates = {}
+        skipped = 0
+        for question in self.filter(question_type__in=PROMOTABLE_TYPES).order_by('pk'):
+            choices = _promoted_choices(question)
+            if choices is None:
+                skipped += 1
+                continue
+            content = question.content[:Question._meta.get_field('content').max_length]
+            candidates.setdefault(question_text_hash(content), (question, content, choices))
+
+        with transaction.atomic():
+            in_quiz = set(
+                quiz.question_set.filter(content_hash__in=list(candidates))
+                .values_list('content_hash', flat=True)
+            )
+            existing = dict(
+                MCQuestion.objects.filter(quiz__course_id=quiz.course_id, content_hash__in=list(candidates))
+                .exclude(content_hash__in=in_quiz)
+                .values_list('content_hash', 'pk')
+            )
+
+            # Multi-table inheritance rules out bulk_create for MCQuestion
+            # itself, so only the choices and quiz links are batched
+            linked = list(existing.values())
+            new_choices = []
+            for content_hash, (question, content, choices) in candidates.items():
+                if content_hash in in_quiz or content_hash in existing:
+                    continue
+                mc_question = MCQuestion.objects.create(
+                    content=content,
+                    explanation=str(question.data.get('explanation') or '')[:2000],
+                )
+                linked.append(mc_question.pk)
+                new_choices.extend(
+                    Choice(question=mc_question, choice_text=text[:1000], correct=correct)
+                    for text, correct in choices
+                )
+
+            Choice.objects.bulk_create(new_choices)
+            Question.quiz.through.objects.bulk_create(
+                Question.quiz.through(question_id=pk, quiz_id=quiz.pk) for pk in linked
+            )
+
+        return {
+            'created': len(linked) - len(existing),
+            'linked': len(existing),
+            'skipped': skipped + len(in_quiz),
+        }
+
+
+PROMOTABLE_TYPES = ('multiple_choice', 'true_false')
+
+
+def _promoted_choices(question):
+    """``(text, correct)`` choices for a bank question, or None if its answer can't be told"""
+    key = get_answer_key(question.data, question.answer_key)
+    if question.question_type == 'true_false':
+        if key.get('value') is None:
+            return None
+        return [('True', key['value']), ('False', not key['value'])]
+
+    options = [str(option) for option in question.data.get('options') or []]
+    if key.get('option') is None or not 0 <= key['option'] < len(options):
+        return None
+    return [(option, i == key['option']) for i, option in enumerate(options)]
+
+
+class GroqQuestionManager(models.Manager.from_queryset(GroqQuestionQuerySet)):
+    def get_or_create_many(self, course, difficulty, questions):
+        """
+        Return bank rows for ``questions`` in the same order, inserting the
+        ones the course doesn't have yet with a single bulk insert. Generic
+        fallback questions are refused: they would be served as the course's.
+        """
+        if any(question.get('fallback') for question in questions):
+            raise ValueError("Fallback questions are never stored in the question bank")
+        hashes = [question_content_hash(question) for question in questions]
+        bank = {
+            question.content_hash: question
+            for question in self.filter(course=course, content_hash__in=hashes)
+        }
+
+        new_questions = {}
+        for content_hash, question in zip(hashes, questions):
+            if content_hash in bank or content_hash in new_questions:
+                continue
+            new_questions[content_hash] = self.model(
+                course=course,
+                difficulty=difficulty,
+                question_type=question.get('type', ''),
+                content=question.get('content', ''),
+                topic=str(question.get('topic') or '')[:100],
+                data=question,
+                answer_key=compile_answer_key(question),
+                content_hash=content_hash,
+            )
+
+        if new_questions:
+            self.bulk_create(new_questions.values(), ignore_conflicts=True)
+            bank.update(
+                (question.content_hash, question)
+                for question in self.filter(course=course, content_hash__in=list(new_questions))
+            )
+        return [bank[content_hash] for content_hash in hashes]
+
+
+class GroqQuestion(models.Model):
+    """A generated question, stored once per course and shared by sessions"""
+
+    course = models.ForeignKey(Course, on_delete=models.CASCADE)
+    difficulty = models.CharField(max_length=20, choices=GroqQuizConfig.DIFFICULTY_LEVELS)
+    question_type = models.CharField(max_length=20, choices=GroqQuizConfig.QUESTION_TYPES)
+    content = models.TextField()
+    topic = models.CharField(max_length=100, blank=True)
+    data = models.JSONField()  # The question as generated: options, answer, explanation
+    answer_key = models.JSONField(default=dict, blank=True)  # Precompiled by quiz.grading
+    content_hash = models.CharField(max_length=64)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    objects = GroqQuestionManager()
+
+    class Meta:
+        verbose_name = _("AI Question")
+        verbose_name_plural = _("AI Questions")
+        constraints = [
+            models.UniqueConstraint(
+                fields=['course', 'content_hash'], name='unique_ai_question_per_course'
+            ),
+        ]
+
+    def __str__(self):
+        return self.content
+
+
+class GroqQuizSessionManager(models.Manager):
+    def create_with_questions(self, user, course, config, questions):
+        """
+        Create a session and link its questions, the first batch marked as
+        session 1. Adaptive sessions only link the first batch; later ones
+        are picked from the course's question bank as the learner answers.
+        """
+        with transaction.atomic():
+            bank = GroqQuestion.objects.get_or_create_many(course, config.difficulty, questions)
+            return self.create_with_bank_questions(user, course, config, bank)
+
+    def create_with_bank_questions(self, user, course, config, bank):
+        """Same as ``create_with_questions`` for questions already in the bank"""
+        questions_per_session = config.questions_per_session
+        with transaction.atomic():
+            if config.adaptive:
+                bank = bank[:questions_per_session]
+            session = self.create(
+                user=user,
+                course=course,
+                config=config,
+                total_questions=config.num_questions if config.adaptive else len(bank),
+                ability=DIFFICULTY_RATINGS.get(config.difficulty, 0.0),
+            )
+            GroqQuizSessionQuestion.objects.bulk_create(
+                GroqQuizSessionQuestion(
+                    session=session,
+                    question=question,
+                    position=position,
+                    session_number=1 if position < questions_per_session else None,
+                )
+                for position, question in enumerate(bank)
+            )
+        return session
+
 
 class GroqQuizSession(models.Model):
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
     course = models.ForeignKey(Course, on_delete=models.CASCADE)
     config = models.ForeignKey(GroqQuizConfig, on_delete=models.CASCADE)
-    questions = models.JSONField()  # Store all generated questions
-    session_questions = models.JSONField()  # Store questions for current session
+    total_questions = models.PositiveIntegerField(default=0)
     current_question_index = models.IntegerField(default=0)
     session_number = models.IntegerField(default=1)
     score = models.IntegerField(default=0)
+    ability = models.FloatField(default=0.0, help_text="Running Elo estimate of the learner's ability")
     completed = models.BooleanField(default=False)
     started_at = models.DateTimeField(auto_now_add=True)
     completed_at = models.DateTimeField(null=True, blank=True)
+    # Stored by complete() so history pages don't have to count answers
+    questions_answered = models.PositiveIntegerField(default=0)
+    percentage = models.PositiveSmallIntegerField(null=True, blank=True)
+
+    objects = GroqQuizSessionManager()
 
     class Meta:
         verbose_name = _("AI Quiz Session")
         verbose_name_plural = _("AI Quiz Sessions")
+        indexes = [
+            models.Index(fields=['user', 'completed', '-completed_at']),
+        ]
+
+    @cached_property
+    def questions(self):
+        """All questions of the quiz, in order"""
+        return [item.question.data for item in self.items.select_related('question')]
+
+    @cached_property
+    def session_items(self):
+        """Question links served in the current session, in order"""
+        return list(
+            self.items.filter(session_number=self.session_number).select_related('question')
+        )
 
-    def get_current_question(self):
-        if self.current_question_index < len(self.session_questions):
-            return self.session_questions[self.current_question_index]
+    @property
+    def session_questions(self):
+        return [item.question.data for item in self.session_items]
+
+    def get_current_item(self):
+        if self.current_question_index < len(self.session_items):
+            return self.session_items[self.current_question_index]
         return None
 
+    def get_current_question(self):
+        item = self.get_current_item()
+        return item.question.data if item else None
+
+    def is_mastered(self):
+        """Adaptive sessions end once the ability estimate reaches mastery"""
+        return (
+            self.ability >= MASTERY_ABILITY
+            and self.get_questions_completed() >= MASTERY_MIN_ANSWERS
+        )
+
+    def _adaptive_candidates(self):
+        """Bank questions of the course this session hasn't served yet, nearest in difficulty first"""
+        return (
+            GroqQuestion.objects.filter(
+                course_id=self.course_id,
+                question_type__in=self.config.question_types,
+            )
+            .exclude(session_items__session=self)
+            .nearest_to(self.ability)
+        )
+
     def can_continue_to_next_session(self):
         """Check if there are more questions available for another session"""
-        total_questions_shown = (self.session_number - 1) * self.config.questions_per_session
-        total_questions_shown += len(self.session_questions)
-        return total_questions_shown < len(self.questions)
+        if self.config.adaptive:
+            return (
+                not self.is_mastered()
+                and self.items.count() < self.total_questions
+                and self._adaptive_candidates().exists()
+            )
+        return self.items.filter(session_number__isnull=True).exists()
 
     def start_next_session(self):
         """Start the next session with remaining questions"""
-        if not self.can_continue_to_next_session():
-            return False
+        if self.config.adaptive:
+            return self._start_next_adaptive_session()
 
-        questions_per_session = self.config.questions_per_session
-        start_index = self.session_number * questions_per_session
-        end_index = start_index + questions_per_session
+        next_items = list(
+            self.items.filter(session_number__isnull=True)
+            .values_list('pk', flat=True)[:self.config.questions_per_session]
+        )
+        if not next_items:
+            return False
 
-        self.session_questions = self.questions[start_index:end_index]
+        self.session_number += 1
         self.current_question_index = 0
+        self.items.filter(pk__in=next_items).update(session_number=self.session_number)
+        self.save(update_fields=['session_number', 'current_question_index'])
+        self.__dict__.pop('session_items', None)
+        return True
+
+    def _start_next_adaptive_session(self):
+        """Serve the bank questions whose difficulty best matches the current ability"""
+        if self.is_mastered():
+            return False
+        served = self.items.count()
+        batch_size = min(self.config.questions_per_session, self.total_questions - served)
+        if batch_size <= 0:
+            return False
+        questions = list(self._adaptive_candidates()[:batch_size])
+        if not questions:
+            return False
+
         self.session_number += 1
-        self.save()
+        self.current_question_index = 0
+        with transaction.atomic():
+            GroqQuizSessionQuestion.objects.bulk_create(
+                GroqQuizSessionQuestion(
+                    session=self,
+                    question=question,
+                    position=served + offset,
+                    session_number=self.session_number,
+                )
+                for offset, question in enumerate(questions)
+            )
+            self.save(update_fields=['session_number', 'current_question_index'])
+        self.__dict__.pop('session_items', None)
         return True
 
     def get_session_progress(self):
         """Get progress information for the current session"""
-        current_session_progress = self.current_question_index / len(self.session_questions) * 100 if self.session_questions else 0
+        current_session_progress = self.current_question_index / len(self.session_items) * 100 if self.session_items else 0
         total_progress = self.get_total_progress()
         return {
             'session_progress': current_session_progress,
             'total_progress': total_progress,
             'session_number': self.session_number,
             'questions_completed': self.get_questions_completed(),
-            'total_questions': len(self.questions)
+            'total_questions': self.total_questions
         }
 
     def get_questions_completed(self):
@@ -578,58 +967,282 @@ class GroqQuizSession(models.Model):
     def get_total_progress(self):
         """Get overall progress across all sessions"""
         questions_completed = self.get_questions_completed()
-        if len(self.questions) == 0:
+        if self.total_questions == 0:
             return 0
-        return (questions_completed / len(self.questions)) * 100
+        return (questions_completed / self.total_questions) * 100
+
+    def submit_answer(self, answer, latency_ms=None):
+        """
+        Grade ``answer`` to the current question and advance the session.
+        Returns whether it was correct, or None when the question was
+        already answered by a concurrent submission.
+        """
+        index = self.current_question_index
+        with transaction.atomic():
+            # Lock the row so concurrent submissions are applied one at a time
+            # and the ability estimate is updated from its latest value
+            locked_index, score, ability = (
+                GroqQuizSession.objects.select_for_update()
+                .values_list('current_question_index', 'score', 'ability')
+                .get(pk=self.pk)
+            )
+            if locked_index != index:
+                return None
+            item = self.get_current_item()
+            if not item:
+                return False
+
+            is_correct = self.check_answer(item.question.data, answer, item.question.answer_key)
+            ability = update_ability(ability, item.question.difficulty, is_correct)
+            try:
+                with transaction.atomic():
+                    GroqQuizAnswer.objects.create(
+                        session=self,
+                        item=item,
+                        answer=str(answer),
+                        is_correct=is_correct,
+                        latency_ms=latency_ms,
+                    )
+            except IntegrityError:
+                return None
+            GroqQuizSession.objects.filter(pk=self.pk).update(
+                current_question_index=index + 1,
+                score=score + int(is_correct),
+                ability=ability,
+            )
+        self.current_question_index = index + 1
+        self.score = score + int(is_correct)
+        self.ability = ability
+        return is_correct
 
-    def submit_answer(self, answer):
-        current_question = self.get_current_question()
-        if not current_question:
-            return False
+    def check_answer(self, question, user_answer, answer_key=None):
+        return grade(get_answer_key(question, answer_key), user_answer)
 
-        is_correct = self.check_answer(current_question, answer)
+    def complete(self):
+        """Mark the session completed and store its answer count and percentage"""
+        totals = self.answers.aggregate(answered=Count('id'), correct=Count('id', filter=Q(is_correct=True)))
+        self.completed = True
+        self.completed_at = now()
+        self.questions_answered = totals['answered']
+        self.score = totals['correct']
+        self.percentage = round(self.score / self.questions_answered * 100) if self.questions_answered else 0
+        self.save(update_fields=['completed', 'completed_at', 'questions_answered', 'score', 'percentage'])
 
-        if is_correct:
-            self.score += 1
 
-        # Move to next question in current session
-        self.current_question_index += 1
+class GroqQuizSessionQuestion(models.Model):
+    """Position of a bank question within a session, and the batch it was served in"""
 
-        # Check if session is complete
-        if self.current_question_index >= len(self.session_questions):
-            # Mark session complete for now - user can choose to continue
-            pass
+    session = models.ForeignKey(GroqQuizSession, on_delete=models.CASCADE, related_name='items')
+    question = models.ForeignKey(GroqQuestion, on_delete=models.CASCADE, related_name='session_items')
+    position = models.PositiveIntegerField()
+    session_number = models.PositiveIntegerField(null=True, blank=True)
 
-        self.save()
-        return is_correct
+    class Meta:
+        ordering = ['position']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['session', 'position'], name='unique_ai_session_question_position'
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['session', 'session_number']),
+        ]
+
+    def __str__(self):
+        return f"{self.session_id} #{self.position}"
+
+
+class GroqQuizAnswerQuerySet(models.QuerySet):
+    def _accuracy_by(self, field):
+        return (
+            self.values(group=F(field))
+            .annotate(
+                answered=Count('id'),
+                correct=Count('id', filter=Q(is_correct=True)),
+                avg_latency_ms=Avg('latency_ms'),
+            )
+            .order_by('group')
+        )
+
+    def accuracy_by_topic(self):
+        """Answered/correct counts and mean latency per question topic"""
+        return self._accuracy_by('item__question__topic')
+
+    def accuracy_by_difficulty(self):
+        """Answered/correct counts and mean latency per question difficulty"""
+        return self._accuracy_by('item__question__difficulty')
+
+
+class GroqQuizAnswer(models.Model):
+    session = models.ForeignKey(GroqQuizSession, on_delete=models.CASCADE, related_name='answers')
+    item = models.OneToOneField(GroqQuizSessionQuestion, on_delete=models.CASCADE, related_name='answer')
+    answer = models.TextField(blank=True)
+    is_correct = models.BooleanField(default=False)
+    latency_ms = models.PositiveIntegerField(null=True, blank=True, help_text="Time from question shown to answer submitted")
+    answered_at = models.DateTimeField(auto_now_add=True)
+
+    objects = GroqQuizAnswerQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = _("AI Quiz Answer")
+        verbose_name_plural = _("AI Quiz Answers")
+
+    def __str__(self):
+        return f"{self.session_id} #{self.item_id}: {self.answer}"
 
-    def check_answer(self, question, user_answer):
-        try:
-            question_type = question.get('type')
-            correct_answer = question.get('correct_answer')
-            
-            if question_type == 'multiple_choice':
-                # Convert to integers for comparison
-                return int(user_answer) == int(correct_answer)
-            elif question_type == 'true_false':
-                # Normalize string comparison
-                return str(user_answer).strip().lower() == str(correct_answer).strip().lower()
-            else:  # short_answer - use simple comparison for now
-                return self.evaluate_short_answer(question, user_answer)
-        except (ValueError, KeyError, TypeError) as e:
-            print(f"Error checking answer: {e}")
-            return False
 
-    def evaluate_short_answer(self, question, user_answer):
-        """Simple evaluation for short answers - can be enhanced later"""
+class GroqQuizSummary(models.Model):
+    """Monthly totals of a learner's AI quiz sessions compacted by the retention job"""
+
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    course = models.ForeignKey(Course, on_delete=models.CASCADE)
+    month = models.DateField(help_text="First day of the month the sessions were completed in")
+    sessions = models.PositiveIntegerField(default=0)
+    questions_answered = models.PositiveIntegerField(default=0)
+    correct = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        verbose_name = _("AI Quiz Summary")
+        verbose_name_plural = _("AI Quiz Summaries")
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'course', 'month'], name='unique_ai_quiz_summary_month'
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} {self.course_id} {self.month:%Y-%m}: {self.sessions} sessions"
+
+
+class GroqGenerationMetric(models.Model):
+    """One AI question request: a cache hit or an LLM call and how it went"""
+
+    CACHE_HIT = 'cache_hit'
+    GENERATED = 'generated'
+    INVALID_RESPONSE = 'invalid_response'
+    PROVIDER_ERROR = 'provider_error'
+    CIRCUIT_OPEN = 'circuit_open'
+    LOCK_TIMEOUT = 'lock_timeout'
+    OUTCOMES = [
+        (CACHE_HIT, 'Cache hit'),
+        (GENERATED, 'Generated'),
+        (INVALID_RESPONSE, 'Invalid response'),
+        (PROVIDER_ERROR, 'Provider error'),
+        (CIRCUIT_OPEN, 'Circuit open'),
+        (LOCK_TIMEOUT, 'Lock timeout'),
+    ]
+    # Outcomes where the student got fallback questions
+    FALLBACK_OUTCOMES = [INVALID_RESPONSE, PROVIDER_ERROR, CIRCUIT_OPEN, LOCK_TIMEOUT]
+
+    REQUEST = 'request'
+    WARM = 'warm'
+    SOURCES = [
+        (REQUEST, 'Student request'),
+        (WARM, 'Pool warming'),
+    ]
+
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    source = models.CharField(max_length=10, choices=SOURCES, default=REQUEST)
+    outcome = models.CharField(max_length=20, choices=OUTCOMES)
+    provider = models.CharField(max_length=20)
+    model = models.CharField(max_length=100)
+    course = models.ForeignKey(Course, on_delete=models.SET_NULL, null=True, blank=True)
+    questions_requested = models.PositiveIntegerField(default=0)
+    questions_parsed = models.PositiveIntegerField(default=0)
+    latency_ms = models.PositiveIntegerField(null=True, blank=True)
+    prompt_tokens = models.PositiveIntegerField(default=0)
+    completion_tokens = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        verbose_name = _("AI Generation Metric")
+        verbose_name_plural = _("AI Generation Metrics")
+
+    def __str__(self):
+        return f"{self.created_at:%Y-%m-%d %H:%M} {self.provider} {self.outcome}"
+
+
+# A generating job whose row hasn't moved for this long lost its worker
+# (client gone, process restarted) and may be picked up again
+GENERATION_JOB_STALE_AFTER = timedelta(seconds=90)
+
+
+class GroqGenerationJobManager(models.Manager):
+    def start_for(self, user, config):
+        """The user's unfinished job for ``config``, or a new queued one"""
+        job = self.filter(user=user, config=config, status__in=GroqGenerationJob.ACTIVE).first()
+        if job is not None:
+            return job
         try:
-            correct_answer = question.get('correct_answer', '').lower().strip()
-            user_answer_clean = user_answer.lower().strip()
-            
-            # Simple containment check - you can make this more sophisticated
-            return (user_answer_clean in correct_answer or 
-                    correct_answer in user_answer_clean or
-                    user_answer_clean == correct_answer)
-        except Exception as e:
-            print(f"Error evaluating short answer: {e}")
-            return False
+            with transaction.atomic():
+                return self.create(user=user, config=config, questions_requested=config.num_questions)
+        except IntegrityError:
+            # A concurrent submit of the same form created it first
+            return self.get(user=user, config=config, status__in=GroqGenerationJob.ACTIVE)
+
+    def claim(self, pk):
+        """Mark a queued or abandoned job as generating; only one caller wins"""
+        return bool(
+            self.filter(pk=pk)
+            .filter(
+                Q(status=GroqGenerationJob.QUEUED)
+                | Q(status=GroqGenerationJob.GENERATING, updated_at__lt=now() - GENERATION_JOB_STALE_AFTER)
+            )
+            .update(status=GroqGenerationJob.GENERATING, updated_at=now())
+        )
+
+
+class GroqGenerationJob(models.Model):
+    """Progress of generating the questions for one AI quiz request"""
+
+    QUEUED = 'queued'
+    GENERATING = 'generating'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUSES = [
+        (QUEUED, 'Queued'),
+        (GENERATING, 'Generating'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    ]
+    ACTIVE = [QUEUED, GENERATING]
+
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    config = models.ForeignKey(GroqQuizConfig, on_delete=models.CASCADE)
+    status = models.CharField(max_length=10, choices=STATUSES, default=QUEUED)
+    questions_requested = models.PositiveIntegerField(default=0)
+    questions_parsed = models.PositiveIntegerField(default=0)
+    session = models.ForeignKey(GroqQuizSession, on_delete=models.SET_NULL, null=True, blank=True)
+    error = models.CharField(max_length=255, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = GroqGenerationJobManager()
+
+    class Meta:
+        verbose_name = _("AI Generation Job")
+        verbose_name_plural = _("AI Generation Jobs")
+        constraints = [
+            # Repeated submits while a quiz is generating join the running job
+            models.UniqueConstraint(
+                fields=['user', 'config'],
+                condition=Q(status__in=['queued', 'generating']),
+                name='unique_active_ai_generation_job',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} {self.config_id}: {self.status} {self.questions_parsed}/{self.questions_requested}"
+
+    def progress(self):
+        """State reported to the progress page"""
+        progress = {
+            'status': self.status,
+            'parsed': self.questions_parsed,
+            'total': self.questions_requested,
+            'error': self.error,
+        }
+        if self.status == self.DONE and self.session_id:
+            progress['url'] = reverse('ai_quiz_take', kwargs={'session_id': self.session_id})
+        elif self.status == self.FAILED:
+            progress['url'] = reverse('ai_quiz_config')
+        return progress
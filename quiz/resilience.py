@@ -0,0 +1,340 @@
+"""
+Retry, rate limiting and circuit breaking for LLM provider calls.
+
+State that has to be shared between worker processes (the token bucket and
+the circuit breaker) lives in the Django cache, so it only covers every
+worker when the cache is shared (memcached, redis); with the local-memory
+cache each process protects itself.
+"""
+import asyncio
+import logging
+import random
+import time
+import uuid
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+
+from .llm_providers import BaseLLMProvider, LLMProviderError, LLMRateLimitError
+
+logger = logging.getLogger(__name__)
+
+RESILIENCE_CACHE_PREFIX = "ai_quiz:resilience"
+
+DEFAULT_RESILIENCE = {
+    'max_attempts': 3,
+    'base_delay': 0.5,
+    'max_delay': 8.0,
+    'deadline': 40.0,  # seconds for all attempts of one call, sleeps included
+    'rate': None,  # requests per second; None disables the limiter
+    'burst': 5,
+    'failure_threshold': 5,
+    'recovery_timeout': 30.0,
+}
+
+
+def _in_thread(func):
+    """Run a cache round trip from async code without blocking the event loop"""
+    return sync_to_async(func, thread_sensitive=False)
+
+
+def get_resilience_settings():
+    return {**DEFAULT_RESILIENCE, **getattr(settings, 'AI_QUIZ_RESILIENCE', {})}
+
+
+class CircuitOpenError(LLMProviderError):
+    """Raised without calling the backend while its circuit breaker is open"""
+
+    def __init__(self, message, retry_after=None):
+        super().__init__(message, retryable=False, retry_after=retry_after)
+
+
+class RetryPolicy:
+    """Exponential backoff with full jitter"""
+
+    def __init__(self, max_attempts=3, base_delay=0.5, max_delay=8.0):
+        self.max_attempts = max(int(max_attempts), 1)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def delay(self, attempt, retry_after=None):
+        """Seconds to wait after failed ``attempt`` (1-based)"""
+        backoff = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+        if retry_after:
+            return max(backoff, min(retry_after, self.max_delay))
+        return backoff
+
+
+class _CacheLock:
+    """Short-lived mutex in the cache guarding a read-modify-write"""
+
+    def __init__(self, key, timeout=5, wait=1.0):
+        self.key = f"{key}:lock"
+        self.timeout = timeout
+        self.wait = wait
+        self.token = uuid.uuid4().hex
+
+    def __enter__(self):
+        deadline = time.monotonic() + self.wait
+        while not cache.add(self.key, self.token, self.timeout):
+            if time.monotonic() >= deadline:
+                # A crashed holder's lock expires on its own; don't block on it
+                break
+            time.sleep(0.01)
+        return self
+
+    def __exit__(self, *exc_info):
+        if cache.get(self.key) == self.token:
+            cache.delete(self.key)
+
+
+class TokenBucket:
+    """
+    Token bucket refilled at ``rate`` tokens per second up to ``capacity``.
+
+    The bucket is a ``(tokens, updated_at)`` pair in the cache, updated under
+    a cache lock so every process draws from the same bucket.
+    """
+
+    def __init__(self, name, rate, capacity):
+        self.key = f"{RESILIENCE_CACHE_PREFIX}:bucket:{name}"
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+
+    def _take(self):
+        """Take a token if one is available; otherwise return seconds until one is"""
+        with _CacheLock(self.key):
+            now = time.time()
+            tokens, updated_at = cache.get(self.key) or (self.capacity, now)
+            tokens = min(self.capacity, tokens + (now - updated_at) * self.rate)
+            if tokens >= 1:
+                cache.set(self.key, (tokens - 1, now), None)
+                return 0
+            cache.set(self.key, (tokens, now), None)
+            return (1 - tokens) / self.rate
+
+    def acquire(self, timeout):
+        """Wait up to ``timeout`` seconds for a token; return whether one was taken"""
+        deadline = time.monotonic() + timeout
+        while True:
+            wait = self._take()
+            if not wait:
+                return True
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            time.sleep(min(wait, remaining))
+
+    async def aacquire(self, timeout):
+        """``acquire`` that waits without blocking the event loop"""
+        deadline = time.monotonic() + timeout
+        while True:
+            wait = await _in_thread(self._take)()
+            if not wait:
+                return True
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            await asyncio.sleep(min(wait, remaining))
+
+
+class CircuitBreaker:
+    """
+    Stop calling a backend after ``failure_threshold`` consecutive failed
+    calls. Once ``recovery_timeout`` seconds have passed, one trial call is
+    let through (half-open): success closes the circuit, failure reopens it.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, name, failure_threshold=5, recovery_timeout=30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        prefix = f"{RESILIENCE_CACHE_PREFIX}:circuit:{name}"
+        self.failures_key = f"{prefix}:failures"
+        self.opened_key = f"{prefix}:opened_at"
+        self.trial_key = f"{prefix}:trial"
+
+    def _opened_at(self):
+        return cache.get(self.opened_key)
+
+    def state(self):
+        opened_at = self._opened_at()
+        if opened_at is None:
+            return self.CLOSED
+        if time.time() - opened_at >= self.recovery_timeout:
+            return self.HALF_OPEN
+        return self.OPEN
+
+    def retry_in(self):
+        opened_at = self._opened_at()
+        if opened_at is None:
+            return 0
+        return max(self.recovery_timeout - (time.time() - opened_at), 0)
+
+    def allow(self):
+        state = self.state()
+        if state == self.CLOSED:
+            return True
+        if state == self.HALF_OPEN:
+            # Only one caller gets to probe the backend
+            return cache.add(self.trial_key, True, int(self.recovery_timeout) or 1)
+        return False
+
+    def record_success(self):
+        cache.delete_many([self.failures_key, self.opened_key, self.trial_key])
+
+    def record_failure(self):
+        cache.add(self.failures_key, 0, None)
+        try:
+            failures = cache.incr(self.failures_key)
+        except ValueError:
+            failures = 1
+            cache.set(self.failures_key, failures, None)
+
+        state = self.state()
+        if state == self.HALF_OPEN or failures >= self.failure_threshold:
+            if state != self.OPEN:
+                logger.warning(f"Opening circuit for {self.name} after {failures} failures")
+            cache.set(self.opened_key, time.time(), None)
+            cache.delete(self.trial_key)
+
+    def status(self):
+        """Summary for the AI quiz status page"""
+        return {
+            'state': self.state(),
+            'failures': cache.get(self.failures_key, 0),
+            'failure_threshold': self.failure_threshold,
+            'retry_in': round(self.retry_in()),
+        }
+
+
+class ResilientProvider(BaseLLMProvider):
+    """
+    Wrap a provider so calls go through the circuit breaker and rate limiter
+    and retryable errors are retried with backoff.
+    """
+
+    def __init__(self, provider, options=None):
+        options = {**get_resilience_settings(), **(options or {})}
+        super().__init__(provider.model)
+        self.provider = provider
+        self.name = provider.name
+        self.deadline = options['deadline']
+        self.retry = RetryPolicy(
+            options['max_attempts'], options['base_delay'], options['max_delay']
+        )
+        self.limiter = (
+            TokenBucket(provider.name, options['rate'], options['burst'])
+            if options['rate'] else None
+        )
+        self.breaker = CircuitBreaker(
+            provider.name, options['failure_threshold'], options['recovery_timeout']
+        )
+
+    def is_configured(self):
+        return self.provider.is_configured()
+
+    def ping(self):
+        return self.provider.ping()
+
+    def complete(self, messages, max_tokens, temperature=0.7, timeout=30):
+        if not self.breaker.allow():
+            raise CircuitOpenError(
+                f"{self.name} circuit is open after repeated failures",
+                retry_after=self.breaker.retry_in(),
+            )
+
+        deadline = time.monotonic() + self.deadline
+        attempt = 0
+        while True:
+            attempt += 1
+            remaining = deadline - time.monotonic()
+            if self.limiter and not self.limiter.acquire(timeout=max(remaining, 0)):
+                if attempt == 1:
+                    # Only our own traffic was throttled; the backend is fine
+                    raise LLMRateLimitError(f"Local rate limit for {self.name} exhausted the deadline")
+                break
+            try:
+                response = self.provider.complete(
+                    messages,
+                    max_tokens=max_tokens,
+                    temperature=temperature,
+                    timeout=max(min(timeout, deadline - time.monotonic()), 1),
+                )
+            except LLMProviderError as e:
+                error = e
+                if not e.retryable:
+                    # The request itself is bad; the backend is fine
+                    raise
+            else:
+                self.breaker.record_success()
+                return response
+
+            if attempt >= self.retry.max_attempts:
+                break
+            delay = self.retry.delay(attempt, error.retry_after)
+            if time.monotonic() + delay >= deadline:
+                break
+            logger.info(f"Retrying {self.name} in {delay:.2f}s after attempt {attempt}: {error}")
+            time.sleep(delay)
+
+        self.breaker.record_failure()
+        raise error
+
+    async def acomplete(self, messages, max_tokens, temperature=0.7, timeout=30, observer=None):
+        """Same policy as ``complete``, awaiting the provider and the backoff sleeps"""
+        if not await _in_thread(self.breaker.allow)():
+            raise CircuitOpenError(
+                f"{self.name} circuit is open after repeated failures",
+                retry_after=await _in_thread(self.breaker.retry_in)(),
+            )
+
+        deadline = time.monotonic() + self.deadline
+        attempt = 0
+        while True:
+            attempt += 1
+            remaining = deadline - time.monotonic()
+            if self.limiter and not await self.limiter.aacquire(timeout=max(remaining, 0)):
+                if attempt == 1:
+                    raise LLMRateLimitError(f"Local rate limit for {self.name} exhausted the deadline")
+                break
+            if observer is not None:
+                await observer.start()
+            try:
+                response = await self.provider.acomplete(
+                    messages,
+                    max_tokens=max_tokens,
+                    temperature=temperature,
+                    timeout=max(min(timeout, deadline - time.monotonic()), 1),
+                    observer=observer,
+                )
+            except LLMProviderError as e:
+                error = e
+                if not e.retryable:
+                    raise
+            else:
+                await _in_thread(self.breaker.record_success)()
+                return response
+
+            if attempt >= self.retry.max_attempts:
+                break
+            delay = self.retry.delay(attempt, error.retry_after)
+            if time.monotonic() + delay >= deadline:
+                break
+            logger.info(f"Retrying {self.name} in {delay:.2f}s after attempt {attempt}: {error}")
+            await asyncio.sleep(delay)
+
+        await _in_thread(self.breaker.record_failure)()
+        raise error
+
+
+def with_resilience(provider):
+    """Wrap ``provider`` in a ``ResilientProvider`` unless it already is one"""
+    if isinstance(provider, ResilientProvider):
+        return provider
+    return ResilientProvider(provider)
@@ -1,3 +1,719 @@
-from django.test import TestCase
+import gzip
+import json
+import os
+import shutil
+import tempfile
+from datetime import timedelta
+from io import StringIO
+from types import SimpleNamespace
+from unittest.mock import patch
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from accounts.models import User
+from course.models import Course, Program
+from .gemini_quiz import (
+    GroqQuizGenerator,
+    QuestionStreamCounter,
+    _render_course_block,
+    build_questions_cache_key,
+    estimate_max_tokens,
+    generation_lock_times,
+)
+from .grading import compile_answer_key, grade
+from .jobs import _update_job
+from .llm_providers import FakeLLMProvider, GroqProvider, LLMProviderError
+from .metrics import summarize
+from .models import (
+    GENERATION_JOB_STALE_AFTER,
+    Choice,
+    GroqGenerationJob,
+    GroqGenerationMetric,
+    GroqQuestion,
+    GroqQuizAnswer,
+    GroqQuizConfig,
+    GroqQuizSession,
+    GroqQuizSummary,
+    MCQuestion,
+    Quiz,
+)
+from .resilience import CircuitOpenError, ResilientProvider, TokenBucket
+
+
+class QuestionsCacheKeyTests(SimpleTestCase):
+    def test_topic_order_and_case_are_normalized(self):
+        key_a = build_questions_cache_key(
+            1, "Beginner", ["multiple_choice"], "Loops, functions", "model"
+        )
+        key_b = build_questions_cache_key(
+            1, "beginner", ["multiple_choice"], " functions ,LOOPS,", "model"
+        )
+        self.assertEqual(key_a, key_b)
+
+    def test_question_type_order_is_normalized(self):
+        key_a = build_questions_cache_key(
+            1, "beginner", ["true_false", "multiple_choice"], "", "model"
+        )
+        key_b = build_questions_cache_key(
+            1, "beginner", ["multiple_choice", "true_false"], "", "model"
+        )
+        self.assertEqual(key_a, key_b)
+
+    def test_key_is_bounded_and_safe_for_free_text_topics(self):
+        topics = ", ".join(f"topic with spaces & symbols #{i}" for i in range(200))
+        key = build_questions_cache_key(1, "advanced", ["short_answer"], topics, "model")
+        self.assertLess(len(key), 250)
+        self.assertNotIn(" ", key)
+
+    def test_different_parameters_produce_different_keys(self):
+        key_a = build_questions_cache_key(1, "beginner", ["multiple_choice"], "", "model")
+        key_b = build_questions_cache_key(2, "beginner", ["multiple_choice"], "", "model")
+        self.assertNotEqual(key_a, key_b)
+
+
+class PromptBuildingTests(SimpleTestCase):
+    def course(self, **kwargs):
+        fields = {"id": 1, "title": "Python Programming", "code": "PY101", "program": None}
+        fields.update(kwargs)
+        return SimpleNamespace(**fields)
+
+    def test_course_block_is_memoized_per_course_version(self):
+        generator = GroqQuizGenerator(provider=FakeLLMProvider())
+        _render_course_block.cache_clear()
+        generator._build_prompt(self.course(), "beginner", 5, ["true_false"], "")
+        prompt = generator._build_prompt(self.course(), "advanced", 3, ["short_answer"], "loops")
+        self.assertEqual(_render_course_block.cache_info().hits, 1)
+        self.assertIn("print(2**3)", prompt)
+        self.assertNotIn('"type": "multiple_choice"', prompt)
+
+        prompt = generator._build_prompt(self.course(title="Organic Chemistry"), "beginner", 5, ["true_false"], "")
+        self.assertEqual(_render_course_block.cache_info().misses, 2)
+        self.assertIn("balance chemical equations", prompt)
+
+    def test_max_tokens_scales_with_questions_and_types(self):
+        self.assertLess(estimate_max_tokens(5, ["true_false"]), estimate_max_tokens(5, ["multiple_choice"]))
+        self.assertLess(estimate_max_tokens(5, ["multiple_choice"]), estimate_max_tokens(20, ["multiple_choice"]))
+        self.assertEqual(estimate_max_tokens(1, ["true_false"]), 256)
+        self.assertLessEqual(estimate_max_tokens(500, ["multiple_choice"]), 8000)
+
+
+class GradingTests(SimpleTestCase):
+    def test_short_answers_need_a_real_match(self):
+        key = compile_answer_key({
+            "type": "short_answer",
+            "correct_answer": "Application Programming Interface",
+            "acceptable_answers": ["API"],
+        })
+        for answer in ["api", " API. ", "application programming interfaces", "Application Programing Interface"]:
+            self.assertTrue(grade(key, answer), answer)
+        for answer in ["", "a", "programming", "interface"]:
+            self.assertFalse(grade(key, answer), answer)
+
+    def test_typos_cannot_change_a_word(self):
+        for correct, wrong in [
+            ("endothermic", "exothermic"),
+            ("hypertension", "hypotension"),
+            ("mitosis", "meiosis"),
+            ("hyperglycemia", "hypoglycemia"),
+        ]:
+            key = compile_answer_key({"type": "short_answer", "correct_answer": correct})
+            self.assertFalse(grade(key, wrong), wrong)
+        key = compile_answer_key({"type": "short_answer", "correct_answer": "hyperglycemia"})
+        for answer in ["hyperglycaemia", "hyperglicemia", "hyperglycemai"]:
+            self.assertTrue(grade(key, answer), answer)
+
+    def test_numbers_are_exact_unless_a_tolerance_is_declared(self):
+        for correct, wrong in [("1945", "1930"), ("1945", "1950"), ("100", "101"), ("10", "10.1")]:
+            key = compile_answer_key({"type": "short_answer", "correct_answer": correct})
+            self.assertTrue(grade(key, correct + ".0"))
+            self.assertFalse(grade(key, wrong), wrong)
+
+        key = compile_answer_key({"type": "short_answer", "correct_answer": "3.14", "tolerance": "0.01"})
+        self.assertTrue(grade(key, "3.141"))
+        self.assertFalse(grade(key, "3"))
+        self.assertFalse(grade(key, "-3.14"))
+
+    def test_unicode_is_normalized(self):
+        key = compile_answer_key({"type": "short_answer", "correct_answer": "Ｐｙｔｈｏｎ"})
+        self.assertTrue(grade(key, "python"))
+        key = compile_answer_key({"type": "true_false", "correct_answer": "True"})
+        self.assertTrue(grade(key, " TRUE "))
+
+
+@override_settings(AI_QUIZ_RESILIENCE={"base_delay": 0})
+class FakeProviderGenerationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.course = SimpleNamespace(id=1, title="Python Programming", code="PY101")
+
+    def test_generates_requested_questions(self):
+        generator = GroqQuizGenerator(provider=FakeLLMProvider())
+        questions = generator.generate_questions(
+            self.course, "beginner", 6, ["multiple_choice", "true_false"]
+        )
+        self.assertEqual(len(questions), 6)
+        self.assertTrue(all(q["content"].startswith("[fake]") for q in questions))
+
+    def test_cached_pool_serves_smaller_requests(self):
+        provider = FakeLLMProvider()
+        generator = GroqQuizGenerator(provider=provider)
+        generator.generate_questions(self.course, "beginner", 8, ["true_false"])
+        questions = generator.generate_questions(self.course, "beginner", 5, ["true_false"])
+        self.assertEqual(len(questions), 5)
+        self.assertEqual(provider.calls, 1)
+        self.assertEqual(
+            GroqGenerationMetric.objects.filter(outcome=GroqGenerationMetric.CACHE_HIT).count(), 1
+        )
+
+    def test_malformed_response_falls_back_without_caching(self):
+        provider = FakeLLMProvider(malformed_rate=1.0)
+        generator = GroqQuizGenerator(provider=provider)
+        questions = generator.generate_questions(self.course, "beginner", 3, ["true_false"])
+        self.assertFalse(any(q["content"].startswith("[fake]") for q in questions))
+        generator.generate_questions(self.course, "beginner", 3, ["true_false"])
+        self.assertEqual(provider.calls, 2)
+
+    def test_provider_errors_fall_back(self):
+        generator = GroqQuizGenerator(provider=FakeLLMProvider(error_rate=1.0))
+        questions = generator.generate_questions(self.course, "beginner", 2, ["true_false"])
+        self.assertEqual(len(questions), 2)
+
+    def test_waiters_outlast_the_retry_deadline(self):
+        for deadline in (40.0, 100.0):
+            with self.settings(AI_QUIZ_RESILIENCE={"deadline": deadline}):
+                wait, timeout = generation_lock_times()
+            self.assertGreater(wait, deadline)
+            self.assertGreater(timeout, wait)
+
+
+@override_settings(AI_QUIZ_RESILIENCE={"base_delay": 0, "failure_threshold": 2})
+class ResilienceTests(SimpleTestCase):
+    messages = [{"role": "user", "content": "Number of Questions: 1"}]
+
+    def setUp(self):
+        cache.clear()
+
+    def test_retryable_errors_are_retried(self):
+        fake = FakeLLMProvider(rate_limit_rate=0.5, seed=3)
+        response = ResilientProvider(fake).complete(self.messages, max_tokens=100)
+        self.assertIn("[fake]", response.text)
+        self.assertGreater(fake.calls, 1)
+
+    def test_circuit_opens_after_repeated_failures(self):
+        fake = FakeLLMProvider(error_rate=1.0)
+        provider = ResilientProvider(fake)
+        for _ in range(2):
+            with self.assertRaises(LLMProviderError):
+                provider.complete(self.messages, max_tokens=100)
+        self.assertEqual(fake.calls, 6)
+        self.assertEqual(provider.breaker.status()["state"], "open")
+
+        with self.assertRaises(CircuitOpenError):
+            provider.complete(self.messages, max_tokens=100)
+        self.assertEqual(fake.calls, 6)
+
+    async def test_async_calls_are_retried(self):
+        fake = FakeLLMProvider(rate_limit_rate=0.5, seed=3)
+        response = await ResilientProvider(fake).acomplete(self.messages, max_tokens=100)
+        self.assertIn("[fake]", response.text)
+        self.assertGreater(fake.calls, 1)
+
+    def test_groq_clients_leave_retries_to_the_resilience_layer(self):
+        provider = GroqProvider(api_key="test-key")
+        with patch("quiz.llm_providers.Groq") as client, patch("quiz.llm_providers.AsyncGroq") as async_client:
+            provider.client
+            provider.async_client
+        self.assertEqual(client.call_args.kwargs["max_retries"], 0)
+        self.assertEqual(async_client.call_args.kwargs["max_retries"], 0)
+
+    def test_local_throttling_does_not_open_the_circuit(self):
+        fake = FakeLLMProvider()
+        provider = ResilientProvider(fake, {"rate": 0.001, "burst": 1, "deadline": 0.01})
+        provider.complete(self.messages, max_tokens=100)
+        for _ in range(3):
+            with self.assertRaises(LLMProviderError):
+                provider.complete(self.messages, max_tokens=100)
+        self.assertEqual(fake.calls, 1)
+        self.assertEqual(provider.breaker.status()["state"], "closed")
+
+    def test_token_bucket_limits_burst(self):
+        bucket = TokenBucket("test", rate=1, capacity=2)
+        self.assertTrue(bucket.acquire(timeout=0))
+        self.assertTrue(bucket.acquire(timeout=0))
+        self.assertFalse(bucket.acquire(timeout=0))
+
+
+@override_settings(AI_QUIZ_RESILIENCE={"base_delay": 0}, AI_QUIZ_METRICS_TOKEN="secret")
+class GenerationMetricsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.course = SimpleNamespace(id=1, title="Python Programming", code="PY101")
+
+    def test_generations_and_cache_hits_are_recorded(self):
+        generator = GroqQuizGenerator(provider=FakeLLMProvider())
+        generator.generate_questions(self.course, "beginner", 4, ["true_false"])
+        generator.generate_questions(self.course, "beginner", 4, ["true_false"])
+        GroqQuizGenerator(provider=FakeLLMProvider(malformed_rate=1.0)).generate_questions(
+            self.course, "advanced", 4, ["true_false"]
+        )
+
+        summary = summarize()
+        self.assertEqual(summary["requests"], 3)
+        self.assertEqual(summary["cache_hits"], 1)
+        self.assertEqual(summary["llm_calls"], 2)
+        self.assertEqual(summary["parse_failure_rate"], 50.0)
+        self.assertGreater(summary["completion_tokens"], 0)
+
+    def test_prometheus_endpoint_requires_token(self):
+        GroqQuizGenerator(provider=FakeLLMProvider()).generate_questions(
+            self.course, "beginner", 2, ["true_false"]
+        )
+        url = reverse("ai_quiz_metrics")
+        self.assertEqual(self.client.get(url).status_code, 403)
+        response = self.client.get(url, HTTP_AUTHORIZATION="Bearer secret")
+        self.assertEqual(response.status_code, 200)
+        body = response.content.decode()
+        self.assertIn('outcome="generated"} 1', body)
+        self.assertIn('ai_quiz_generation_latency_seconds_count 1', body)
+
+        # Scrapes only aggregate the recent window
+        GroqGenerationMetric.objects.update(created_at=timezone.now() - timedelta(days=1))
+        body = self.client.get(url, HTTP_AUTHORIZATION="Bearer secret").content.decode()
+        self.assertNotIn('outcome="generated"}', body)
+        self.assertIn('ai_quiz_generation_latency_seconds_count 0', body)
+
+
+class AIQuizSessionTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username="student")
+        program = Program.objects.create(title="Computer Science")
+        self.course = Course.objects.create(
+            title="Python Programming",
+            code="PY101",
+            program=program,
+            level="Beginner",
+            semester="First",
+        )
+        self.config = GroqQuizConfig.objects.create(
+            user=self.user,
+            course=self.course,
+            num_questions=3,
+            questions_per_session=2,
+            question_types=["true_false"],
+        )
+        self.questions = [
+            {
+                "type": "true_false",
+                "content": f"Statement {i}",
+                "correct_answer": "True",
+                "explanation": "",
+            }
+            for i in range(3)
+        ]
+
+    def create_session(self):
+        return GroqQuizSession.objects.create_with_questions(
+            self.user, self.course, self.config, self.questions
+        )
+
+
+class GroqQuizSessionStorageTests(AIQuizSessionTestCase):
+    def test_questions_are_stored_once_in_the_bank(self):
+        self.create_session()
+        self.create_session()
+        self.assertEqual(GroqQuestion.objects.count(), 3)
+
+    def test_sessions_are_served_in_batches(self):
+        session = self.create_session()
+        self.assertEqual(session.total_questions, 3)
+        self.assertEqual(len(session.session_questions), 2)
+        self.assertTrue(session.start_next_session())
+        self.assertEqual(session.session_questions, self.questions[2:])
+        self.assertFalse(session.can_continue_to_next_session())
+
+    def test_submit_answer_records_answer_and_updates_counters(self):
+        session = self.create_session()
+        # Lock, items, insert and update, plus the savepoints around them
+        with self.assertNumQueries(8):
+            self.assertTrue(session.submit_answer("True", latency_ms=1500))
+        session.refresh_from_db()
+        self.assertEqual(session.score, 1)
+        self.assertEqual(session.current_question_index, 1)
+        answer = session.answers.get()
+        self.assertEqual(answer.item.position, 0)
+        self.assertEqual(answer.latency_ms, 1500)
+
+    def test_duplicate_submission_is_reported_as_already_answered(self):
+        session = self.create_session()
+        stale = GroqQuizSession.objects.get(pk=session.pk)
+        self.assertTrue(session.submit_answer("True"))
+        self.assertIsNone(stale.submit_answer("True"))
+
+        # A submission racing past the index check hits the one-answer-per-item constraint
+        session = self.create_session()
+        GroqQuizAnswer.objects.create(session=session, item=session.get_current_item(), answer="True")
+        self.assertIsNone(session.submit_answer("True"))
+        session.refresh_from_db()
+        self.assertEqual((session.current_question_index, session.score), (0, 0))
+
+    def test_accuracy_by_topic(self):
+        self.questions[0]["topic"] = "Loops"
+        self.questions[1]["topic"] = "Loops"
+        session = self.create_session()
+        session.submit_answer("True", latency_ms=1000)
+        session.submit_answer("False", latency_ms=3000)
+
+        rows = list(GroqQuizAnswer.objects.filter(session=session).accuracy_by_topic())
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0]["group"], "Loops")
+        self.assertEqual(rows[0]["answered"], 2)
+        self.assertEqual(rows[0]["correct"], 1)
+        self.assertEqual(rows[0]["avg_latency_ms"], 2000)
+
+    def test_regrade_command_fixes_scores(self):
+        self.questions[0] = {"type": "short_answer", "content": "Abbreviation?", "correct_answer": "API"}
+        session = self.create_session()
+        session.submit_answer("a")
+        answer = session.answers.get()
+        GroqQuizAnswer.objects.filter(pk=answer.pk).update(is_correct=True)
+        GroqQuizSession.objects.filter(pk=session.pk).update(score=1)
+
+        call_command("regrade_ai_answers", stdout=StringIO())
+
+        answer.refresh_from_db()
+        session.refresh_from_db()
+        self.assertFalse(answer.is_correct)
+        self.assertEqual(session.score, 0)
+
+
+class AIQuizHistoryTests(AIQuizSessionTestCase):
+    def complete_session(self, answers):
+        session = self.create_session()
+        for answer in answers:
+            if session.get_current_item() is None:
+                session.start_next_session()
+            session.submit_answer(answer)
+        session.complete()
+        return session
+
+    def test_complete_stores_answer_count_and_percentage(self):
+        session = self.complete_session(["True", "False"])
+        session.refresh_from_db()
+        self.assertTrue(session.completed)
+        self.assertEqual(session.questions_answered, 2)
+        self.assertEqual(session.score, 1)
+        self.assertEqual(session.percentage, 50)
+
+    def test_history_is_paginated_by_cursor(self):
+        sessions = [self.complete_session(["True"]) for _ in range(3)]
+        self.client.force_login(self.user)
+        url = reverse("ai_quiz_history")
+
+        with patch("quiz.views.HISTORY_PAGE_SIZE", 2):
+            first = self.client.get(url)
+            self.assertEqual([s.pk for s in first.context["sessions"]], [sessions[2].pk, sessions[1].pk])
+            second = self.client.get(url, {"cursor": first.context["next_cursor"]})
+        self.assertEqual([s.pk for s in second.context["sessions"]], [sessions[0].pk])
+        self.assertIsNone(second.context["next_cursor"])
+
+
+class RetentionTests(AIQuizSessionTestCase):
+    def setUp(self):
+        super().setUp()
+        self.archive_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.archive_dir)
+
+    def compact(self, **options):
+        options.setdefault("archive_dir", self.archive_dir)
+        call_command("compact_ai_quiz_data", stdout=StringIO(), **options)
+
+    def test_archives_are_never_written_to_media(self):
+        with self.assertRaisesMessage(CommandError, "AI_QUIZ_ARCHIVE_DIR"):
+            self.compact(archive_dir=None)
+        with self.assertRaisesMessage(CommandError, "outside MEDIA_ROOT"):
+            self.compact(archive_dir=os.path.join(settings.MEDIA_ROOT, "ai_quiz_archive"))
+
+    def test_old_generation_metrics_are_deleted(self):
+        for days in (100, 1):
+            metric = GroqGenerationMetric.objects.create(
+                outcome=GroqGenerationMetric.CACHE_HIT, provider="fake", model="fake"
+            )
+            GroqGenerationMetric.objects.filter(pk=metric.pk).update(
+                created_at=timezone.now() - timedelta(days=days)
+            )
+        self.compact(metrics_days=90, batch_size=1)
+        self.assertEqual(GroqGenerationMetric.objects.get().pk, metric.pk)
+
+    def test_old_configs_with_a_generation_in_flight_are_kept(self):
+        GroqQuizConfig.objects.update(created_at=timezone.now() - timedelta(days=365))
+        job = GroqGenerationJob.objects.start_for(self.user, self.config)
+        self.compact()
+        self.assertTrue(GroqGenerationJob.objects.filter(pk=job.pk).exists())
+
+        GroqGenerationJob.objects.filter(pk=job.pk).update(status=GroqGenerationJob.FAILED)
+        self.compact()
+        self.assertFalse(GroqQuizConfig.objects.filter(pk=self.config.pk).exists())
+
+    def test_duplicate_configs_are_merged(self):
+        duplicate = GroqQuizConfig.objects.create(
+            user=self.user,
+            course=self.course,
+            num_questions=3,
+            questions_per_session=2,
+            question_types=["true_false"],
+        )
+        self.assertEqual(GroqQuizConfig.objects.find_duplicate(duplicate), self.config)
+        session = GroqQuizSession.objects.create_with_questions(self.user, self.course, duplicate, self.questions)
+
+        self.compact()
+
+        self.assertFalse(GroqQuizConfig.objects.filter(pk=duplicate.pk).exists())
+        session.refresh_from_db()
+        self.assertEqual(session.config_id, self.config.pk)
+
+    def test_old_sessions_are_archived_and_summarized(self):
+        old = self.create_session()
+        old.submit_answer("True")
+        old.complete()
+        recent = self.create_session()
+        recent.complete()
+        GroqQuizSession.objects.filter(pk=old.pk).update(completed_at=timezone.now() - timedelta(days=400))
+
+        self.compact(days=180)
+
+        self.assertEqual(list(GroqQuizSession.objects.values_list("pk", flat=True)), [recent.pk])
+        summary = GroqQuizSummary.objects.get(user=self.user)
+        self.assertEqual((summary.sessions, summary.questions_answered, summary.correct), (1, 1, 1))
+
+        [archive] = os.listdir(self.archive_dir)
+        with gzip.open(os.path.join(self.archive_dir, archive), "rt") as f:
+            [record] = [json.loads(line) for line in f]
+        self.assertEqual(record["id"], old.pk)
+        self.assertEqual(len(record["items"]), 3)
+        self.assertEqual(record["items"][0]["answer"], "True")
+
+
+@override_settings(
+    AI_QUIZ_PROVIDER="fake", AI_QUIZ_FAKE_PROVIDER={}, AI_QUIZ_RESILIENCE={"base_delay": 0}
+)
+class GenerationJobTests(AIQuizSessionTestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+
+    def test_repeated_starts_join_one_job(self):
+        self.client.force_login(self.user)
+        url = reverse("ai_quiz_start", args=[self.config.pk])
+        first = self.client.get(url)
+        second = self.client.get(url)
+        job = GroqGenerationJob.objects.get()
+        self.assertRedirects(first, reverse("ai_quiz_progress", args=[job.pk]), fetch_redirect_response=False)
+        self.assertEqual(second.url, first.url)
+
+    async def test_events_stream_progress_until_done(self):
+        await sync_to_async(self.async_client.force_login)(self.user)
+        job = await sync_to_async(GroqGenerationJob.objects.start_for)(self.user, self.config)
+
+        response = await self.async_client.get(reverse("ai_quiz_job_events", args=[job.pk]))
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        body = b"".join([chunk async for chunk in response.streaming_content]).decode()
+
+        self.assertIn("event: progress", body)
+        self.assertIn("event: done", body)
+        await job.arefresh_from_db()
+        self.assertEqual(job.status, GroqGenerationJob.DONE)
+        self.assertEqual(job.questions_parsed, 3)
+        self.assertEqual(await GroqQuizSession.objects.filter(user=self.user).acount(), 1)
+
+    def test_long_poll_runs_the_job(self):
+        self.client.force_login(self.user)
+        job = GroqGenerationJob.objects.start_for(self.user, self.config)
+        progress = self.client.get(reverse("ai_quiz_job_status", args=[job.pk])).json()
+        self.assertEqual(progress["status"], "done")
+        session = GroqQuizSession.objects.get(user=self.user)
+        self.assertEqual(progress["url"], reverse("ai_quiz_take", args=[session.pk]))
+
+    @override_settings(AI_QUIZ_FAKE_PROVIDER={"error_rate": 1.0})
+    def test_failed_generation_banks_no_fallback_questions(self):
+        self.client.force_login(self.user)
+        job = GroqGenerationJob.objects.start_for(self.user, self.config)
+        progress = self.client.get(reverse("ai_quiz_job_status", args=[job.pk])).json()
+        self.assertEqual(progress["status"], "failed")
+        self.assertFalse(GroqQuestion.objects.exists())
+        self.assertFalse(GroqQuizSession.objects.exists())
+
+        fallback = GroqQuizGenerator(provider=FakeLLMProvider())._get_fallback_questions(2)
+        with self.assertRaises(ValueError):
+            GroqQuestion.objects.get_or_create_many(self.course, "beginner", fallback)
+
+    async def test_progress_keeps_a_running_job_claimed(self):
+        job = await sync_to_async(GroqGenerationJob.objects.start_for)(self.user, self.config)
+        self.assertTrue(await sync_to_async(GroqGenerationJob.objects.claim)(job.pk))
+        started = timezone.now() - 2 * GENERATION_JOB_STALE_AFTER
+        await GroqGenerationJob.objects.filter(pk=job.pk).aupdate(updated_at=started)
+
+        await _update_job(job.pk, questions_parsed=1)
+
+        await job.arefresh_from_db()
+        self.assertGreater(job.updated_at, started)
+        self.assertFalse(await sync_to_async(GroqGenerationJob.objects.claim)(job.pk))
+
+    async def test_stream_counter_counts_closed_questions(self):
+        counts = []
+
+        async def on_progress(count):
+            counts.append(count)
+
+        counter = QuestionStreamCounter(on_progress)
+        for chunk in ['Here you go: [{"content": "a {b}", "x": "\\\\"', '}, {"content": "c"', "}]"]:
+            await counter.feed(chunk)
+        self.assertEqual(counts, [1, 2])
+
+
+class BenchmarkCommandTests(TransactionTestCase):
+    """The benchmark's worker threads need their own connections to see the data"""
+
+    def test_benchmark_follows_generation_jobs(self):
+        program = Program.objects.create(title="Computer Science")
+        course = Course.objects.create(title="Python Programming", code="PY101", program=program)
+        out = StringIO()
+        call_command("benchmark_ai_quiz", requests=2, num_questions=3, course=course.pk, stdout=out)
+        report = out.getvalue()
+        self.assertIn("failed requests: 0", report)
+        self.assertIn("parse success:   2/2", report)
+
+
+@override_settings(AI_QUIZ_PROVIDER="fake", AI_QUIZ_FAKE_PROVIDER={})
+class QuestionPoolTests(AIQuizSessionTestCase):
+    def warm(self, target):
+        call_command(
+            "warm_ai_question_pools",
+            course=[self.course.pk],
+            difficulty=["beginner"],
+            question_type=["true_false"],
+            target=target,
+            stdout=StringIO(),
+        )
+
+    def test_warming_fills_pools_up_to_target(self):
+        self.warm(target=3)
+        pool = GroqQuestion.objects.filter(course=self.course, difficulty="beginner", question_type="true_false")
+        self.assertEqual(pool.count(), 3)
+        self.assertTrue(pool.filter(content__startswith="[fake]").exists())
+
+    def test_start_view_requires_login(self):
+        response = self.client.get(reverse("ai_quiz_start", args=[self.config.pk]))
+        self.assertEqual(response.status_code, 302)
+        self.assertIn("next=", response.url)
+
+    def test_draw_skips_questions_the_user_has_seen(self):
+        self.warm(target=5)
+        pool = GroqQuestion.objects.filter(course=self.course, difficulty="beginner")
+        bank = pool.draw(3, ["true_false"], user=self.user)
+        self.assertEqual(len(bank), 3)
+        GroqQuizSession.objects.create_with_bank_questions(self.user, self.course, self.config, bank)
+        self.assertIsNone(pool.draw(3, ["true_false"], user=self.user))
+        self.assertEqual(len(pool.draw(2, ["true_false"], user=self.user)), 2)
+
+
+class PromoteToQuizTests(AIQuizSessionTestCase):
+    def setUp(self):
+        super().setUp()
+        self.questions.append(
+            {
+                "type": "multiple_choice",
+                "content": "Which keyword defines a function?",
+                "options": ["def", "fun", "lambda", "fn"],
+                "correct_answer": 0,
+                "explanation": "Functions are defined with def.",
+            }
+        )
+        self.config.num_questions = 4
+        self.config.question_types = ["true_false", "multiple_choice"]
+        self.config.save()
+        self.quiz = Quiz.objects.create(course=self.course, title="Week 1")
+
+    def promote(self, quiz):
+        self.create_session()
+        return GroqQuestion.objects.all().promote_to_quiz(quiz)
+
+    def test_questions_become_mc_questions_with_choices(self):
+        counts = self.promote(self.quiz)
+        self.assertEqual(counts, {"created": 4, "linked": 0, "skipped": 0})
+        self.assertEqual(self.quiz.question_set.count(), 4)
+        question = MCQuestion.objects.get(content="Which keyword defines a function?")
+        self.assertEqual(question.explanation, "Functions are defined with def.")
+        self.assertEqual(
+            list(question.get_choices().values_list("choice_text", "correct")),
+            [("def", True), ("fun", False), ("lambda", False), ("fn", False)],
+        )
+        self.assertEqual(
+            list(Choice.objects.filter(question__content="Statement 0").values_list("choice_text", "correct")),
+            [("True", True), ("False", False)],
+        )
+
+    def test_existing_questions_are_not_duplicated(self):
+        self.promote(self.quiz)
+        self.assertEqual(self.promote(self.quiz), {"created": 0, "linked": 0, "skipped": 4})
+
+        other_quiz = Quiz.objects.create(course=self.course, title="Week 2")
+        self.assertEqual(self.promote(other_quiz), {"created": 0, "linked": 4, "skipped": 0})
+        self.assertEqual(MCQuestion.objects.count(), 4)
+        self.assertEqual(other_quiz.question_set.count(), 4)
+
+
+class AdaptiveSessionTests(AIQuizSessionTestCase):
+    def setUp(self):
+        super().setUp()
+        self.config.adaptive = True
+        self.config.num_questions = 6
+        self.config.save()
+        for difficulty in ["beginner", "intermediate", "advanced"]:
+            GroqQuestion.objects.get_or_create_many(
+                self.course,
+                difficulty,
+                [
+                    {
+                        "type": "true_false",
+                        "content": f"{difficulty} statement {i}",
+                        "correct_answer": "True",
+                    }
+                    for i in range(4)
+                ],
+            )
+
+    def test_only_first_batch_is_linked(self):
+        session = self.create_session()
+        self.assertEqual(session.total_questions, 6)
+        self.assertEqual(session.items.count(), 2)
+        self.assertEqual(session.ability, -1.0)
+
+    def test_next_batch_follows_ability(self):
+        session = self.create_session()
+        session.submit_answer("True")
+        session.submit_answer("True")
+        self.assertGreater(session.ability, -1.0)
+        self.assertTrue(session.start_next_session())
+        difficulties = {item.question.difficulty for item in session.session_items}
+        self.assertEqual(difficulties, {"beginner"})
+
+        session.ability = 0.9
+        session.current_question_index = len(session.session_items)
+        self.assertTrue(session.start_next_session())
+        difficulties = {item.question.difficulty for item in session.session_items}
+        self.assertEqual(difficulties, {"advanced"})
+        self.assertFalse(session.can_continue_to_next_session())
+
+    def test_mastery_ends_session(self):
+        session = self.create_session()
+        session.ability = 2.0
+        session.session_number = 4
+        self.assertTrue(session.is_mastered())
+        self.assertFalse(session.can_continue_to_next_session())
+        self.assertFalse(session.start_next_session())
@@ -19,9 +19,15 @@ urlpatterns = [
     path("ai-quiz/config/", views.AIConfigView.as_view(), name="ai_quiz_config"),
     path("ai-quiz/start/<int:pk>/", views.ai_quiz_start, name="ai_quiz_start"),
     path("ai-quiz/status/", views.ai_quiz_status, name="ai_quiz_status"),
+    path("ai-quiz/jobs/<int:job_id>/", views.ai_quiz_progress, name="ai_quiz_progress"),
+    path("ai-quiz/jobs/<int:job_id>/events/", views.ai_quiz_job_events, name="ai_quiz_job_events"),
+    path("ai-quiz/jobs/<int:job_id>/status/", views.ai_quiz_job_status, name="ai_quiz_job_status"),
     path("ai-quiz/take/<int:session_id>/", views.AIQuizTakeView.as_view(), name="ai_quiz_take"),
     path("ai-quiz/submit/<int:session_id>/", views.ai_quiz_submit, name="ai_quiz_submit"),
     path("ai-quiz/continue/<int:session_id>/", views.ai_quiz_continue, name="ai_quiz_continue"),
     path("ai-quiz/result/<int:session_id>/", views.AIQuizResultView.as_view(), name="ai_quiz_result"),
     path("ai-quiz/history/", views.ai_quiz_history, name="ai_quiz_history"),
+    path("ai-quiz/promote/<slug>/", views.ai_quiz_promote, name="ai_quiz_promote"),
+    path("ai-quiz/metrics/", views.ai_quiz_metrics_summary, name="ai_quiz_metrics_summary"),
+    path("ai-quiz/metrics/prometheus/", views.ai_quiz_metrics, name="ai_quiz_metrics"),
 ]
@@ -0,0 +1,42 @@
+import base64
+from datetime import datetime
+
+from django.db.models import Q
+
+
+def encode_cursor(value, pk):
+    """Opaque token for the position of a row ordered by a datetime and its pk"""
+    raw = f"{value.isoformat()}|{pk}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """``(value, pk)`` from ``encode_cursor``, or None for a missing or mangled token"""
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        value, pk = raw.rsplit('|', 1)
+        return datetime.fromisoformat(value), int(pk)
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+
+def paginate_by_cursor(queryset, cursor, field, page_size):
+    """
+    Keyset pagination over ``queryset``, newest ``field`` first. Unlike
+    offset pagination, a page costs the same however far back it is and no
+    count query is needed. Returns the rows of the page and the cursor of
+    the next one, which is None on the last page.
+    """
+    queryset = queryset.order_by(f'-{field}', '-pk')
+    position = decode_cursor(cursor)
+    if position:
+        value, pk = position
+        queryset = queryset.filter(Q(**{f'{field}__lt': value}) | Q(**{field: value, 'pk__lt': pk}))
+
+    rows = list(queryset[:page_size + 1])
+    if len(rows) <= page_size:
+        return rows, None
+    rows = rows[:page_size]
+    return rows, encode_cursor(getattr(rows[-1], field), rows[-1].pk)
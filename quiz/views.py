@@ -1,10 +1,19 @@
 import logging
+import time
+from datetime import timedelta
+from asgiref.sync import sync_to_async
+from django.conf import settings
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
+from django.core import signing
 
 logger = logging.getLogger(__name__)
 from django.db import transaction
+from django.db.models import Sum
+from django.http import Http404, HttpResponse, HttpResponseForbidden, JsonResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404, redirect, render
+from django.utils import timezone
+from django.utils.crypto import constant_time_compare
 from django.utils.decorators import method_decorator
 from django.views.generic import (
     CreateView,
@@ -18,6 +27,7 @@ from django.views.generic import (
 from accounts.decorators import lecturer_required
 from .forms import (
     AIQuizConfigForm,
+    AIQuizPromoteForm,
     EssayForm,
     MCQuestionForm,
     MCQuestionFormSet,
@@ -27,15 +37,27 @@ from .forms import (
 from .models import (
     Course,
     EssayQuestion,
+    GroqGenerationJob,
+    GroqGenerationMetric,
+    GroqQuestion,
     GroqQuizConfig,
     GroqQuizSession,
+    GroqQuizSummary,
     MCQuestion,
     Progress,
     Question,
     Quiz,
     Sitting,
 )
-from .gemini_quiz import GroqQuizGenerator
+from .jobs import progress_events, wait_for_change
+from .llm_providers import get_provider
+from .metrics import prometheus_text, summarize
+from .resilience import ResilientProvider
+from .utils import paginate_by_cursor
+
+SERVED_TOKEN_SALT = "quiz.ai_quiz_take.served"
+MAX_ANSWER_LATENCY = 60 * 60  # seconds; older tokens aren't timed
+HISTORY_PAGE_SIZE = 20
 
 
 # ########################################################
@@ -385,6 +407,11 @@ class AIConfigView(CreateView):
 
     def form_valid(self, form):
         form.instance.user = self.request.user
+        # Reuse an identical config rather than adding a row per submit
+        existing = GroqQuizConfig.objects.find_duplicate(form.instance)
+        if existing is not None:
+            self.object = existing
+            return redirect(self.get_success_url())
         return super().form_valid(form)
 
     def get_success_url(self):
@@ -402,88 +429,111 @@ class AIConfigView(CreateView):
         return form
 
 
-from .decorators import handle_ai_errors
+from .decorators import async_login_required, handle_ai_errors
 
-@login_required
+@async_login_required
 @handle_ai_errors
-def ai_quiz_start(request, pk):
-    config = get_object_or_404(GroqQuizConfig, pk=pk, user=request.user)
+async def ai_quiz_start(request, pk):
+    """
+    Serve a quiz from the question pool, or queue a generation job and
+    send the user to its progress page. ORM work runs in a thread through
+    ``sync_to_async``.
+    """
+    try:
+        config = await GroqQuizConfig.objects.select_related('course__program').aget(
+            pk=pk, user=request.user
+        )
+    except GroqQuizConfig.DoesNotExist:
+        raise Http404("No AI quiz configuration matches the given query.")
+
+    # Ensure question_types is properly formatted
+    question_types = config.question_types
+    if isinstance(question_types, str):
+        question_types = [question_types]
+
+    # Serve from the pre-generated pool when it has enough questions the
+    # student hasn't seen; topic-focused quizzes always need a generation
+    if not (config.topics or '').strip():
+        bank = await sync_to_async(
+            GroqQuestion.objects.filter(course=config.course, difficulty=config.difficulty).draw
+        )(config.num_questions, question_types, user=request.user)
+        if bank:
+            session = await sync_to_async(GroqQuizSession.objects.create_with_bank_questions)(
+                user=request.user,
+                course=config.course,
+                config=config,
+                bank=bank,
+            )
+            messages.success(request, f"AI quiz generated with {session.total_questions} questions!")
+            return redirect('ai_quiz_take', session_id=session.id)
 
     # Validate configuration before proceeding
-    if not settings.GROQ_API_KEY:
+    provider = get_provider()
+    if not provider.is_configured():
         messages.error(request, "AI quiz service is currently unavailable.")
         return redirect('ai_quiz_config')
 
-    try:
-        # Generate questions using Groq
-        generator = GroqQuizGenerator()
-
-        # Ensure question_types is properly formatted
-        question_types = config.question_types
-        if isinstance(question_types, str):
-            question_types = [question_types]
-
-        logger.info(f"Starting AI quiz generation for user {request.user.username}")
-
-        questions = generator.generate_questions(
-            course=config.course,
-            difficulty=config.difficulty,
-            num_questions=config.num_questions,
-            question_types=question_types,
-            topics=config.topics
-        )
+    # Generation runs in a job the progress page streams; submitting the
+    # form again while it runs joins the same job
+    job = await sync_to_async(GroqGenerationJob.objects.start_for)(request.user, config)
+    return redirect('ai_quiz_progress', job_id=job.pk)
 
-        if not questions:
-            messages.warning(request, "No questions could be generated. Using fallback questions.")
-            questions = generator._get_fallback_questions(config.num_questions)
 
-        # Create quiz session
-        questions_per_session = config.questions_per_session
-        session_questions = questions[:questions_per_session]
+@login_required
+def ai_quiz_progress(request, job_id):
+    job = get_object_or_404(
+        GroqGenerationJob.objects.select_related('config__course'), pk=job_id, user=request.user
+    )
+    if job.status == GroqGenerationJob.DONE and job.session_id:
+        return redirect('ai_quiz_take', session_id=job.session_id)
+    return render(request, 'quiz/ai_quiz_progress.html', {'job': job, 'progress': job.progress()})
 
-        session = GroqQuizSession.objects.create(
-            user=request.user,
-            course=config.course,
-            config=config,
-            questions=questions,
-            session_questions=session_questions,
-        )
 
-        messages.success(request, f"AI quiz generated with {len(session.questions)} questions!")
-        return redirect('ai_quiz_take', session_id=session.id)
+@async_login_required
+async def ai_quiz_job_events(request, job_id):
+    """Server-sent progress events of a generation job"""
+    if not await GroqGenerationJob.objects.filter(pk=job_id, user=request.user).aexists():
+        raise Http404("No generation job matches the given query.")
+    response = StreamingHttpResponse(progress_events(job_id), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Stop nginx from buffering the stream
+    response['X-Accel-Buffering'] = 'no'
+    return response
 
-    except Exception as e:
-        logger.error(f"Quiz generation failed: {str(e)}")
-        messages.error(request, f"Failed to start quiz: {str(e)}")
-        return redirect('ai_quiz_config')
 
+@async_login_required
+async def ai_quiz_job_status(request, job_id):
+    """Long-poll fallback for clients without EventSource"""
+    if not await GroqGenerationJob.objects.filter(pk=job_id, user=request.user).aexists():
+        raise Http404("No generation job matches the given query.")
+    return JsonResponse(await wait_for_change(job_id, since=request.GET.get('since')))
 
-@login_required
+
+@async_login_required
 @handle_ai_errors
-def ai_quiz_status(request):
+async def ai_quiz_status(request):
     """Check if AI quiz service is properly configured"""
+    provider = get_provider()
+    api_key = getattr(settings, 'GROQ_API_KEY', "") or ""
     status = {
-        'groq_configured': bool(settings.GROQ_API_KEY),
-        'api_key_length': len(settings.GROQ_API_KEY) if settings.GROQ_API_KEY else 0,
-        'model': getattr(settings, 'GROQ_MODELS', {}).get('quiz_generation', 'llama3-70b-8192')
+        'provider': provider.name,
+        'groq_configured': provider.is_configured(),
+        'api_key_length': len(api_key),
+        'model': provider.model,
+        'circuit': await sync_to_async(ResilientProvider(provider).breaker.status)(),
     }
 
     # Test API connection
     if status['groq_configured']:
         try:
-            generator = GroqQuizGenerator()
-            test_response = generator.client.chat.completions.create(
-                model=status['model'],
-                messages=[{"role": "user", "content": "Say 'OK'"}],
-                max_tokens=5
-            )
+            await provider.aping()
             status['api_working'] = True
             status['api_test'] = "Success"
         except Exception as e:
             status['api_working'] = False
             status['api_test'] = str(e)
 
-    return render(request, 'quiz/ai_quiz_status.html', {'status': status})
+    return await sync_to_async(render)(request, 'quiz/ai_quiz_status.html', {'status': status})
 
 
 @method_decorator([login_required], name="dispatch")
@@ -504,14 +554,33 @@ class AIQuizTakeView(TemplateView):
             'session_progress': progress_info['session_progress'],
             'total_progress': progress_info['total_progress'],
             'question_number': session.current_question_index + 1,
-            'total_questions_in_session': len(session.session_questions),
+            'total_questions_in_session': len(session.session_items),
             'total_questions_overall': progress_info['total_questions'],
             'can_continue': session.can_continue_to_next_session(),
             'questions_per_session': session.config.questions_per_session,
+            'served_token': signing.dumps(
+                [session.id, session.current_question_index, time.time()],
+                salt=SERVED_TOKEN_SALT,
+            ),
         })
         return context
 
 
+def _answer_latency_ms(request, session):
+    """Milliseconds since the current question was served, if the form says so"""
+    try:
+        session_id, index, served_at = signing.loads(
+            request.POST.get('served_token', ''),
+            salt=SERVED_TOKEN_SALT,
+            max_age=MAX_ANSWER_LATENCY,
+        )
+    except (signing.BadSignature, ValueError, TypeError):
+        return None
+    if session_id != session.id or index != session.current_question_index:
+        return None
+    return max(int((time.time() - served_at) * 1000), 0)
+
+
 @login_required
 def ai_quiz_submit(request, session_id):
     if request.method == 'POST':
@@ -520,10 +589,10 @@ def ai_quiz_submit(request, session_id):
         continue_quiz = request.POST.get('continue_quiz')
 
         if answer is not None:
-            is_correct = session.submit_answer(answer)
+            session.submit_answer(answer, latency_ms=_answer_latency_ms(request, session))
 
             # Check if current session is complete
-            if session.current_question_index >= len(session.session_questions):
+            if session.current_question_index >= len(session.session_items):
                 # If there are more questions and user wants to continue
                 if session.can_continue_to_next_session() and continue_quiz:
                     session.start_next_session()
@@ -531,10 +600,9 @@ def ai_quiz_submit(request, session_id):
                     return redirect('ai_quiz_take', session_id=session_id)
                 # If there are no more questions or user doesn't want to continue
                 else:
-                    session.completed = True
-                    from django.utils.timezone import now
-                    session.completed_at = now()
-                    session.save()
+                    if session.config.adaptive and session.is_mastered():
+                        messages.success(request, "Mastery reached! The adaptive quiz ended early.")
+                    session.complete()
                     return redirect('ai_quiz_result', session_id=session_id)
 
             return redirect('ai_quiz_take', session_id=session_id)
@@ -566,8 +634,95 @@ class AIQuizResultView(DetailView):
     def get_queryset(self):
         return GroqQuizSession.objects.filter(user=self.request.user)
 
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['review'] = self.object.items.select_related('question', 'answer')
+        context['topic_accuracy'] = [
+            {
+                'topic': row['group'] or "General",
+                'answered': row['answered'],
+                'correct': row['correct'],
+                'percent': round(row['correct'] / row['answered'] * 100),
+                'avg_latency_ms': row['avg_latency_ms'],
+            }
+            for row in self.object.answers.accuracy_by_topic()
+        ]
+        return context
+
 
 @login_required
 def ai_quiz_history(request):
-    sessions = GroqQuizSession.objects.filter(user=request.user, completed=True).order_by('-completed_at')
-    return render(request, 'quiz/ai_quiz_history.html', {'sessions': sessions})
+    sessions = (
+        GroqQuizSession.objects.filter(user=request.user, completed=True, completed_at__isnull=False)
+        .select_related('course', 'config')
+        .only(
+            'completed_at', 'score', 'questions_answered', 'percentage',
+            'course__title', 'config__difficulty',
+        )
+    )
+    sessions, next_cursor = paginate_by_cursor(
+        sessions, request.GET.get('cursor'), 'completed_at', HISTORY_PAGE_SIZE
+    )
+    archived = GroqQuizSummary.objects.filter(user=request.user).aggregate(
+        sessions=Sum('sessions'), answered=Sum('questions_answered'), correct=Sum('correct')
+    )
+    if archived['answered']:
+        archived['percentage'] = round(archived['correct'] / archived['answered'] * 100)
+    return render(request, 'quiz/ai_quiz_history.html', {
+        'sessions': sessions,
+        'next_cursor': next_cursor,
+        'is_first_page': not request.GET.get('cursor'),
+        'archived': archived,
+    })
+
+
+@login_required
+@lecturer_required
+def ai_quiz_promote(request, slug):
+    """Copy the questions of selected AI quiz sessions into one of the course's quizzes"""
+    course = get_object_or_404(Course, slug=slug)
+    form = AIQuizPromoteForm(course, request.POST or None)
+    if request.method == 'POST' and form.is_valid():
+        quiz = form.cleaned_data['quiz']
+        counts = (
+            GroqQuestion.objects.filter(session_items__session__in=form.cleaned_data['sessions'])
+            .distinct()
+            .promote_to_quiz(quiz)
+        )
+        messages.success(
+            request,
+            f"Added {counts['created']} new and {counts['linked']} existing questions to {quiz.title}; "
+            f"{counts['skipped']} were skipped.",
+        )
+        return redirect('quiz_index', slug=course.slug)
+    return render(request, 'quiz/ai_quiz_promote.html', {'form': form, 'course': course})
+
+
+@login_required
+@lecturer_required
+def ai_quiz_metrics_summary(request):
+    """Generation health for lecturers and admins over the last ``days`` days"""
+    try:
+        days = min(max(int(request.GET.get('days', 7)), 1), 365)
+    except ValueError:
+        days = 7
+    since = timezone.now() - timedelta(days=days)
+    summary = summarize(GroqGenerationMetric.objects.filter(created_at__gte=since))
+    return render(request, 'quiz/ai_quiz_metrics.html', {'summary': summary, 'days': days})
+
+
+def ai_quiz_metrics(request):
+    """
+    Prometheus scrape endpoint. Scrapers authenticate with
+    ``Authorization: Bearer <AI_QUIZ_METRICS_TOKEN>``; logged-in lecturers
+    and admins can open it in the browser.
+    """
+    token = getattr(settings, 'AI_QUIZ_METRICS_TOKEN', "")
+    authorized = bool(token) and constant_time_compare(
+        request.headers.get('Authorization', ''), f"Bearer {token}"
+    )
+    if not authorized and not (
+        request.user.is_authenticated and lecturer_required()(request.user)
+    ):
+        return HttpResponseForbidden()
+    return HttpResponse(prometheus_text(), content_type='text/plain; version=0.0.4; charset=utf-8')
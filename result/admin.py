@@ -1,7 +1,12 @@
+from decimal import Decimal
+
 from django.contrib import admin
 from django.contrib.auth.models import Group
+from django.utils.html import format_html
 
-from .models import TakenCourse, Result
+from core.models import Semester
+from .grading import SCORE_FIELDS, record_scores
+from .models import GradingScheme, ResultSheetExport, ScoreChange, TakenCourse, Result
 
 
 class ScoreAdmin(admin.ModelAdmin):
@@ -18,6 +23,94 @@ class ScoreAdmin(admin.ModelAdmin):
         "comment",
     ]
 
+    def current_semester(self):
+        return (
+            Semester.objects.select_related("session")
+            .filter(is_current_semester=True, session__is_current_session=True)
+            .first()
+        )
+
+    def get_readonly_fields(self, request, obj=None):
+        # Score edits are recorded against the current semester, so without
+        # one they can't be audited and aren't allowed
+        if self.current_semester() is None:
+            return SCORE_FIELDS
+        return super().get_readonly_fields(request, obj)
+
+    def save_model(self, request, obj, form, change):
+        """Apply score edits through record_scores, which logs a ScoreChange"""
+        semester = self.current_semester()
+        if semester is None:
+            return super().save_model(request, obj, form, change)
+
+        scores = {
+            field: Decimal(getattr(obj, field)).quantize(Decimal("0.01"))
+            for field in SCORE_FIELDS
+        }
+        # Save any other edits with the scores as they were, then the scores
+        if change:
+            stored = TakenCourse.objects.values(*SCORE_FIELDS).get(pk=obj.pk)
+        else:
+            stored = dict.fromkeys(SCORE_FIELDS, Decimal("0.00"))
+        for field, value in stored.items():
+            setattr(obj, field, value)
+        super().save_model(request, obj, form, change)
+        record_scores(
+            TakenCourse.objects.filter(pk=obj.pk),
+            {obj.pk: scores},
+            semester.session,
+            semester,
+            actor=request.user,
+        )
+        obj.refresh_from_db()
+
+
+class GradingSchemeAdmin(admin.ModelAdmin):
+    list_display = ["name", "program", "session", "version", "updated_at"]
+    list_filter = ["program", "session"]
+
+
+class ScoreChangeAdmin(admin.ModelAdmin):
+    list_display = [
+        "changed_at",
+        "course",
+        "student",
+        "old_grade",
+        "new_grade",
+        "actor",
+    ]
+    list_filter = ["session", "semester"]
+    list_select_related = ["course", "student__student", "actor"]
+    search_fields = ["course__code", "student__student__username"]
+    date_hierarchy = "changed_at"
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+class ResultSheetExportAdmin(admin.ModelAdmin):
+    list_display = ["created_at", "requested_by", "status", "download"]
+    list_filter = ["status"]
+    readonly_fields = ["requested_by", "course_ids", "status", "error"]
+
+    def has_add_permission(self, request):
+        return False
+
+    @admin.display(description="Download")
+    def download(self, obj):
+        if obj.status != ResultSheetExport.DONE:
+            return obj.error or "-"
+        return format_html('<a href="{}">ZIP</a>', obj.get_absolute_url())
+
 
 admin.site.register(TakenCourse, ScoreAdmin)
 admin.site.register(Result)
+admin.site.register(GradingScheme, GradingSchemeAdmin)
+admin.site.register(ScoreChange, ScoreChangeAdmin)
+admin.site.register(ResultSheetExport, ResultSheetExportAdmin)
@@ -0,0 +1,25 @@
+from django import forms
+
+from .imports import IMPORT_COLUMNS, import_extensions
+
+
+class ScoreImportForm(forms.Form):
+    file = forms.FileField(
+        help_text="A sheet with the columns " + ", ".join(IMPORT_COLUMNS) + "."
+    )
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        extensions = import_extensions()
+        self.fields["file"].widget.attrs.update(
+            {"class": "form-control", "accept": ",".join(extensions)}
+        )
+
+    def clean_file(self):
+        upload = self.cleaned_data["file"]
+        extensions = import_extensions()
+        if not upload.name.lower().endswith(extensions):
+            raise forms.ValidationError(
+                f"Upload a {' or '.join(extensions)} file."
+            )
+        return upload
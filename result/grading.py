@@ -0,0 +1,147 @@
+"""
+Batch score entry for a course's class list.
+
+``parse_scores`` validates a whole score form up front, then
+``record_scores`` grades the rows in memory, writes them with one
+``bulk_update``, appends a ``ScoreChange`` per row whose scores changed
+with one ``bulk_create`` and refreshes the students' ``Result`` term
+summaries from grouped aggregate queries, all inside one transaction.
+"""
+from decimal import Decimal, InvalidOperation
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Result, ScoreChange, TakenCourse, comment_for, get_grading_scheme
+
+SCORE_FIELDS = ("assignment", "mid_exam", "quiz", "attendance", "final_exam")
+DERIVED_FIELDS = ("total", "grade", "point", "comment")
+GRADED_FIELDS = SCORE_FIELDS + DERIVED_FIELDS
+# Column order of the rows regrade_rows works on
+REGRADE_COLUMNS = ("pk", "course__credit", "course__program", "term_session") + GRADED_FIELDS
+MAX_SCORE = Decimal("999.99")  # the most a max_digits=5, decimal_places=2 field holds
+BATCH_SIZE = 500
+
+
+def parse_score(value):
+    """A submitted score as a two-place Decimal, or None if it isn't a valid score"""
+    try:
+        score = Decimal(str(value).strip())
+    except (InvalidOperation, ValueError):
+        return None
+    if not score.is_finite() or not Decimal("0") <= score <= MAX_SCORE:
+        return None
+    return score.quantize(Decimal("0.01"))
+
+
+def parse_scores(data, taken_course_ids):
+    """
+    Read a score form (one key per TakenCourse id, one value per score
+    component in ``SCORE_FIELDS`` order) into ``{id: {field: Decimal}}``.
+    Raises ValidationError listing every problem, so nothing is saved
+    unless the whole form is valid.
+    """
+    allowed = set(taken_course_ids)
+    scores = {}
+    errors = []
+    for key in data.keys():
+        if key == "csrfmiddlewaretoken":
+            continue
+        try:
+            pk = int(key)
+        except ValueError:
+            errors.append(f"Unexpected field '{key}'.")
+            continue
+        if pk not in allowed:
+            errors.append(f"Score row {pk} is not part of this course.")
+            continue
+
+        values = data.getlist(key)
+        if len(values) != len(SCORE_FIELDS):
+            errors.append(
+                f"Score row {pk} has {len(values)} values, expected {len(SCORE_FIELDS)}."
+            )
+            continue
+        row = {}
+        for field, value in zip(SCORE_FIELDS, values):
+            score = parse_score(value)
+            if score is None:
+                errors.append(
+                    f"Score row {pk}: '{value}' is not a valid {field.replace('_', ' ')} score."
+                )
+            row[field] = score
+        scores[pk] = row
+
+    if errors:
+        raise ValidationError(errors)
+    return scores
+
+
+def record_scores(taken_courses, scores, session, semester, actor=None):
+    """
+    Apply ``scores`` from ``parse_scores`` to the matching rows of the
+    ``taken_courses`` queryset, record what changed as made by ``actor``,
+    then refresh their students' results for ``semester`` of ``session``.
+    Returns the number of rows graded.
+    """
+    with transaction.atomic():
+        rows = list(taken_courses.filter(pk__in=scores).select_related("course", "student"))
+        schemes = {}
+        changes = []
+        changed_at = timezone.now()
+        for row in rows:
+            old_scores = {field: getattr(row, field) for field in SCORE_FIELDS}
+            old_grade = row.grade
+            for field, value in scores[row.pk].items():
+                setattr(row, field, value)
+            program_id = row.course.program_id
+            if program_id not in schemes:
+                schemes[program_id] = get_grading_scheme(program_id)
+            row.compute_grade(schemes[program_id])
+
+            new_scores = {field: getattr(row, field) for field in SCORE_FIELDS}
+            if new_scores != old_scores:
+                changes.append(
+                    ScoreChange(
+                        taken_course=row,
+                        student_id=row.student_id,
+                        course_id=row.course_id,
+                        session=session.session,
+                        semester=semester.semester,
+                        actor=actor,
+                        old_scores=old_scores,
+                        new_scores=new_scores,
+                        old_grade=old_grade,
+                        new_grade=row.grade,
+                        changed_at=changed_at,
+                    )
+                )
+        TakenCourse.objects.bulk_update(rows, GRADED_FIELDS, batch_size=BATCH_SIZE)
+        ScoreChange.objects.bulk_create(changes, batch_size=BATCH_SIZE)
+
+        students = list({row.student_id: row.student for row in rows}.values())
+        Result.objects.refresh(students, session.session, semester.semester)
+    return len(rows)
+
+
+def regrade_rows(rows, schemes):
+    """
+    Grade ``REGRADE_COLUMNS`` value tuples with ``schemes`` (compiled
+    schemes by program id and session name, see ``grading_schemes_by_session``)
+    and return ``(pk, total, grade, point, comment)`` for the rows whose
+    stored grading differs. A row without a known term session is graded
+    with the current session's scheme. Plain data in and out, so it can run
+    in a worker process.
+    """
+    changed = []
+    for pk, credit, program_id, session, *values in rows:
+        components = values[: len(SCORE_FIELDS)]
+        stored = tuple(values[len(SCORE_FIELDS) :])
+        scheme = schemes.get((program_id, session)) or schemes[program_id, None]
+        total = sum(components, Decimal("0.00"))
+        grade = scheme.grade(total)
+        graded = (total, grade, scheme.point(grade, credit), comment_for(grade))
+        if graded != stored:
+            changed.append((pk,) + graded)
+    return changed
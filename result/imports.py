@@ -0,0 +1,110 @@
+"""
+Score import from a spreadsheet with a ``username`` column and one column
+per score component. Rows are read lazily from the upload, checked against
+the class list fetched in one query and applied through the bulk grading
+path only when the whole sheet is valid.
+"""
+import csv
+import io
+import zipfile
+
+from .grading import SCORE_FIELDS, parse_score
+
+try:
+    from openpyxl import load_workbook
+except ImportError:  # pragma: no cover - only CSV imports work without openpyxl
+    load_workbook = None
+
+IMPORT_COLUMNS = ("username",) + SCORE_FIELDS
+MAX_IMPORT_ERRORS = 500
+# What reading a malformed sheet can raise
+SHEET_ERRORS = (ValueError, KeyError, csv.Error, zipfile.BadZipFile)
+
+
+def import_extensions():
+    return (".csv", ".xlsx") if load_workbook else (".csv",)
+
+
+def sheet_rows(upload):
+    """The rows of an uploaded .csv or .xlsx file as lists of cell values"""
+    if upload.name.lower().endswith(".xlsx"):
+        try:
+            workbook = load_workbook(upload, read_only=True, data_only=True)
+        except Exception as e:
+            raise ValueError("The file is not a readable XLSX workbook.") from e
+        try:
+            for row in workbook.active.iter_rows(values_only=True):
+                yield list(row)
+        finally:
+            workbook.close()
+        return
+
+    upload.seek(0)
+    text = io.TextIOWrapper(upload.file, encoding="utf-8-sig", newline="")
+    try:
+        yield from csv.reader(text)
+    finally:
+        # Leave the upload open for Django to clean up
+        text.detach()
+
+
+def read_scores(rows, class_list):
+    """
+    Validate sheet ``rows`` (header first) against ``class_list``
+    (``{username: TakenCourse id}``). Returns ``(scores, errors)``: scores
+    as ``parse_scores`` gives them and ``(row number, username, message)``
+    errors, of which at most ``MAX_IMPORT_ERRORS`` are collected.
+    """
+    rows = iter(rows)
+    header = next(rows, None) or []
+    columns = {
+        str(name).strip().lower(): index
+        for index, name in enumerate(header)
+        if name is not None
+    }
+    missing = [column for column in IMPORT_COLUMNS if column not in columns]
+    if missing:
+        return {}, [(1, "", f"Missing columns: {', '.join(missing)}.")]
+
+    scores = {}
+    errors = []
+    for number, row in enumerate(rows, start=2):
+        if len(errors) >= MAX_IMPORT_ERRORS:
+            errors.append((number, "", "Too many errors; the rest of the sheet was not checked."))
+            break
+        cells = [
+            row[columns[column]] if columns[column] < len(row) else None
+            for column in IMPORT_COLUMNS
+        ]
+        if all(cell in (None, "") for cell in cells):
+            continue
+
+        username = str(cells[0] or "").strip()
+        pk = class_list.get(username)
+        if pk is None:
+            errors.append((number, username, "Not a student of this course."))
+            continue
+        if pk in scores:
+            errors.append((number, username, "The student appears more than once."))
+            continue
+
+        row_scores = {}
+        for field, value in zip(SCORE_FIELDS, cells[1:]):
+            score = None if value in (None, "") else parse_score(value)
+            if score is None:
+                errors.append(
+                    (number, username, f"'{value or ''}' is not a valid {field.replace('_', ' ')} score.")
+                )
+            row_scores[field] = score
+        if None not in row_scores.values():
+            scores[pk] = row_scores
+    return scores, errors
+
+
+def error_report(errors):
+    """The import errors as CSV text"""
+    report = io.StringIO()
+    writer = csv.writer(report)
+    writer.writerow(["row", "username", "error"])
+    writer.writerows(errors)
+    return report.getvalue()
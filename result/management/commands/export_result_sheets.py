@@ -0,0 +1,217 @@
+import json
+import multiprocessing
+import os
+import zipfile
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import django
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from core.models import Semester
+from course.models import Course, CourseAllocation
+from result.models import ResultSheetExport, is_public_path, result_export_dir
+from result.reports import (
+    build_result_sheet,
+    cache_result_sheet,
+    data_digest,
+    result_sheet_cache_key,
+    result_sheet_data,
+    result_sheet_taken_courses,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Render the result sheet of every course of the current semester (or "
+        "the given courses) with a pool of worker processes, into a directory "
+        "or a ZIP file together with a manifest.json. Sheets whose data is "
+        "unchanged are taken from the result sheet cache. With --queued, "
+        "renders the exports requested from the course admin instead."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--course", type=int, action="append", help="Only export these course ids")
+        parser.add_argument(
+            "--output",
+            help="Directory, or ZIP file with --zip, to write to, outside MEDIA_ROOT "
+            "(default: RESULT_EXPORT_DIR/<session>_<semester>)",
+        )
+        parser.add_argument("--zip", action="store_true", help="Write one ZIP file")
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=min(4, os.cpu_count() or 1),
+            help="Processes rendering sheets in parallel; 1 renders in this process",
+        )
+        parser.add_argument(
+            "--queued",
+            action="store_true",
+            help="Render the queued admin export requests, e.g. from cron",
+        )
+
+    def handle(self, *args, **options):
+        if options["workers"] < 1:
+            raise CommandError("--workers must be at least 1")
+        if options["queued"]:
+            if options["course"] or options["output"]:
+                raise CommandError("--queued takes its courses and output from the requests")
+            self._run_queued(options["workers"])
+            return
+
+        semester, session = self._current_semester()
+        courses = Course.objects.order_by("code")
+        if options["course"]:
+            courses = courses.filter(pk__in=options["course"])
+        else:
+            courses = courses.filter(semester=semester.semester)
+        output = options["output"] or os.path.join(
+            result_export_dir(),
+            f"{session}_{semester}".replace("/", "-") + (".zip" if options["zip"] else ""),
+        )
+        self._export(courses, semester, session, output, options["zip"], options["workers"])
+
+    def _run_queued(self, workers):
+        semester, session = self._current_semester()
+        exports = ResultSheetExport.objects.filter(status=ResultSheetExport.QUEUED)
+        for export in exports.order_by("pk"):
+            if not ResultSheetExport.objects.claim(export.pk):
+                continue
+            try:
+                courses = Course.objects.filter(pk__in=export.course_ids).order_by("code")
+                self._export(courses, semester, session, export.path, True, workers)
+            except Exception as e:
+                ResultSheetExport.objects.filter(pk=export.pk).update(
+                    status=ResultSheetExport.FAILED, error=str(e)[:255], updated_at=timezone.now()
+                )
+                self.stderr.write(f"Export {export.pk} failed: {e}")
+            else:
+                ResultSheetExport.objects.filter(pk=export.pk).update(
+                    status=ResultSheetExport.DONE, updated_at=timezone.now()
+                )
+
+    def _current_semester(self):
+        semester = (
+            Semester.objects.select_related("session")
+            .filter(is_current_semester=True, session__is_current_session=True)
+            .first()
+        )
+        if semester is None:
+            raise CommandError("No current semester is set")
+        return semester, semester.session
+
+    def _export(self, courses, semester, session, output, to_zip, workers):
+        # The sheets hold every student's grades; never put them where media is served
+        if is_public_path(output):
+            raise CommandError("The output must be outside MEDIA_ROOT")
+        courses = list(courses)
+        if not courses:
+            raise CommandError("No courses to export")
+
+        sheets = self._sheet_data(courses, semester, session)
+        pdfs = self._render(sheets, workers)
+
+        manifest = {
+            "session": str(session),
+            "semester": str(semester),
+            "generated_at": timezone.now().isoformat(),
+            "sheets": [
+                {
+                    "course_id": course.pk,
+                    "code": course.code,
+                    "title": course.title,
+                    "file": filename,
+                    "students": len(data["rows"]),
+                    "passed": data["passed"],
+                    "failed": data["failed"],
+                    "digest": data_digest(data),
+                }
+                for course, filename, data in sheets
+            ],
+        }
+        if to_zip:
+            self._write_zip(output, sheets, pdfs, manifest)
+        else:
+            self._write_directory(output, sheets, pdfs, manifest)
+        self.stdout.write(self.style.SUCCESS(f"Exported {len(sheets)} result sheets to {output}"))
+
+    def _sheet_data(self, courses, semester, session):
+        """``(course, filename, data)`` per course, from two queries"""
+        lecturers = {}
+        allocations = CourseAllocation.courses.through.objects.filter(
+            course__in=courses
+        ).select_related("courseallocation__lecturer")
+        for allocation in allocations.order_by("pk"):
+            lecturers.setdefault(allocation.course_id, allocation.courseallocation.lecturer.get_full_name)
+
+        taken_courses = defaultdict(list)
+        for taken_course in result_sheet_taken_courses().filter(course__in=courses):
+            taken_courses[taken_course.course_id].append(taken_course)
+
+        return [
+            (
+                course,
+                f"{course.code}_resultSheet.pdf".replace("/", "-"),
+                result_sheet_data(
+                    course,
+                    semester,
+                    session,
+                    lecturers.get(course.pk, ""),
+                    taken_courses=taken_courses[course.pk],
+                ),
+            )
+            for course in courses
+        ]
+
+    def _render(self, sheets, workers):
+        """PDF bytes by filename, rendering only the sheets missing from the cache"""
+        keys = {filename: result_sheet_cache_key(data) for _, filename, data in sheets}
+        cached = cache.get_many(keys.values())
+        pdfs = {filename: cached[key] for filename, key in keys.items() if key in cached}
+        missing = [(filename, data) for _, filename, data in sheets if filename not in pdfs]
+        self.stdout.write(f"{len(pdfs)} sheets cached, {len(missing)} to render")
+
+        if workers == 1 or len(missing) < 2:
+            rendered = ((filename, data, build_result_sheet(data)) for filename, data in missing)
+            pdfs.update(self._collect(rendered, len(missing)))
+            return pdfs
+
+        # Each worker builds its stylesheets and reads the logo once, then reuses them
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=django.setup,
+        ) as executor:
+            futures = {
+                executor.submit(build_result_sheet, data): (filename, data)
+                for filename, data in missing
+            }
+            rendered = (futures[future] + (future.result(),) for future in as_completed(futures))
+            pdfs.update(self._collect(rendered, len(missing)))
+        return pdfs
+
+    def _collect(self, rendered, total):
+        for done, (filename, data, pdf) in enumerate(rendered, start=1):
+            cache_result_sheet(data, pdf)
+            self.stdout.write(f"{done}/{total} {filename}")
+            yield filename, pdf
+
+    def _write_directory(self, output, sheets, pdfs, manifest):
+        os.makedirs(output, exist_ok=True)
+        for _, filename, _ in sheets:
+            with open(os.path.join(output, filename), "wb") as f:
+                f.write(pdfs[filename])
+        with open(os.path.join(output, "manifest.json"), "w") as f:
+            json.dump(manifest, f, indent=2)
+
+    def _write_zip(self, output, sheets, pdfs, manifest):
+        os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+        # Written aside and renamed so nobody downloads a half-written archive
+        partial = f"{output}.partial"
+        with zipfile.ZipFile(partial, "w", zipfile.ZIP_DEFLATED) as archive:
+            for _, filename, _ in sheets:
+                archive.writestr(filename, pdfs[filename])
+            archive.writestr("manifest.json", json.dumps(manifest, indent=2))
+        os.replace(partial, output)
@@ -0,0 +1,174 @@
+import json
+import multiprocessing
+import os
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from accounts.models import Student
+from result.grading import DERIVED_FIELDS, REGRADE_COLUMNS, regrade_rows
+from result.models import Result, TakenCourse, grading_schemes_by_session
+
+PHASES = ("grades", "results")
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute every TakenCourse total, grade, point and comment with the "
+        "grading scheme of the session its Result term belongs to (the current "
+        "session for rows without one) and current credits, then every Result's totals, GPA "
+        "and CGPA. Rows are streamed in primary-key chunks, grading can be "
+        "spread over worker processes and a checkpoint file lets an "
+        "interrupted run resume."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=2000, help="Rows read per chunk")
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=1,
+            help="Processes grading chunks in parallel; 1 grades in this process",
+        )
+        parser.add_argument(
+            "--checkpoint",
+            help="File recording progress; an existing one resumes the run it belongs to",
+        )
+        parser.add_argument(
+            "--dry-run", action="store_true", help="Count the rows that would change without saving"
+        )
+
+    def handle(self, *args, **options):
+        if options["chunk_size"] < 1 or options["workers"] < 1:
+            raise CommandError("--chunk-size and --workers must be at least 1")
+        self.chunk_size = options["chunk_size"]
+        self.dry_run = options["dry_run"]
+        self.checkpoint_path = None if self.dry_run else options["checkpoint"]
+        state = self._load_checkpoint()
+
+        started = time.monotonic()
+        if state["phase"] == "grades":
+            state["changed"] = self._recompute_grades(state, options["workers"])
+            state.update(phase="results", last_pk=0)
+            self._save_checkpoint(state)
+        summaries = self._recompute_results(state)
+
+        if self.checkpoint_path and os.path.exists(self.checkpoint_path):
+            os.remove(self.checkpoint_path)
+        prefix = "[dry run] " if self.dry_run else ""
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{prefix}Regraded {state['changed']} course results and recomputed "
+                f"{summaries} result summaries in {time.monotonic() - started:.1f}s"
+            )
+        )
+
+    def _load_checkpoint(self):
+        state = {"phase": "grades", "last_pk": 0, "changed": 0}
+        if self.checkpoint_path and os.path.exists(self.checkpoint_path):
+            with open(self.checkpoint_path) as f:
+                state.update(json.load(f))
+            if state["phase"] not in PHASES:
+                raise CommandError(f"Unknown phase in checkpoint {self.checkpoint_path}")
+            self.stdout.write(f"Resuming {state['phase']} after pk {state['last_pk']}")
+        return state
+
+    def _save_checkpoint(self, state):
+        if not self.checkpoint_path:
+            return
+        # Written aside and renamed so a crash never leaves half a checkpoint
+        partial = f"{self.checkpoint_path}.tmp"
+        with open(partial, "w") as f:
+            json.dump(state, f)
+        os.replace(partial, self.checkpoint_path)
+
+    def _chunks(self, queryset, columns, last_pk):
+        """Value tuples of ``queryset`` in pk order, one chunk at a time, from ``last_pk`` on"""
+        while True:
+            chunk = list(
+                queryset.filter(pk__gt=last_pk).order_by("pk").values_list(*columns)[: self.chunk_size]
+            )
+            if not chunk:
+                return
+            last_pk = chunk[-1][0]
+            yield chunk
+
+    def _recompute_grades(self, state, workers):
+        remaining = TakenCourse.objects.filter(pk__gt=state["last_pk"]).count()
+        chunks = self._chunks(
+            TakenCourse.objects.with_term_session(), REGRADE_COLUMNS, state["last_pk"]
+        )
+        changed = state["changed"]
+        done = 0
+        schemes = grading_schemes_by_session()
+
+        if workers == 1:
+            graded = ((chunk, regrade_rows(chunk, schemes)) for chunk in chunks)
+            executor = None
+        else:
+            # Workers only grade plain tuples; this process does all the database work
+            executor = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=django.setup,
+            )
+            graded = self._parallel(executor, chunks, workers, schemes)
+
+        try:
+            for chunk, rows in graded:
+                changed += self._write_grades(rows)
+                done += len(chunk)
+                state.update(last_pk=chunk[-1][0], changed=changed)
+                self._save_checkpoint(state)
+                self.stdout.write(f"grades: {done}/{remaining} rows checked, {changed} changed")
+        finally:
+            if executor is not None:
+                executor.shutdown(cancel_futures=True)
+        return changed
+
+    def _parallel(self, executor, chunks, workers, schemes):
+        """Grade chunks in the pool, keeping a few in flight and yielding them in pk order"""
+        pending = []
+        for chunk in chunks:
+            pending.append((chunk, executor.submit(regrade_rows, chunk, schemes)))
+            if len(pending) >= workers * 2:
+                chunk, future = pending.pop(0)
+                yield chunk, future.result()
+        for chunk, future in pending:
+            yield chunk, future.result()
+
+    def _write_grades(self, rows):
+        """Save regraded rows, one UPDATE per distinct grading instead of a CASE per row"""
+        if self.dry_run or not rows:
+            return len(rows)
+        by_grading = defaultdict(list)
+        for pk, *values in rows:
+            by_grading[tuple(values)].append(pk)
+        with transaction.atomic():
+            for values, pks in by_grading.items():
+                for start in range(0, len(pks), 500):
+                    TakenCourse.objects.filter(pk__in=pks[start : start + 500]).update(
+                        **dict(zip(DERIVED_FIELDS, values))
+                    )
+        return len(rows)
+
+    def _recompute_results(self, state):
+        students = Student.objects.filter(result__isnull=False).distinct()
+        remaining = students.filter(pk__gt=state["last_pk"]).count()
+        summaries = done = 0
+        for chunk in self._chunks(students, ("pk",), state["last_pk"]):
+            student_ids = [pk for pk, in chunk]
+            if self.dry_run:
+                summaries += Result.objects.filter(student__in=student_ids).count()
+            else:
+                with transaction.atomic():
+                    summaries += Result.objects.recompute(student_ids)
+            done += len(chunk)
+            state["last_pk"] = student_ids[-1]
+            self._save_checkpoint(state)
+            self.stdout.write(f"results: {done}/{remaining} students")
+        return summaries
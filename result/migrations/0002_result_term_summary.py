@@ -0,0 +1,99 @@
+# Generated by Django 4.2.11 on 2026-10-19 15:40
+
+from decimal import Decimal
+from django.db import migrations, models
+from django.db.models import Count, Max, Sum
+
+TOTAL_FIELDS = ["points", "credits", "cumulative_points", "cumulative_credits"]
+
+
+def dedupe_and_fill_totals(apps, schema_editor):
+    Result = apps.get_model("result", "Result")
+    TakenCourse = apps.get_model("result", "TakenCourse")
+
+    # Score entry used to create a second row for a term now and then; keep the newest
+    duplicates = (
+        Result.objects.values("student", "session", "semester", "level")
+        .annotate(keep=Max("pk"), rows=Count("pk"))
+        .filter(rows__gt=1)
+    )
+    for row in list(duplicates):
+        Result.objects.filter(
+            student=row["student"],
+            session=row["session"],
+            semester=row["semester"],
+            level=row["level"],
+        ).exclude(pk=row["keep"]).delete()
+
+    # TakenCourse has no session, so every term at a level gets that level's
+    # current totals; the stored GPA and CGPA are left as they were
+    term_totals = {
+        (row["student"], row["course__level"], row["course__semester"]): row
+        for row in TakenCourse.objects.values(
+            "student", "course__level", "course__semester"
+        ).annotate(points=Sum("point"), credits=Sum("course__credit"))
+    }
+    cumulative_totals = {
+        row["student"]: row
+        for row in TakenCourse.objects.values("student").annotate(
+            points=Sum("point"), credits=Sum("course__credit")
+        )
+    }
+
+    batch = []
+    for result in Result.objects.iterator(chunk_size=500):
+        term = term_totals.get((result.student_id, result.level, result.semester))
+        cumulative = cumulative_totals.get(result.student_id)
+        if term:
+            result.points = term["points"]
+            result.credits = term["credits"] or 0
+        if cumulative:
+            result.cumulative_points = cumulative["points"]
+            result.cumulative_credits = cumulative["credits"] or 0
+        batch.append(result)
+        if len(batch) >= 500:
+            Result.objects.bulk_update(batch, TOTAL_FIELDS)
+            batch = []
+    Result.objects.bulk_update(batch, TOTAL_FIELDS)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("result", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="result",
+            name="credits",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="result",
+            name="cumulative_credits",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="result",
+            name="cumulative_points",
+            field=models.DecimalField(
+                decimal_places=2, default=Decimal("0.00"), max_digits=9
+            ),
+        ),
+        migrations.AddField(
+            model_name="result",
+            name="points",
+            field=models.DecimalField(
+                decimal_places=2, default=Decimal("0.00"), max_digits=8
+            ),
+        ),
+        migrations.RunPython(dedupe_and_fill_totals, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name="result",
+            constraint=models.UniqueConstraint(
+                fields=("student", "session", "semester", "level"),
+                name="unique_result_per_term",
+            ),
+        ),
+    ]
@@ -0,0 +1,74 @@
+# Generated by Django 4.2.11 on 2026-10-19 16:25
+
+from django.db import migrations, models
+import django.db.models.deletion
+import result.models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0001_initial"),
+        ("course", "0001_initial"),
+        ("result", "0002_result_term_summary"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="GradingScheme",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("name", models.CharField(max_length=100)),
+                (
+                    "boundaries",
+                    models.JSONField(
+                        default=result.models.default_grade_boundaries,
+                        help_text="[minimum total, grade] pairs; the lowest minimum must be 0",
+                    ),
+                ),
+                (
+                    "grade_points",
+                    models.JSONField(
+                        default=result.models.default_grade_points,
+                        help_text="Grade point of each grade",
+                    ),
+                ),
+                ("version", models.PositiveIntegerField(default=1, editable=False)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                (
+                    "program",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="grading_schemes",
+                        to="course.program",
+                    ),
+                ),
+                (
+                    "session",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="grading_schemes",
+                        to="core.session",
+                    ),
+                ),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name="gradingscheme",
+            constraint=models.UniqueConstraint(
+                fields=("program", "session"), name="unique_grading_scheme_scope"
+            ),
+        ),
+    ]
@@ -0,0 +1,106 @@
+# Generated by Django 4.2.11 on 2026-10-19 17:40
+
+from django.conf import settings
+import django.core.serializers.json
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("accounts", "0002_initial"),
+        ("course", "0001_initial"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("result", "0003_grading_scheme"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ScoreChange",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("session", models.CharField(max_length=100)),
+                (
+                    "semester",
+                    models.CharField(
+                        choices=[("First", "First"), ("Second", "Second")],
+                        max_length=100,
+                    ),
+                ),
+                (
+                    "old_scores",
+                    models.JSONField(
+                        encoder=django.core.serializers.json.DjangoJSONEncoder
+                    ),
+                ),
+                (
+                    "new_scores",
+                    models.JSONField(
+                        encoder=django.core.serializers.json.DjangoJSONEncoder
+                    ),
+                ),
+                ("old_grade", models.CharField(blank=True, max_length=2)),
+                ("new_grade", models.CharField(blank=True, max_length=2)),
+                (
+                    "changed_at",
+                    models.DateTimeField(
+                        default=django.utils.timezone.now, editable=False
+                    ),
+                ),
+                (
+                    "actor",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="+",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+                (
+                    "course",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE, to="course.course"
+                    ),
+                ),
+                (
+                    "student",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="accounts.student",
+                    ),
+                ),
+                (
+                    "taken_course",
+                    models.ForeignKey(
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="score_changes",
+                        to="result.takencourse",
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["-changed_at", "-pk"],
+                "indexes": [
+                    models.Index(
+                        fields=["course", "session", "semester", "changed_at"],
+                        name="score_change_course_term",
+                    ),
+                    models.Index(
+                        fields=["student", "changed_at"], name="score_change_student"
+                    ),
+                ],
+            },
+        ),
+    ]
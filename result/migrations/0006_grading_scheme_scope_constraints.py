@@ -0,0 +1,45 @@
+# Generated by Django 4.2.11 on 2026-10-19 15:10
+
+from django.db import migrations, models
+import django.db.models.functions.comparison
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("result", "0005_result_sheet_export"),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name="gradingscheme",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("session__isnull", True)),
+                fields=("program",),
+                name="unique_program_grading_scheme",
+                violation_error_message="This program already has a grading scheme for every session.",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="gradingscheme",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("program__isnull", True)),
+                fields=("session",),
+                name="unique_session_grading_scheme",
+                violation_error_message="This session already has a grading scheme for every program.",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="gradingscheme",
+            constraint=models.UniqueConstraint(
+                django.db.models.functions.comparison.Coalesce(
+                    "program", models.Value(0)
+                ),
+                condition=models.Q(
+                    ("program__isnull", True), ("session__isnull", True)
+                ),
+                name="unique_institution_grading_scheme",
+                violation_error_message="There already is an institution-wide grading scheme.",
+            ),
+        ),
+    ]
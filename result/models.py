@@ -1,12 +1,22 @@
+import os
 from decimal import Decimal
-from django.conf import settings
+from uuid import uuid4
 
-from django.db import models
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import models, transaction
+from django.db.models.functions import Coalesce
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
 from django.urls import reverse
+from django.utils import timezone
+from django.utils.crypto import get_random_string
 
 from accounts.models import Student
-from core.models import Semester
-from course.models import Course
+from core.models import Semester, Session
+from course.models import Course, Program
 
 A_PLUS = "A+"
 A = "A"
@@ -73,6 +83,285 @@ GRADE_POINT_MAPPING = {
     NG: 0.0,
 }
 
+GRADING_SCHEMES_CACHE_KEY = "result:grading_schemes_generation"
+
+
+def comment_for(grade):
+    if grade in [F, NG]:
+        return FAIL
+    return PASS
+
+
+class CompiledGradingScheme:
+    """
+    A grading scheme unrolled into the grade of every integer total up to
+    its top boundary, so grading a total is one list index. Boundaries are
+    whole numbers, so a fractional total grades like its integer part.
+    """
+
+    def __init__(self, boundaries, grade_points):
+        boundaries = sorted((int(minimum), grade) for minimum, grade in boundaries)
+        self.grades = [NG] * (boundaries[-1][0] + 1)
+        for minimum, grade in boundaries:
+            self.grades[minimum:] = [grade] * (len(self.grades) - minimum)
+        self.grade_points = {
+            grade: Decimal(str(point)) for grade, point in grade_points.items()
+        }
+
+    def grade(self, total):
+        if total < 0:
+            return NG
+        return self.grades[min(int(total), len(self.grades) - 1)]
+
+    def point(self, grade, credit):
+        """Credit-weighted grade point of a course"""
+        return Decimal(credit) * self.grade_points.get(grade, Decimal("0"))
+
+
+DEFAULT_GRADING_SCHEME = CompiledGradingScheme(GRADE_BOUNDARIES, GRADE_POINT_MAPPING)
+
+# (cache generation, current session id, {(program id, session id): scheme})
+_loaded_schemes = (None, None, {})
+
+
+def invalidate_grading_schemes():
+    """Make every process reload the grading schemes on its next lookup"""
+    cache.set(GRADING_SCHEMES_CACHE_KEY, uuid4().hex, None)
+
+
+def get_grading_scheme(program_id=None):
+    """
+    The compiled scheme grading ``program_id``'s courses this session: the
+    most specific of program and session, program, session, the scheme with
+    neither, then the built-in GRADE_BOUNDARIES. Schemes are compiled once per
+    process and reloaded when the shared cache generation changes.
+    """
+    global _loaded_schemes
+    generation = cache.get(GRADING_SCHEMES_CACHE_KEY)
+    if generation is None:
+        cache.add(GRADING_SCHEMES_CACHE_KEY, uuid4().hex, None)
+        generation = cache.get(GRADING_SCHEMES_CACHE_KEY)
+
+    loaded_generation, session_id, schemes = _loaded_schemes
+    if generation is None or generation != loaded_generation:
+        session_id = (
+            Session.objects.filter(is_current_session=True)
+            .values_list("pk", flat=True)
+            .first()
+        )
+        schemes = {
+            (scheme.program_id, scheme.session_id): scheme.compile()
+            for scheme in GradingScheme.objects.filter(
+                models.Q(session=None) | models.Q(session=session_id)
+            )
+        }
+        _loaded_schemes = (generation, session_id, schemes)
+    return _most_specific_scheme(schemes, program_id, session_id)
+
+
+def _most_specific_scheme(schemes, program_id, session_id):
+    for key in (
+        (program_id, session_id),
+        (program_id, None),
+        (None, session_id),
+        (None, None),
+    ):
+        if key in schemes:
+            return schemes[key]
+    return DEFAULT_GRADING_SCHEME
+
+
+def grading_schemes_by_session():
+    """
+    ``{(program id, session name): scheme}`` for every program and session,
+    each resolved like ``get_grading_scheme`` resolves the current session,
+    plus ``(program id, None)`` for the current session. Loaded fresh on
+    every call, for regrading the rows of past sessions.
+    """
+    schemes = {
+        (scheme.program_id, scheme.session_id): scheme.compile()
+        for scheme in GradingScheme.objects.all()
+    }
+    sessions = list(Session.objects.values_list("pk", "session", "is_current_session"))
+    current = next((pk for pk, _, is_current in sessions if is_current), None)
+    by_session = {}
+    for program_id in Program.objects.values_list("pk", flat=True):
+        by_session[program_id, None] = _most_specific_scheme(schemes, program_id, current)
+        for session_id, name, _ in sessions:
+            by_session[program_id, name] = _most_specific_scheme(schemes, program_id, session_id)
+    return by_session
+
+
+def default_grade_boundaries():
+    return [[minimum, grade] for minimum, grade in GRADE_BOUNDARIES]
+
+
+def default_grade_points():
+    return dict(GRADE_POINT_MAPPING)
+
+
+class GradingScheme(models.Model):
+    """
+    Grade boundaries and grade points for one program, one session, both
+    or (with neither) the whole institution, replacing the built-in
+    GRADE_BOUNDARIES and GRADE_POINT_MAPPING where it applies.
+    """
+
+    name = models.CharField(max_length=100)
+    program = models.ForeignKey(
+        Program,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name="grading_schemes",
+    )
+    session = models.ForeignKey(
+        Session,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name="grading_schemes",
+    )
+    boundaries = models.JSONField(
+        default=default_grade_boundaries,
+        help_text="[minimum total, grade] pairs; the lowest minimum must be 0",
+    )
+    grade_points = models.JSONField(
+        default=default_grade_points, help_text="Grade point of each grade"
+    )
+    version = models.PositiveIntegerField(default=1, editable=False)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        # NULLs never collide in a unique index, so the scopes missing a
+        # program or a session each need a partial constraint of their own
+        constraints = [
+            models.UniqueConstraint(
+                fields=["program", "session"], name="unique_grading_scheme_scope"
+            ),
+            models.UniqueConstraint(
+                fields=["program"],
+                condition=models.Q(session__isnull=True),
+                name="unique_program_grading_scheme",
+                violation_error_message="This program already has a grading scheme for every session.",
+            ),
+            models.UniqueConstraint(
+                fields=["session"],
+                condition=models.Q(program__isnull=True),
+                name="unique_session_grading_scheme",
+                violation_error_message="This session already has a grading scheme for every program.",
+            ),
+            models.UniqueConstraint(
+                Coalesce("program", models.Value(0)),
+                condition=models.Q(program__isnull=True, session__isnull=True),
+                name="unique_institution_grading_scheme",
+                violation_error_message="There already is an institution-wide grading scheme.",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.name} (v{self.version})"
+
+    def clean(self):
+        grades = {grade for grade, _ in GRADE_CHOICES}
+        try:
+            boundaries = [(int(minimum), grade) for minimum, grade in self.boundaries]
+        except (TypeError, ValueError):
+            raise ValidationError(
+                {"boundaries": "Enter a list of [whole-number minimum total, grade] pairs."}
+            )
+        if not boundaries or min(minimum for minimum, _ in boundaries) != 0:
+            raise ValidationError({"boundaries": "The lowest minimum total must be 0."})
+        if any(minimum < 0 or minimum > 500 for minimum, _ in boundaries):
+            raise ValidationError({"boundaries": "Minimum totals must be between 0 and 500."})
+        if len({minimum for minimum, _ in boundaries}) != len(boundaries):
+            raise ValidationError({"boundaries": "Each minimum total can only be used once."})
+        unknown = {grade for _, grade in boundaries} - grades
+        if unknown:
+            raise ValidationError(
+                {"boundaries": f"Unknown grades: {', '.join(sorted(unknown))}."}
+            )
+
+        if not isinstance(self.grade_points, dict):
+            raise ValidationError({"grade_points": "Enter an object mapping grades to points."})
+        missing = {grade for _, grade in boundaries} - set(self.grade_points)
+        if missing:
+            raise ValidationError(
+                {"grade_points": f"No grade point for: {', '.join(sorted(missing))}."}
+            )
+        for grade, point in self.grade_points.items():
+            if grade not in grades or not isinstance(point, (int, float)) or point < 0:
+                raise ValidationError(
+                    {"grade_points": f"Invalid grade point for '{grade}'."}
+                )
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            self.version += 1
+        super().save(*args, **kwargs)
+
+    def compile(self):
+        return CompiledGradingScheme(self.boundaries, self.grade_points)
+
+
+@receiver(post_save, sender=GradingScheme)
+@receiver(post_delete, sender=GradingScheme)
+@receiver(post_save, sender=Session)
+def grading_scheme_change_receiver(sender, **kwargs):
+    invalidate_grading_schemes()
+    # Again after commit, or another process could reload the old rows under
+    # the new generation before this transaction is visible
+    transaction.on_commit(invalidate_grading_schemes)
+
+
+def grade_point_average(points, credits):
+    """Credit-weighted average of grade points, 0.00 when nothing is credited"""
+    if not credits:
+        return Decimal("0.00")
+    return round(Decimal(points) / Decimal(credits), 2)
+
+
+class TakenCourseQuerySet(models.QuerySet):
+    def semester_courses(self, semester):
+        """Courses of ``semester`` (its name) at each student's current level, i.e. what the GPA covers"""
+        return self.filter(course__semester=semester, course__level=models.F("student__level"))
+
+    def with_term_session(self):
+        """
+        Annotate ``term_session``, the session name of the Result term (same
+        student, level and semester) each row counts towards
+        """
+        terms = Result.objects.filter(
+            student=models.OuterRef("student"),
+            level=models.OuterRef("course__level"),
+            semester=models.OuterRef("course__semester"),
+        ).order_by("-pk")
+        return self.annotate(term_session=models.Subquery(terms.values("session")[:1]))
+
+    def totals(self):
+        """``(points, credits)`` summed over the whole queryset in one query"""
+        row = self.order_by().aggregate(points=models.Sum("point"), credits=models.Sum("course__credit"))
+        return row["points"] or Decimal("0.00"), row["credits"] or 0
+
+    def totals_by_student(self):
+        """``{student_id: (points, credits)}`` from one grouped query"""
+        rows = (
+            self.order_by()
+            .values("student")
+            .annotate(points=models.Sum("point"), credits=models.Sum("course__credit"))
+        )
+        return {row["student"]: (row["points"], row["credits"] or 0) for row in rows}
+
+    def average(self):
+        return grade_point_average(*self.totals())
+
+    def averages(self):
+        """``{student_id: average}``; students without rows are absent"""
+        return {
+            student_id: grade_point_average(points, credits)
+            for student_id, (points, credits) in self.totals_by_student().items()
+        }
+
 
 class TakenCourse(models.Model):
     student = models.ForeignKey(Student, on_delete=models.CASCADE)
@@ -105,6 +394,8 @@ class TakenCourse(models.Model):
         choices=COMMENT_CHOICES, max_length=200, blank=True, editable=False
     )
 
+    objects = TakenCourseQuerySet.as_manager()
+
     def get_absolute_url(self):
         return reverse("course_detail", kwargs={"slug": self.course.slug})
 
@@ -122,68 +413,319 @@ class TakenCourse(models.Model):
             ]
         )
 
+    def grading_scheme(self):
+        return get_grading_scheme(self.course.program_id)
+
     def get_grade(self):
-        total = self.total
-        for boundary, grade in GRADE_BOUNDARIES:
-            if total >= boundary:
-                return grade
-        return NG
+        return self.grading_scheme().grade(self.total)
 
     def get_comment(self):
-        if self.grade in [F, NG]:
-            return FAIL
-        return PASS
+        return comment_for(self.grade)
 
     def get_point(self):
-        credit = self.course.credit
-        grade_point = GRADE_POINT_MAPPING.get(self.grade, 0.0)
-        return Decimal(credit) * Decimal(grade_point)
+        return self.grading_scheme().point(self.grade, self.course.credit)
 
-    def save(self, *args, **kwargs):
+    def compute_grade(self, scheme=None):
+        """Derive total, grade, point and comment from the score components"""
+        scheme = scheme or self.grading_scheme()
         self.total = self.get_total()
-        self.grade = self.get_grade()
-        self.point = self.get_point()
+        self.grade = scheme.grade(self.total)
+        self.point = scheme.point(self.grade, self.course.credit)
         self.comment = self.get_comment()
-        super().save(*args, **kwargs)
 
-    def calculate_gpa(self):
-        current_semester = Semester.objects.filter(is_current_semester=True).first()
-        if not current_semester:
-            return Decimal("0.00")
+    def save(self, *args, **kwargs):
+        self.compute_grade()
+        super().save(*args, **kwargs)
 
-        taken_courses = TakenCourse.objects.filter(
-            student=self.student,
-            course__level=self.student.level,
-            course__semester=current_semester.semester,
+    def calculate_gpa(self, semester=None):
+        """GPA over the student's current-level courses of ``semester`` (default: the current one)"""
+        if semester is None:
+            current_semester = Semester.objects.filter(is_current_semester=True).first()
+            if not current_semester:
+                return Decimal("0.00")
+            semester = current_semester.semester
+        return (
+            TakenCourse.objects.filter(student=self.student_id)
+            .semester_courses(semester)
+            .average()
         )
 
-        total_points = sum(tc.point for tc in taken_courses)
-        total_credits = sum(tc.course.credit for tc in taken_courses)
+    def calculate_cgpa(self):
+        return TakenCourse.objects.filter(student=self.student_id).average()
 
-        if total_credits > 0:
-            gpa = total_points / Decimal(total_credits)
-            return round(gpa, 2)
-        return Decimal("0.00")
 
-    def calculate_cgpa(self):
-        taken_courses = TakenCourse.objects.filter(student=self.student)
+class ResultManager(models.Manager):
+    def refresh(self, students, session, semester, create=True, batch_size=500):
+        """
+        Recompute the term summaries of ``students`` for ``semester`` of
+        ``session`` (both by name): points, credits and GPA over the
+        semester's courses at the student's current level, cumulative points,
+        credits and CGPA over every course taken. Missing rows are created
+        unless ``create`` is False.
+        """
+        students = list(students)
+        if not students:
+            return
+        student_ids = [student.pk for student in students]
+        taken = TakenCourse.objects.filter(student__in=student_ids)
+        term_totals = taken.semester_courses(semester).totals_by_student()
+        cumulative_totals = taken.totals_by_student()
+        no_totals = (Decimal("0.00"), 0)
 
-        total_points = sum(tc.point for tc in taken_courses)
-        total_credits = sum(tc.course.credit for tc in taken_courses)
+        existing = {
+            (result.student_id, result.level): result
+            for result in self.filter(
+                student__in=student_ids, session=session, semester=semester
+            )
+        }
+        changed = []
+        created = []
+        for student in students:
+            result = existing.get((student.pk, student.level))
+            if result is None:
+                if not create:
+                    continue
+                result = Result(
+                    student=student, session=session, semester=semester, level=student.level
+                )
+                created.append(result)
+            else:
+                changed.append(result)
+            result.set_totals(
+                *term_totals.get(student.pk, no_totals),
+                *cumulative_totals.get(student.pk, no_totals),
+            )
 
-        if total_credits > 0:
-            cgpa = total_points / Decimal(total_credits)
-            return round(cgpa, 2)
-        return Decimal("0.00")
+        self.bulk_update(changed, Result.TOTAL_FIELDS, batch_size=batch_size)
+        self.bulk_create(created, batch_size=batch_size)
+
+    def recompute(self, student_ids, batch_size=500):
+        """
+        Recompute every summary of ``student_ids``, each term from the courses
+        of its own level and semester. Returns the number of rows updated.
+        """
+        taken = TakenCourse.objects.filter(student__in=student_ids).order_by()
+        term_totals = {
+            (row["student"], row["course__level"], row["course__semester"]): (
+                row["points"],
+                row["credits"] or 0,
+            )
+            for row in taken.values("student", "course__level", "course__semester").annotate(
+                points=models.Sum("point"), credits=models.Sum("course__credit")
+            )
+        }
+        cumulative_totals = taken.totals_by_student()
+        no_totals = (Decimal("0.00"), 0)
+
+        results = list(self.filter(student__in=student_ids))
+        for result in results:
+            result.set_totals(
+                *term_totals.get((result.student_id, result.level, result.semester), no_totals),
+                *cumulative_totals.get(result.student_id, no_totals),
+            )
+        self.bulk_update(results, Result.TOTAL_FIELDS, batch_size=batch_size)
+        return len(results)
+
+    def refresh_current(self, students):
+        """Refresh the existing summaries of ``students`` for the current semester"""
+        semester = (
+            Semester.objects.select_related("session")
+            .filter(is_current_semester=True, session__is_current_session=True)
+            .first()
+        )
+        if semester is not None:
+            self.refresh(
+                students, semester.session.session, semester.semester, create=False
+            )
 
 
 class Result(models.Model):
+    """
+    A student's summary for one semester of a session at one level, with the
+    point and credit totals behind its GPA and CGPA. Kept current by the
+    grading path and whenever a TakenCourse row changes.
+    """
+
+    TOTAL_FIELDS = [
+        "points",
+        "credits",
+        "gpa",
+        "cumulative_points",
+        "cumulative_credits",
+        "cgpa",
+    ]
+
     student = models.ForeignKey(Student, on_delete=models.CASCADE)
     gpa = models.FloatField(null=True)
     cgpa = models.FloatField(null=True)
     semester = models.CharField(max_length=100, choices=settings.SEMESTER_CHOICES)
     session = models.CharField(max_length=100, blank=True, null=True)
     level = models.CharField(max_length=25, choices=settings.LEVEL_CHOICES, null=True)
+    points = models.DecimalField(max_digits=8, decimal_places=2, default=Decimal("0.00"))
+    credits = models.PositiveIntegerField(default=0)
+    cumulative_points = models.DecimalField(
+        max_digits=9, decimal_places=2, default=Decimal("0.00")
+    )
+    cumulative_credits = models.PositiveIntegerField(default=0)
+
+    objects = ResultManager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["student", "session", "semester", "level"],
+                name="unique_result_per_term",
+            )
+        ]
 
     def __str__(self):
         return f"Result for {self.student} - Semester: {self.semester}, Level: {self.level}"
+
+    def set_totals(self, points, credits, cumulative_points, cumulative_credits):
+        self.points = points
+        self.credits = credits
+        self.gpa = grade_point_average(points, credits)
+        self.cumulative_points = cumulative_points
+        self.cumulative_credits = cumulative_credits
+        self.cgpa = grade_point_average(cumulative_points, cumulative_credits)
+
+
+class ScoreChange(models.Model):
+    """
+    One change to a TakenCourse's score components: the values before and
+    after, who made it and when. Rows are only ever added, in bulk by the
+    grading path, and outlive the TakenCourse they describe.
+    """
+
+    taken_course = models.ForeignKey(
+        TakenCourse,
+        on_delete=models.SET_NULL,
+        null=True,
+        related_name="score_changes",
+    )
+    student = models.ForeignKey(Student, on_delete=models.CASCADE)
+    course = models.ForeignKey(Course, on_delete=models.CASCADE)
+    session = models.CharField(max_length=100)
+    semester = models.CharField(max_length=100, choices=settings.SEMESTER_CHOICES)
+    actor = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="+",
+    )
+    old_scores = models.JSONField(encoder=DjangoJSONEncoder)
+    new_scores = models.JSONField(encoder=DjangoJSONEncoder)
+    old_grade = models.CharField(max_length=2, blank=True)
+    new_grade = models.CharField(max_length=2, blank=True)
+    changed_at = models.DateTimeField(default=timezone.now, editable=False)
+
+    class Meta:
+        ordering = ["-changed_at", "-pk"]
+        indexes = [
+            models.Index(
+                fields=["course", "session", "semester", "changed_at"],
+                name="score_change_course_term",
+            ),
+            models.Index(fields=["student", "changed_at"], name="score_change_student"),
+        ]
+
+    def __str__(self):
+        return f"{self.course_id} score change for {self.student_id} at {self.changed_at}"
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            raise ValueError("Score changes cannot be edited.")
+        super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        raise ValueError("Score changes cannot be deleted.")
+
+
+@receiver(post_save, sender=TakenCourse)
+@receiver(post_delete, sender=TakenCourse)
+def taken_course_result_receiver(sender, instance, **kwargs):
+    """Keep the student's current summary in step with single-row score changes"""
+    Result.objects.refresh_current(Student.objects.filter(pk=instance.student_id))
+
+
+def result_export_dir():
+    """
+    Directory exported result sheets are written to. It holds every
+    student's grades, so it must not be served publicly like MEDIA_ROOT.
+    """
+    return getattr(settings, "RESULT_EXPORT_DIR", None) or os.path.join(
+        str(settings.BASE_DIR), "private", "result_sheets"
+    )
+
+
+def is_public_path(path):
+    """Whether ``path`` is inside MEDIA_ROOT, where anyone can download it"""
+    path = os.path.realpath(path)
+    media_root = os.path.realpath(settings.MEDIA_ROOT)
+    return os.path.commonpath([path, media_root]) == media_root
+
+
+def new_export_token():
+    return get_random_string(32)
+
+
+class ResultSheetExportManager(models.Manager):
+    def claim(self, pk):
+        """Mark a queued export as running; only one worker wins"""
+        return bool(
+            self.filter(pk=pk, status=ResultSheetExport.QUEUED).update(
+                status=ResultSheetExport.RUNNING, updated_at=timezone.now()
+            )
+        )
+
+
+class ResultSheetExport(models.Model):
+    """
+    A ZIP of result sheets requested from the admin. The
+    ``export_result_sheets --queued`` command renders it into
+    ``result_export_dir()`` under an unguessable name, and staff download it
+    through ``result_sheet_export_download``.
+    """
+
+    QUEUED = "queued"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+    STATUSES = [
+        (QUEUED, "Queued"),
+        (RUNNING, "Running"),
+        (DONE, "Done"),
+        (FAILED, "Failed"),
+    ]
+
+    requested_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="+",
+    )
+    course_ids = models.JSONField(default=list)
+    token = models.CharField(
+        max_length=32, unique=True, default=new_export_token, editable=False
+    )
+    status = models.CharField(max_length=10, choices=STATUSES, default=QUEUED)
+    error = models.CharField(max_length=255, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = ResultSheetExportManager()
+
+    class Meta:
+        ordering = ["-created_at"]
+
+    def __str__(self):
+        return f"Result sheet export {self.pk} ({self.status})"
+
+    @property
+    def path(self):
+        return os.path.join(result_export_dir(), f"{self.token}.zip")
+
+    def get_absolute_url(self):
+        return reverse("result_sheet_export_download", kwargs={"token": self.token})
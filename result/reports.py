@@ -0,0 +1,403 @@
+"""
+PDF reports of the result app.
+
+Building a report is split in two: a ``*_data`` function gathers
+everything the document shows as plain, picklable data with a fixed
+number of queries, and a ``build_*`` function renders that data to PDF
+bytes in memory. Stylesheets and the logo are loaded once per process.
+Rendered result sheets are cached under a hash of their data, so an
+unchanged sheet is served without rendering it again.
+"""
+
+import hashlib
+import io
+import json
+import os
+from functools import lru_cache
+from xml.sax.saxutils import escape
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from reportlab.lib import colors
+from reportlab.lib.enums import TA_CENTER, TA_JUSTIFY, TA_LEFT, TA_RIGHT
+from reportlab.lib.styles import ParagraphStyle, getSampleStyleSheet
+from reportlab.lib.units import inch
+from reportlab.platypus import (
+    Image,
+    Paragraph,
+    SimpleDocTemplate,
+    Spacer,
+    Table,
+    TableStyle,
+)
+
+from .models import FAIL, PASS, TakenCourse
+
+CM = 2.54
+# Bump when a layout changes so cached PDFs are not served any more
+REPORT_LAYOUT_VERSION = 1
+RESULT_SHEET_HEADER = (
+    "S/N",
+    "ID NO.",
+    "FULL NAME",
+    "TOTAL",
+    "GRADE",
+    "POINT",
+    "COMMENT",
+)
+RESULT_SHEET_TABLE_STYLE = TableStyle(
+    [
+        ("BACKGROUND", (0, 0), (-1, 0), colors.black),
+        ("TEXTCOLOR", (1, 0), (-1, 0), colors.white),
+        ("TEXTCOLOR", (0, 0), (0, 0), colors.cyan),
+        ("ALIGN", (0, 0), (-1, 0), "CENTER"),
+        ("VALIGN", (0, 0), (-1, 0), "MIDDLE"),
+        ("BOX", (0, 0), (-1, 0), 1, colors.black),
+        ("INNERGRID", (0, 1), (-1, -1), 0.05, colors.black),
+        ("BOX", (0, 1), (-1, -1), 0.1, colors.black),
+    ]
+)
+
+
+REGISTRATION_HEADER = ("S/No", "Course Code", "Course Title", "Unit")
+REGISTRATION_TABLE_STYLE = TableStyle(
+    [
+        ("ALIGN", (0, 0), (0, -1), "CENTER"),
+        ("ALIGN", (1, 0), (2, -1), "LEFT"),
+        ("ALIGN", (3, 0), (3, -1), "CENTER"),
+        ("VALIGN", (0, 0), (-1, -1), "MIDDLE"),
+        ("TEXTCOLOR", (0, 0), (-1, -1), colors.black),
+        ("INNERGRID", (0, 0), (-1, -1), 0.25, colors.black),
+        ("BOX", (0, 0), (-1, -1), 0.25, colors.black),
+    ]
+)
+
+
+@lru_cache(maxsize=None)
+def report_styles():
+    """The sample stylesheet plus the report styles, built once per process"""
+    styles = getSampleStyleSheet()
+    styles.add(
+        ParagraphStyle(
+            name="ReportTitle",
+            parent=styles["Normal"],
+            alignment=TA_CENTER,
+            fontName="Helvetica",
+            fontSize=12,
+            leading=15,
+        )
+    )
+    styles.add(
+        ParagraphStyle(
+            name="ReportSubtitle",
+            parent=styles["ReportTitle"],
+            fontSize=10,
+        )
+    )
+    styles.add(
+        ParagraphStyle(name="Right", parent=styles["Normal"], alignment=TA_RIGHT)
+    )
+    form_text = {"parent": styles["Normal"], "fontName": "Helvetica", "leading": 18}
+    for name, alignment, size in (
+        ("FormTitle", TA_CENTER, 12),
+        ("FormSchool", TA_CENTER, 10),
+        ("FormDepartment", TA_CENTER, 9),
+        ("FormSection", TA_LEFT, 9),
+        ("FormNote", TA_LEFT, 8),
+        ("FormCertification", TA_JUSTIFY, 8),
+    ):
+        styles.add(
+            ParagraphStyle(name=name, alignment=alignment, fontSize=size, **form_text)
+        )
+    return styles
+
+
+@lru_cache(maxsize=None)
+def _logo_bytes():
+    try:
+        with open(settings.STATICFILES_DIRS[0] + "/img/logo.png", "rb") as f:
+            return f.read()
+    except FileNotFoundError:
+        return None
+
+
+def logo(offset_x, offset_y, size=1 * inch):
+    """
+    The institution logo as a new flowable, read from disk only once, or
+    an empty spacer when the deployment has no logo
+    """
+    content = _logo_bytes()
+    if content is None:
+        return Spacer(0, 0)
+    image = Image(io.BytesIO(content), size, size)
+    image._offs_x = offset_x
+    image._offs_y = offset_y
+    return image
+
+
+def data_digest(data):
+    payload = json.dumps(
+        [REPORT_LAYOUT_VERSION, data], cls=DjangoJSONEncoder, sort_keys=True
+    )
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def result_sheet_taken_courses():
+    return TakenCourse.objects.select_related("student__student").order_by("pk")
+
+
+def result_sheet_data(course, semester, session, lecturer_name, taken_courses=None):
+    """
+    Everything a course's result sheet shows, from one query unless the
+    course's ``taken_courses`` were already fetched
+    """
+    if taken_courses is None:
+        taken_courses = result_sheet_taken_courses().filter(course=course)
+    rows = [
+        (
+            taken_course.student.student.username.upper(),
+            taken_course.student.student.get_full_name.capitalize(),
+            str(taken_course.total),
+            taken_course.grade,
+            str(taken_course.point),
+            taken_course.comment,
+        )
+        for taken_course in taken_courses
+    ]
+    return {
+        "title": f"{semester} Semester {session} Result Sheet",
+        "lecturer": lecturer_name,
+        "level": course.level,
+        "rows": rows,
+        "passed": sum(1 for row in rows if row[5] == PASS),
+        "failed": sum(1 for row in rows if row[5] == FAIL),
+    }
+
+
+def build_result_sheet(data):
+    """Render ``result_sheet_data`` to PDF bytes"""
+    styles = report_styles()
+    buffer = io.BytesIO()
+    doc = SimpleDocTemplate(
+        buffer,
+        rightMargin=0,
+        leftMargin=6.5 * CM,
+        topMargin=0.3 * CM,
+        bottomMargin=0,
+    )
+    story = [
+        Spacer(1, 0.2),
+        logo(-200, -45),
+        Paragraph(f"<b> {data['title']}</b>".upper(), styles["ReportTitle"]),
+        Spacer(1, 0.1 * inch),
+        Paragraph(
+            f"<b>Course lecturer: {data['lecturer']}</b>".upper(),
+            styles["ReportSubtitle"],
+        ),
+        Spacer(1, 0.1 * inch),
+        Paragraph(f"<b>Level: </b>{data['level']}".upper(), styles["ReportSubtitle"]),
+        Spacer(1, 0.6 * inch),
+    ]
+
+    table_rows = [RESULT_SHEET_HEADER]
+    for number, (username, full_name, total, grade, point, comment) in enumerate(
+        data["rows"], start=1
+    ):
+        table_rows.append(
+            (
+                number,
+                username,
+                Paragraph(escape(full_name), styles["Normal"]),
+                total,
+                grade,
+                point,
+                comment,
+            )
+        )
+    table = Table(
+        table_rows,
+        colWidths=[inch] * len(RESULT_SHEET_HEADER),
+        rowHeights=[0.5 * inch] + [None] * len(data["rows"]),
+        repeatRows=1,
+    )
+    table.setStyle(RESULT_SHEET_TABLE_STYLE)
+    story.append(table)
+
+    story.append(Spacer(1, 1 * inch))
+    story.append(
+        Table(
+            [
+                [
+                    Paragraph(
+                        "<b>Date:</b>_____________________________", styles["Normal"]
+                    ),
+                    Paragraph(f"<b>No. of PASS:</b> {data['passed']}", styles["Right"]),
+                ],
+                [
+                    Paragraph(
+                        "<b>Siganture / Stamp:</b> _____________________________",
+                        styles["Normal"],
+                    ),
+                    Paragraph(f"<b>No. of FAIL: </b>{data['failed']}", styles["Right"]),
+                ],
+            ]
+        )
+    )
+    doc.build(story)
+    return buffer.getvalue()
+
+
+def registration_form_data(student, session):
+    """
+    Everything a student's course registration form shows, from one query.
+    ``student`` should come with its user selected.
+    """
+    user = student.student
+    taken_courses = (
+        TakenCourse.objects.filter(student=student)
+        .select_related("course")
+        .order_by("pk")
+    )
+    semesters = {settings.FIRST: [], settings.SECOND: []}
+    for taken_course in taken_courses:
+        course = taken_course.course
+        if course.semester in semesters:
+            semesters[course.semester].append(
+                (course.code.upper(), course.title, course.credit)
+            )
+    picture = str(settings.BASE_DIR) + user.get_picture()
+    return {
+        "username": user.username.upper(),
+        "full_name": user.get_full_name.upper(),
+        "session": session.session.upper(),
+        "level": student.level,
+        "semesters": [
+            (str(semester).upper(), rows, sum(credit for _, _, credit in rows))
+            for semester, rows in semesters.items()
+        ],
+        "picture": picture if os.path.isfile(picture) else None,
+    }
+
+
+def build_registration_form(data):
+    """Render ``registration_form_data`` to PDF bytes"""
+    styles = report_styles()
+    buffer = io.BytesIO()
+    doc = SimpleDocTemplate(
+        buffer, rightMargin=15, leftMargin=15, topMargin=0, bottomMargin=0
+    )
+    story = [
+        Spacer(1, 0.5),
+        Spacer(1, 0.4 * inch),
+        # TODO: Make the institution, school and department dynamic
+        Paragraph("<b>NEXUSTECH ACADEMY</b>", styles["FormTitle"]),
+        Paragraph("<b>OIL AND GAS INSTITUTE</b>", styles["FormSchool"]),
+        Spacer(1, 0.1 * inch),
+        Paragraph(
+            "<b>DEPARTMENT OF DATA ANALYTICS AND PREDICTIVE MODELS</b>",
+            styles["FormDepartment"],
+        ),
+        Spacer(1, 0.3 * inch),
+        Paragraph(
+            "<b><u>STUDENT COURSE REGISTRATION FORM</u></b>", styles["FormTitle"]
+        ),
+        Table(
+            [
+                [
+                    Paragraph(
+                        f"<b>Registration Number : {escape(data['username'])}</b>",
+                        styles["Normal"],
+                    )
+                ],
+                [
+                    Paragraph(
+                        f"<b>Name : {escape(data['full_name'])}</b>", styles["Normal"]
+                    )
+                ],
+                [
+                    Paragraph(
+                        f"<b>Session : {escape(data['session'])}</b>", styles["Normal"]
+                    ),
+                    Paragraph(
+                        f"<b>Level: {escape(data['level'] or '')}</b>", styles["Normal"]
+                    ),
+                ],
+            ]
+        ),
+        Spacer(1, 0.6 * inch),
+    ]
+
+    lecturer_column = Paragraph(
+        "<b>Name, Signature of course lecturer & Date</b>", styles["FormSection"]
+    )
+    for number, (semester, rows, credits) in enumerate(data["semesters"]):
+        if number:
+            story.append(Spacer(1, 0.6 * inch))
+        story.append(Paragraph(f"<b>{semester} SEMESTER</b>", styles["FormSection"]))
+        table_rows = [REGISTRATION_HEADER + (lecturer_column,)]
+        for count, (code, title, credit) in enumerate(rows, start=1):
+            table_rows.append(
+                (
+                    count,
+                    code,
+                    Paragraph(escape(title), styles["FormSection"]),
+                    credit,
+                    "",
+                )
+            )
+        table = Table(
+            table_rows,
+            colWidths=[1.4 * inch] * 5,
+            rowHeights=[0.5 * inch] + [0.3 * inch] * len(rows),
+        )
+        table.setStyle(REGISTRATION_TABLE_STYLE)
+        story.append(table)
+        story.append(
+            Paragraph(
+                f"<b>Total {semester.title()} Semester Credit : {credits}</b>",
+                styles["FormNote"],
+            )
+        )
+
+    story.append(Spacer(1, 2))
+    story.append(
+        Paragraph(
+            f"CERTIFICATION OF REGISTRATION: I certify that <b>{escape(data['full_name'])}"
+            f"</b> has been duly registered for the <b>{escape(data['level'] or '')} "
+            "level </b> of study in the department of COMPUTER SCIENCE & ENGINEERING "
+            "and that the courses and credits registered are as approved by the "
+            "Administrators of the Institute",
+            styles["FormCertification"],
+        )
+    )
+    story.append(logo(-218, 480))
+    if data["picture"]:
+        picture = Image(data["picture"], 1.0 * inch, 1.0 * inch)
+        picture._offs_x = 218
+        picture._offs_y = 550
+        story.append(picture)
+
+    doc.build(story)
+    return buffer.getvalue()
+
+
+def result_sheet_cache_key(data):
+    return f"result:result_sheet:{data_digest(data)}"
+
+
+def cache_result_sheet(data, pdf):
+    cache.set(
+        result_sheet_cache_key(data),
+        pdf,
+        getattr(settings, "RESULT_SHEET_CACHE_TIMEOUT", 60 * 60 * 24),
+    )
+
+
+def cached_result_sheet(data):
+    """The PDF for ``data``, rendered only if no identical sheet is cached"""
+    pdf = cache.get(result_sheet_cache_key(data))
+    if pdf is None:
+        pdf = build_result_sheet(data)
+        cache_result_sheet(data, pdf)
+    return pdf
@@ -1,3 +1,543 @@
+import io
+import json
+import os
+import tempfile
+import zipfile
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import SimpleUploadedFile, TemporaryUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import IntegrityError, transaction
+from django.http import QueryDict
 from django.test import TestCase
+from django.urls import reverse
+
+from accounts.models import Student, User
+from core.models import Semester, Session
+from course.models import Course, CourseAllocation, Program
+
+from .grading import SCORE_FIELDS, parse_scores, record_scores
+from .imports import read_scores, sheet_rows
+from . import reports
+from .models import (
+    DEFAULT_GRADING_SCHEME,
+    GRADE_BOUNDARIES,
+    GradingScheme,
+    Result,
+    ResultSheetExport,
+    ScoreChange,
+    TakenCourse,
+    get_grading_scheme,
+)
+
+
+class ResultTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.session = Session.objects.create(session="2026/2027", is_current_session=True)
+        self.semester = Semester.objects.create(
+            semester="First", is_current_semester=True, session=self.session
+        )
+        self.program = Program.objects.create(title="Computer Science")
+        self.course = Course.objects.create(
+            title="Python Programming",
+            code="PY101",
+            credit=3,
+            program=self.program,
+            level="Beginner",
+            semester="First",
+        )
+        self.other_course = Course.objects.create(
+            title="Databases",
+            code="DB101",
+            credit=2,
+            program=self.program,
+            level="Beginner",
+            semester="First",
+        )
+        self.students = [
+            Student.objects.create(
+                student=User.objects.create(username=f"student{i}"),
+                level="Beginner",
+                program=self.program,
+            )
+            for i in range(3)
+        ]
+        self.taken = [
+            TakenCourse.objects.create(student=student, course=self.course)
+            for student in self.students
+        ]
+
+    def allocated_lecturer(self):
+        lecturer = User.objects.create(username="lecturer", is_lecturer=True)
+        allocation = CourseAllocation.objects.create(lecturer=lecturer, session=self.session)
+        allocation.courses.add(self.course)
+        return lecturer
+
+    def score_form(self, rows):
+        data = QueryDict(mutable=True)
+        for taken_course, scores in rows:
+            data.setlist(str(taken_course.pk), [str(score) for score in scores])
+        return data
+
+
+class ScoreEntryTests(ResultTestCase):
+    def test_invalid_form_reports_every_error(self):
+        data = self.score_form(
+            [(self.taken[0], [10, 10, 5, "abc", 40]), (self.taken[1], [10, 10, 5])]
+        )
+        data.setlist("999999", ["1"] * 5)
+        with self.assertRaises(ValidationError) as raised:
+            parse_scores(data, [tc.pk for tc in self.taken])
+        self.assertEqual(len(raised.exception.messages), 3)
+
+    def test_scores_are_graded_and_results_upserted(self):
+        TakenCourse.objects.create(
+            student=self.students[0],
+            course=self.other_course,
+            assignment=Decimal("40"),
+            final_exam=Decimal("40"),
+        )
+        Result.objects.create(
+            student=self.students[0],
+            gpa=1.0,
+            semester="First",
+            session="2026/2027",
+            level="Beginner",
+        )
+        data = self.score_form(
+            [
+                (self.taken[0], [10, 10, 5, 5, 60]),
+                (self.taken[1], [5, 5, 5, 5, 20]),
+            ]
+        )
+        scores = parse_scores(data, [tc.pk for tc in self.taken])
+
+        queryset = TakenCourse.objects.filter(course=self.course)
+        with self.assertNumQueries(10):
+            graded = record_scores(queryset, scores, self.session, self.semester)
+        self.assertEqual(graded, 2)
+
+        first = TakenCourse.objects.get(pk=self.taken[0].pk)
+        self.assertEqual((first.total, first.grade, first.comment), (Decimal("90"), "A+", "PASS"))
+        self.assertEqual(first.point, Decimal("12"))
+        self.assertEqual(TakenCourse.objects.get(pk=self.taken[1].pk).grade, "F")
+
+        result = Result.objects.get(student=self.students[0])
+        # (3 * 4.0 + 2 * 3.75) / (3 + 2)
+        self.assertAlmostEqual(result.gpa, 3.9)
+        self.assertAlmostEqual(result.cgpa, 3.9)
+        self.assertEqual(Result.objects.get(student=self.students[1]).gpa, 0.0)
+        self.assertFalse(Result.objects.filter(student=self.students[2]).exists())
+
+    def test_score_changes_are_audited(self):
+        lecturer = User.objects.create(username="lecturer")
+        scores = {
+            self.taken[0].pk: dict.fromkeys(SCORE_FIELDS, Decimal("11.00")),
+            self.taken[1].pk: dict.fromkeys(SCORE_FIELDS, Decimal("0.00")),
+        }
+        record_scores(
+            TakenCourse.objects.all(), scores, self.session, self.semester, actor=lecturer
+        )
+
+        # Re-submitting unchanged scores adds nothing
+        change = ScoreChange.objects.get()
+        self.assertEqual(
+            (change.taken_course_id, change.student_id, change.course_id, change.actor),
+            (self.taken[0].pk, self.students[0].pk, self.course.pk, lecturer),
+        )
+        self.assertEqual((change.session, change.semester), ("2026/2027", "First"))
+        self.assertEqual(change.old_scores, dict.fromkeys(SCORE_FIELDS, "0.00"))
+        self.assertEqual(change.new_scores, dict.fromkeys(SCORE_FIELDS, "11.00"))
+        self.assertEqual((change.old_grade, change.new_grade), ("F", "C"))
+        with self.assertRaises(ValueError):
+            change.save()
+
+        TakenCourse.objects.filter(pk=self.taken[0].pk).delete()
+        self.assertIsNone(ScoreChange.objects.get().taken_course_id)
+
+    def test_admin_score_edits_are_audited(self):
+        admin_user = User.objects.create(username="admin", is_staff=True, is_superuser=True)
+        self.client.force_login(admin_user)
+        data = {"student": self.students[0].pk, "course": self.course.pk}
+        data.update(dict.fromkeys(SCORE_FIELDS, "11"))
+        response = self.client.post(
+            reverse("admin:result_takencourse_change", args=[self.taken[0].pk]), data
+        )
+        self.assertEqual(response.status_code, 302)
+
+        taken_course = TakenCourse.objects.get(pk=self.taken[0].pk)
+        self.assertEqual((taken_course.total, taken_course.grade), (Decimal("55"), "C"))
+        change = ScoreChange.objects.get()
+        self.assertEqual((change.taken_course_id, change.actor), (taken_course.pk, admin_user))
+        self.assertEqual(change.new_scores, dict.fromkeys(SCORE_FIELDS, "11.00"))
+
+        Semester.objects.update(is_current_semester=False)
+        response = self.client.get(
+            reverse("admin:result_takencourse_change", args=[self.taken[0].pk])
+        )
+        self.assertNotIn("final_exam", response.context["adminform"].form.fields)
+
+    def test_single_score_changes_update_the_summary(self):
+        scores = {self.taken[0].pk: dict.fromkeys(SCORE_FIELDS, Decimal("11"))}
+        record_scores(TakenCourse.objects.all(), scores, self.session, self.semester)
+        result = Result.objects.get(student=self.students[0])
+        self.assertEqual((result.points, result.credits, result.gpa), (Decimal("6"), 3, 2.0))
+
+        taken_course = TakenCourse.objects.get(pk=self.taken[0].pk)
+        taken_course.final_exam = Decimal("50")
+        taken_course.save()
+        TakenCourse.objects.create(student=self.students[0], course=self.other_course)
+        result.refresh_from_db()
+        # (3 * 4.0 + 2 * 0.0) / (3 + 2)
+        self.assertEqual((result.points, result.credits), (Decimal("12"), 5))
+        self.assertEqual((result.cumulative_points, result.cumulative_credits), (Decimal("12"), 5))
+        self.assertAlmostEqual(result.gpa, 2.4)
+
+        taken_course.delete()
+        result.refresh_from_db()
+        self.assertEqual((result.credits, result.gpa), (2, 0.0))
+
+    def test_invalid_post_saves_nothing(self):
+        self.client.force_login(self.allocated_lecturer())
+        data = self.score_form(
+            [(self.taken[0], [10, 10, 5, 5, 60]), (self.taken[1], [10, 10, 5, 5, -1])]
+        )
+        response = self.client.post(reverse("add_score_for", args=[self.course.pk]), data)
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(TakenCourse.objects.get(pk=self.taken[0].pk).total, 0)
+        self.assertFalse(Result.objects.exists())
+
+    def test_only_allocated_courses_can_be_scored(self):
+        self.client.force_login(self.allocated_lecturer())
+        taken_course = TakenCourse.objects.create(student=self.students[0], course=self.other_course)
+        data = self.score_form([(taken_course, [10, 10, 5, 5, 60])])
+        response = self.client.post(reverse("add_score_for", args=[self.other_course.pk]), data)
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(TakenCourse.objects.get(pk=taken_course.pk).total, 0)
+
+
+class GradePointAverageTests(ResultTestCase):
+    def test_averages_match_per_row_calculation(self):
+        TakenCourse.objects.filter(pk=self.taken[0].pk).update(point=Decimal("12"))
+        TakenCourse.objects.create(
+            student=self.students[0], course=self.other_course, final_exam=Decimal("70")
+        )
+        taken_course = TakenCourse.objects.get(pk=self.taken[0].pk)
+
+        with self.assertNumQueries(2):
+            self.assertEqual(taken_course.calculate_gpa(), Decimal("3.60"))
+        self.assertEqual(taken_course.calculate_cgpa(), Decimal("3.60"))
+
+        with self.assertNumQueries(1):
+            averages = TakenCourse.objects.averages()
+        self.assertEqual(
+            averages,
+            {
+                self.students[0].pk: Decimal("3.60"),
+                self.students[1].pk: Decimal("0.00"),
+                self.students[2].pk: Decimal("0.00"),
+            },
+        )
+
+
+class RecomputeGradesTests(ResultTestCase):
+    def setUp(self):
+        super().setUp()
+        scores = {tc.pk: dict.fromkeys(SCORE_FIELDS, Decimal("18")) for tc in self.taken}
+        record_scores(TakenCourse.objects.all(), scores, self.session, self.semester)
+        # The course's credit changes after grading and one row holds a stale grade
+        Course.objects.filter(pk=self.course.pk).update(credit=4)
+        TakenCourse.objects.filter(pk=self.taken[0].pk).update(grade="F", comment="FAIL")
+
+    def test_recomputes_grades_and_summaries(self):
+        out = StringIO()
+        call_command("recompute_grades", chunk_size=2, stdout=out)
+        self.assertIn("Regraded 3 course results and recomputed 3 result summaries", out.getvalue())
+
+        for taken_course in TakenCourse.objects.all():
+            self.assertEqual((taken_course.grade, taken_course.point), ("A+", Decimal("16")))
+        result = Result.objects.get(student=self.students[0])
+        self.assertEqual((result.points, result.credits, result.gpa), (Decimal("16"), 4, 4.0))
+
+    def test_rows_of_past_sessions_keep_their_sessions_scheme(self):
+        past = Session.objects.create(session="2025/2026")
+        GradingScheme.objects.create(
+            name="2025/2026",
+            session=past,
+            boundaries=[[0, "F"], [40, "D"]],
+            grade_points={"F": 0, "D": 1},
+        )
+        Result.objects.filter(student=self.students[0]).update(session=past.session)
+
+        call_command("recompute_grades", stdout=StringIO())
+
+        graded = {tc.student_id: (tc.grade, tc.point) for tc in TakenCourse.objects.all()}
+        self.assertEqual(graded[self.students[0].pk], ("D", Decimal("4")))
+        self.assertEqual(graded[self.students[1].pk], ("A+", Decimal("16")))
+
+    def test_resumes_from_checkpoint(self):
+        with tempfile.TemporaryDirectory() as directory:
+            checkpoint = os.path.join(directory, "recompute.json")
+            with open(checkpoint, "w") as f:
+                json.dump({"phase": "results", "last_pk": self.students[0].pk, "changed": 7}, f)
+
+            out = StringIO()
+            call_command("recompute_grades", checkpoint=checkpoint, stdout=out)
+            self.assertIn("Regraded 7 course results and recomputed 2 result summaries", out.getvalue())
+            self.assertFalse(os.path.exists(checkpoint))
+        # Grading was already done in the interrupted run
+        self.assertEqual(TakenCourse.objects.get(pk=self.taken[0].pk).grade, "F")
+
+
+class GradingSchemeTests(ResultTestCase):
+    def test_default_scheme_matches_grade_boundaries(self):
+        for tenths in range(-10, 1200, 5):
+            total = Decimal(tenths) / 10
+            expected = next(
+                (grade for boundary, grade in GRADE_BOUNDARIES if total >= boundary), "NG"
+            )
+            self.assertEqual(DEFAULT_GRADING_SCHEME.grade(total), expected, total)
+
+    def test_most_specific_scheme_applies_and_changes_are_picked_up(self):
+        other_program = Program.objects.create(title="Mathematics")
+        GradingScheme.objects.create(
+            name="Institution", boundaries=[[0, "F"], [40, "D"]], grade_points={"F": 0, "D": 1}
+        )
+        scheme = GradingScheme.objects.create(
+            name="Computer Science",
+            program=self.program,
+            session=self.session,
+            boundaries=[[0, "F"], [50, "B"], [70, "A"]],
+            grade_points={"F": 0, "B": 3, "A": 4},
+        )
+        self.assertEqual(get_grading_scheme(self.program.pk).grade(Decimal("69.99")), "B")
+        self.assertEqual(get_grading_scheme(other_program.pk).grade(Decimal("95")), "D")
+
+        with self.assertNumQueries(0):
+            get_grading_scheme(self.program.pk)
+
+        scheme.boundaries = [[0, "F"], [60, "A"]]
+        scheme.save()
+        self.assertEqual(scheme.version, 2)
+        taken_course = TakenCourse.objects.get(pk=self.taken[0].pk)
+        taken_course.final_exam = Decimal("65")
+        taken_course.save()
+        self.assertEqual((taken_course.grade, taken_course.point), ("A", Decimal("12")))
+
+    def test_only_one_scheme_per_scope(self):
+        other_session = Session.objects.create(session="2027/2028")
+        for scope in [
+            {},
+            {"program": self.program},
+            {"session": self.session},
+            {"program": self.program, "session": self.session},
+        ]:
+            existing = GradingScheme.objects.create(name="First", **scope)
+            # A scheme for any other scope is still allowed
+            GradingScheme.objects.create(
+                name="Other", session=other_session, **{k: v for k, v in scope.items() if k != "session"}
+            ).delete()
+            duplicate = GradingScheme(name="Second", **scope)
+            with self.assertRaises(ValidationError):
+                duplicate.full_clean()
+            with self.assertRaises(IntegrityError), transaction.atomic():
+                duplicate.save()
+            existing.delete()
+
+    def test_invalid_scheme_is_rejected(self):
+        scheme = GradingScheme(name="Broken", boundaries=[[10, "A"]], grade_points={"A": 4})
+        with self.assertRaises(ValidationError):
+            scheme.full_clean()
+        scheme.boundaries = [[0, "F"], [50, "Z"]]
+        with self.assertRaises(ValidationError):
+            scheme.full_clean()
+
+
+class ScoreImportTests(ResultTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.allocated_lecturer())
+        self.url = reverse("import_scores", args=[self.course.pk])
+
+    def upload(self, lines):
+        content = "\r\n".join(lines).encode("utf-8-sig")
+        return SimpleUploadedFile("scores.csv", content, content_type="text/csv")
+
+    def test_only_allocated_courses_can_be_imported(self):
+        sheet = self.upload(["username,final_exam", "student0,60"])
+        url = reverse("import_scores", args=[self.other_course.pk])
+        self.assertEqual(self.client.post(url, {"file": sheet}).status_code, 404)
+        self.assertEqual(self.client.get(url).status_code, 404)
+        report_url = reverse("import_scores_report", args=[self.other_course.pk, "token"])
+        self.assertEqual(self.client.get(report_url).status_code, 404)
+        self.assertEqual(TakenCourse.objects.get(pk=self.taken[0].pk).total, 0)
+
+    def test_valid_sheet_is_applied(self):
+        sheet = self.upload(
+            [
+                "Username,Final_Exam,Assignment,Mid_Exam,Quiz,Attendance",
+                "student0,60,10,10,5,5",
+                "",
+                "student1,20,5,5,5,5",
+            ]
+        )
+        response = self.client.post(self.url, {"file": sheet})
+        self.assertRedirects(response, reverse("add_score_for", args=[self.course.pk]))
+        self.assertEqual(TakenCourse.objects.get(pk=self.taken[0].pk).grade, "A+")
+        self.assertEqual(TakenCourse.objects.get(pk=self.taken[1].pk).grade, "F")
+        self.assertEqual(Result.objects.count(), 2)
+
+    def test_invalid_sheet_returns_a_report(self):
+        sheet = self.upload(
+            [
+                "username,assignment,mid_exam,quiz,attendance,final_exam",
+                "student0,10,10,5,5,60",
+                "stranger,10,10,5,5,60",
+                "student0,10,10,5,5,60",
+                "student1,10,x,5,5,",
+            ]
+        )
+        response = self.client.post(self.url, {"file": sheet})
+        self.assertEqual(response.context["error_count"], 4)
+        self.assertEqual(TakenCourse.objects.get(pk=self.taken[0].pk).total, 0)
+
+        report = self.client.get(
+            reverse("import_scores_report", args=[self.course.pk, response.context["report_token"]])
+        )
+        lines = report.content.decode().splitlines()
+        self.assertEqual(lines[0], "row,username,error")
+        self.assertTrue(lines[1].startswith("3,stranger,"))
+
+    def test_xlsx_is_refused_without_openpyxl(self):
+        sheet = SimpleUploadedFile("scores.xlsx", b"PK\x03\x04")
+        with mock.patch("result.imports.load_workbook", None):
+            response = self.client.post(self.url, {"file": sheet})
+        self.assertFormError(response.context["form"], "file", "Upload a .csv file.")
+
+    def test_sheet_is_read_from_a_temporary_file(self):
+        upload = TemporaryUploadedFile("scores.csv", "text/csv", 0, "utf-8")
+        upload.write(b"username,assignment,mid_exam,quiz,attendance,final_exam\nstudent2,1,2,3,4,5\n")
+        class_list = {"student2": self.taken[2].pk}
+        scores, errors = read_scores(sheet_rows(upload), class_list)
+        self.assertEqual(errors, [])
+        self.assertEqual(scores[self.taken[2].pk]["final_exam"], Decimal("5.00"))
+        upload.close()
+
+
+class ResultSheetTests(ResultTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(User.objects.create(username="lecturer", is_superuser=True))
+        self.url = reverse("result_sheet_pdf_view", args=[self.course.pk])
+
+    def download(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response["Content-Type"], "application/pdf")
+        return b"".join(response.streaming_content)
+
+    def test_unchanged_sheet_is_served_from_cache(self):
+        with mock.patch.object(
+            reports, "build_result_sheet", wraps=reports.build_result_sheet
+        ) as build:
+            first = self.download()
+            self.assertTrue(first.startswith(b"%PDF"))
+            self.assertEqual(self.download(), first)
+            self.assertEqual(build.call_count, 1)
+
+            taken_course = TakenCourse.objects.get(pk=self.taken[0].pk)
+            taken_course.final_exam = Decimal("50")
+            taken_course.save()
+            self.download()
+            self.assertEqual(build.call_count, 2)
+
+
+
+class RegistrationFormTests(ResultTestCase):
+    def test_form_data_comes_from_one_query(self):
+        second = Course.objects.create(
+            title="Networks",
+            code="NT102",
+            credit=4,
+            program=self.program,
+            level="Beginner",
+            semester="Second",
+        )
+        TakenCourse.objects.create(student=self.students[0], course=second)
+        student = Student.objects.select_related("student").get(pk=self.students[0].pk)
+        with self.assertNumQueries(1):
+            data = reports.registration_form_data(student, self.session)
+        self.assertEqual(
+            data["semesters"],
+            [
+                ("FIRST", [("PY101", "Python Programming", 3)], 3),
+                ("SECOND", [("NT102", "Networks", 4)], 4),
+            ],
+        )
+
+    def test_form_is_rendered_in_memory(self):
+        user = self.students[0].student
+        user.is_student = True
+        user.save()
+        self.client.force_login(user)
+        response = self.client.get(reverse("course_registration_form"))
+        self.assertEqual(response["Content-Type"], "application/pdf")
+        self.assertTrue(b"".join(response.streaming_content).startswith(b"%PDF"))
+
+
+class ExportResultSheetsTests(ResultTestCase):
+    def test_exports_sheets_with_a_manifest(self):
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, "sheets.zip")
+            call_command("export_result_sheets", output=output, zip=True, workers=1, stdout=StringIO())
+            with zipfile.ZipFile(output) as archive:
+                manifest = json.loads(archive.read("manifest.json"))
+                self.assertEqual(
+                    sorted(archive.namelist()),
+                    ["DB101_resultSheet.pdf", "PY101_resultSheet.pdf", "manifest.json"],
+                )
+                self.assertTrue(archive.read("PY101_resultSheet.pdf").startswith(b"%PDF"))
+            self.assertEqual([sheet["students"] for sheet in manifest["sheets"]], [0, 3])
+
+            # Unchanged sheets come from the cache the first export filled
+            out = StringIO()
+            call_command("export_result_sheets", output=directory, workers=1, stdout=out)
+            self.assertIn("2 sheets cached, 0 to render", out.getvalue())
+            self.assertTrue(os.path.exists(os.path.join(directory, "manifest.json")))
+
+    def test_sheets_are_never_written_to_media(self):
+        output = os.path.join(settings.MEDIA_ROOT, "result_sheets", "sheets.zip")
+        with self.assertRaisesMessage(CommandError, "outside MEDIA_ROOT"):
+            call_command("export_result_sheets", output=output, zip=True, workers=1, stdout=StringIO())
+
+    def test_queued_export_is_downloaded_by_staff_only(self):
+        staff = User.objects.create(username="staff", is_staff=True, is_superuser=True)
+        self.client.force_login(staff)
+        response = self.client.post(
+            reverse("admin:course_course_changelist"),
+            {"action": "export_result_sheets", "_selected_action": [self.course.pk]},
+        )
+        self.assertEqual(response.status_code, 302)
+        export = ResultSheetExport.objects.get()
+        self.assertEqual(export.course_ids, [self.course.pk])
+        url = reverse("result_sheet_export_download", args=[export.token])
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+        with tempfile.TemporaryDirectory() as directory, self.settings(RESULT_EXPORT_DIR=directory):
+            call_command("export_result_sheets", queued=True, workers=1, stdout=StringIO())
+            export.refresh_from_db()
+            self.assertEqual(export.status, ResultSheetExport.DONE)
+            self.assertEqual(os.listdir(directory), [f"{export.token}.zip"])
+
+            response = self.client.get(url)
+            self.assertEqual(response["Content-Type"], "application/zip")
+            with zipfile.ZipFile(io.BytesIO(b"".join(response.streaming_content))) as archive:
+                self.assertIn("PY101_resultSheet.pdf", archive.namelist())
 
-# Create your tests here.
+            self.client.force_login(self.students[0].student)
+            self.assertEqual(self.client.get(url).status_code, 302)
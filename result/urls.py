@@ -2,19 +2,33 @@ from django.urls import path
 from .views import (
     add_score,
     add_score_for,
+    import_scores,
+    import_scores_report,
     grade_result,
     assessment_result,
     course_registration_form,
     result_sheet_pdf_view,
+    result_sheet_export_download,
 )
 
 
 urlpatterns = [
     path("manage-score/", add_score, name="add_score"),
     path("manage-score/<int:id>/", add_score_for, name="add_score_for"),
+    path("manage-score/<int:id>/import/", import_scores, name="import_scores"),
+    path(
+        "manage-score/<int:id>/import/report/<str:token>/",
+        import_scores_report,
+        name="import_scores_report",
+    ),
     path("grade/", grade_result, name="grade_results"),
     path("assessment/", assessment_result, name="ass_results"),
     path("result/print/<int:id>/", result_sheet_pdf_view, name="result_sheet_pdf_view"),
+    path(
+        "result/exports/<str:token>/",
+        result_sheet_export_download,
+        name="result_sheet_export_download",
+    ),
     path(
         "registration/form/", course_registration_form, name="course_registration_form"
     ),